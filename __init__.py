@@ -61,6 +61,7 @@ FEATURES = [
 # Requerimientos del sistema
 REQUIREMENTS = [
     "PyQt5>=5.15.0",
+    "xlsxwriter>=3.0",
     "sqlite3",
     "datetime", 
     "json",
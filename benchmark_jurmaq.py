@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BENCHMARKS JURMAQ
+Mediciones de rendimiento de la capa de datos
+Uso: python benchmark_jurmaq.py pragmas [--segundos 5] [--lectores 4]
+     python benchmark_jurmaq.py scroll [--filas 50000] [--cuadros 300]
+     python benchmark_jurmaq.py memoria [--filas 50000]
+     python benchmark_jurmaq.py suite [--tamaños 1000 100000 1000000] [--base base.json]
+"""
+
+import gc
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+import time
+import sqlite3
+import platform
+import statistics
+import argparse
+from datetime import datetime
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import main as jurmaq
+from main import (DatabaseManager, QueryExecutor, PresupuestosModule, OrdenesCompraModule,
+                  DashboardModule, JURMAQMainWindow, cargar_configuracion, PERFILES_PRAGMA)
+import generar_datos
+
+
+def crear_gestor(directorio, perfil, nombre=None):
+    """Crear un DatabaseManager sobre una base temporal con el perfil indicado"""
+    config = cargar_configuracion(None)
+    config['perfil_pragma'] = perfil
+    config['datos_demo'] = True
+    ruta = os.path.join(directorio, nombre or f"bench_{perfil}.db")
+    return DatabaseManager(ruta, config)
+
+
+def bench_pragmas(perfil, segundos, lectores, directorio):
+    """Throughput concurrente: N hilos lectores y un escritor durante 'segundos'"""
+    db = crear_gestor(directorio, perfil)
+    fin = time.monotonic() + segundos
+    contadores = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+    lock = threading.Lock()
+
+    def lector():
+        n = 0
+        while time.monotonic() < fin:
+            conn = db.get_connection()
+            try:
+                conn.execute("""
+                    SELECT numero_presupuesto, cliente, proyecto, monto_total, estado, fecha_creacion
+                    FROM presupuestos ORDER BY fecha_creacion DESC LIMIT 50
+                """).fetchall()
+                n += 1
+            except Exception:
+                with lock:
+                    contadores['bloqueos'] += 1
+            finally:
+                conn.close()
+        with lock:
+            contadores['lecturas'] += n
+
+    def escritor():
+        n = 0
+        while time.monotonic() < fin:
+            conn = db.get_connection()
+            try:
+                conn.execute("""
+                    INSERT INTO presupuestos (numero_presupuesto, cliente, proyecto, monto_total, usuario_id)
+                    VALUES (?, 'Cliente Benchmark', 'Proyecto Benchmark', 1000000, 1)
+                """, (f"BENCH-{perfil}-{n}",))
+                conn.commit()
+                n += 1
+            except Exception:
+                with lock:
+                    contadores['bloqueos'] += 1
+            finally:
+                conn.close()
+        with lock:
+            contadores['escrituras'] += n
+
+    hilos = [threading.Thread(target=lector) for _ in range(lectores)]
+    hilos.append(threading.Thread(target=escritor))
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    DatabaseManager.cerrar_pools()
+    return {
+        'perfil': perfil,
+        'lecturas_por_segundo': round(contadores['lecturas'] / segundos, 1),
+        'escrituras_por_segundo': round(contadores['escrituras'] / segundos, 1),
+        'errores_bloqueo': contadores['bloqueos'],
+    }
+
+
+def poblar_presupuestos(db, filas):
+    """Insertar 'filas' presupuestos sintéticos en una sola transacción"""
+    with db.conexion() as conn:
+        conn.executemany("""
+            INSERT INTO presupuestos (numero_presupuesto, cliente, proyecto, descripcion,
+                                      monto_total, estado, fecha_creacion, usuario_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        """, ((f"BENCH-{i:07d}", f"Cliente {i % 500}", f"Proyecto {i % 2000}", "Benchmark",
+               1000000 + i, ("Borrador", "Aprobado", "Pendiente")[i % 3],
+               f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:00:00")
+              for i in range(filas)))
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por vecino más cercano"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, max(0, int(round(p / 100.0 * (len(ordenados) - 1)))))
+    return ordenados[k]
+
+
+def medir_scroll(app, vista, cuadros):
+    """Desplazar una página por cuadro, repintando sincrónicamente; devuelve ms por cuadro"""
+    barra = vista.verticalScrollBar()
+    tiempos = []
+    for _ in range(cuadros):
+        inicio = time.perf_counter()
+        barra.setValue(min(barra.maximum(), barra.value() + barra.pageStep()))
+        app.processEvents()
+        vista.viewport().repaint()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def tabla_con_widgets(db):
+    """Réplica de la grilla anterior: QTableWidgetItem por celda y un QPushButton por fila"""
+    from PyQt5.QtWidgets import (QTableWidget, QTableWidgetItem, QWidget, QHBoxLayout,
+                                 QPushButton)
+    from PyQt5.QtCore import Qt
+
+    with db.conexion() as conn:
+        presupuestos = conn.execute("""
+            SELECT numero_presupuesto, cliente, proyecto, monto_total, estado, fecha_creacion
+            FROM presupuestos ORDER BY fecha_creacion DESC
+        """).fetchall()
+
+    tabla = QTableWidget()
+    tabla.setColumnCount(7)
+    tabla.setRowCount(len(presupuestos))
+    for row, presupuesto in enumerate(presupuestos):
+        for col, valor in enumerate(presupuesto):
+            item = QTableWidgetItem(f"${valor:,.0f}" if col == 3 else str(valor))
+            item.setTextAlignment(Qt.AlignCenter)
+            tabla.setItem(row, col, item)
+        acciones_widget = QWidget()
+        acciones_layout = QHBoxLayout()
+        acciones_layout.setContentsMargins(5, 2, 5, 2)
+        ver_btn = QPushButton("👁️")
+        ver_btn.setMaximumWidth(30)
+        acciones_layout.addWidget(ver_btn)
+        acciones_widget.setLayout(acciones_layout)
+        tabla.setCellWidget(row, 6, acciones_widget)
+    return tabla
+
+
+def comando_scroll(args):
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    directorio = tempfile.mkdtemp(prefix="jurmaq_bench_")
+    resultados = []
+    try:
+        db = crear_gestor(directorio, "rendimiento")
+        poblar_presupuestos(db, args.filas)
+        db._ejecutor = QueryExecutor(db, sincrono=True)
+        usuario = {'id': 1, 'nombre': 'Benchmark', 'tipo_usuario': 'Administrador'}
+
+        variantes = [("delegado", lambda: PresupuestosModule(db, usuario), 'tabla_presupuestos')]
+        if not args.solo_delegado:
+            variantes.append(("widgets", lambda: tabla_con_widgets(db), None))
+
+        for nombre, construir, atributo in variantes:
+            inicio = time.perf_counter()
+            widget = construir()
+            widget.resize(1200, 800)
+            widget.show()
+            app.processEvents()
+            construccion = (time.perf_counter() - inicio) * 1000
+            vista = getattr(widget, atributo) if atributo else widget
+
+            tiempos = medir_scroll(app, vista, args.cuadros)
+            resultados.append({
+                'variante': nombre,
+                'filas': args.filas,
+                'construccion_ms': round(construccion, 1),
+                'cuadro_promedio_ms': round(sum(tiempos) / len(tiempos), 3),
+                'cuadro_p95_ms': round(percentil(tiempos, 95), 3),
+                'cuadro_max_ms': round(max(tiempos), 3),
+            })
+            widget.close()
+            widget.deleteLater()
+            app.processEvents()
+    finally:
+        DatabaseManager.cerrar_pools()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"{'Variante':<12}{'Filas':>8}{'Construcción ms':>18}{'Prom ms':>10}{'p95 ms':>10}{'Máx ms':>10}")
+    for r in resultados:
+        print(f"{r['variante']:<12}{r['filas']:>8}{r['construccion_ms']:>18}"
+              f"{r['cuadro_promedio_ms']:>10}{r['cuadro_p95_ms']:>10}{r['cuadro_max_ms']:>10}")
+    return resultados
+
+
+def comando_pragmas(args):
+    directorio = tempfile.mkdtemp(prefix="jurmaq_bench_")
+    try:
+        resultados = [bench_pragmas(perfil, args.segundos, args.lectores, directorio)
+                      for perfil in args.perfiles]
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"{'Perfil':<14}{'Lecturas/s':>14}{'Escrituras/s':>16}{'Bloqueos':>10}")
+    for r in resultados:
+        print(f"{r['perfil']:<14}{r['lecturas_por_segundo']:>14}"
+              f"{r['escrituras_por_segundo']:>16}{r['errores_bloqueo']:>10}")
+    return resultados
+
+
+# --- Memoria por fila ---
+
+# tuplas: fetchall del listado; registros: lo mismo como PresupuestoListado (__slots__);
+# widgets: tuplas + un QTableWidgetItem por celda (la grilla anterior);
+# modelo: PresupuestosModule con todas las páginas pedidas (LRU de registros acotado;
+# las páginas quedan además en el caché de consultas, acotado por cache_consultas_mb)
+VARIANTES_MEMORIA = ('tuplas', 'registros', 'widgets', 'modelo')
+
+
+def memoria_residente():
+    """Bytes residentes del proceso (None si no se puede medir en esta plataforma)"""
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def retener_variante(app, db, variante):
+    """Construir y devolver lo que la variante mantiene vivo"""
+    sql = (f"SELECT {jurmaq.LISTADOS['presupuestos']['columnas']} FROM presupuestos "
+           "ORDER BY fecha_creacion DESC, id DESC")
+    if variante == 'modelo':
+        modulo = PresupuestosModule(db, USUARIO_SUITE)
+        modelo = modulo.modelo
+        while modelo.canFetchMore():
+            modelo.fetchMore()
+            app.processEvents()
+        return modulo
+
+    with db.conexion() as conn:
+        filas = conn.execute(sql).fetchall()
+    if variante == 'registros':
+        return jurmaq.PresupuestoListado.desde_filas(filas)
+    if variante == 'widgets':
+        from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem
+        from PyQt5.QtCore import Qt
+        tabla = QTableWidget(len(filas), 6)
+        for row, fila in enumerate(filas):
+            for col, valor in enumerate(fila[1:]):
+                item = QTableWidgetItem(f"${valor:,.0f}" if col == 3 else str(valor))
+                item.setTextAlignment(Qt.AlignCenter)
+                tabla.setItem(row, col, item)
+        return filas, tabla
+    return filas
+
+
+def medir_memoria(variante, ruta, trazar):
+    """Memoria que retiene una variante: residente o, con trazar, objetos Python (tracemalloc).
+
+    Se mide en un proceso propio por variante: la memoria liberada por una
+    variante anterior se reutilizaría y falsearía la siguiente.
+    """
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+    db = DatabaseManager(ruta, cargar_configuracion(None))
+    db._ejecutor = QueryExecutor(db, sincrono=True)
+    with db.conexion() as conn:
+        filas = conn.execute("SELECT COUNT(*) FROM presupuestos").fetchone()[0]
+
+    gc.collect()
+    antes = memoria_residente()
+    if trazar:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    retenido = retener_variante(app, db, variante)
+    segundos = time.perf_counter() - inicio
+    gc.collect()
+    if trazar:
+        bytes_medidos = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        despues = memoria_residente()
+        bytes_medidos = despues - antes if antes is not None and despues is not None else None
+    cache = db.cache.resumen()['bytes']
+    del retenido
+    DatabaseManager.cerrar_pools()
+    return {'variante': variante, 'filas': filas, 'bytes': bytes_medidos, 'cache_bytes': cache,
+            'carga_ms': round(segundos * 1000, 1)}
+
+
+def comando_memoria(args):
+    if args.medir:
+        resultado = medir_memoria(args.medir, args.db, args.trazar)
+        print(json.dumps(resultado))
+        return resultado
+
+    directorio = tempfile.mkdtemp(prefix="jurmaq_bench_")
+    resultados = []
+    try:
+        db = crear_gestor(directorio, "rendimiento")
+        poblar_presupuestos(db, args.filas)
+        DatabaseManager.cerrar_pools()
+        ruta = db.db_path
+        for variante in args.variantes:
+            medidas = {}
+            for trazar in (False, True):
+                comando = [sys.executable, os.path.abspath(__file__), "memoria",
+                           "--medir", variante, "--db", ruta] + (["--trazar"] if trazar else [])
+                salida = subprocess.run(comando, capture_output=True, text=True, check=True).stdout
+                medidas[trazar] = json.loads(salida.strip().splitlines()[-1])
+            filas = medidas[False]['filas']
+            residente = medidas[False]['bytes']
+            resultados.append({
+                'variante': variante,
+                'filas': filas,
+                'python_bytes_fila': round(medidas[True]['bytes'] / filas, 1),
+                'residente_bytes_fila': round(residente / filas, 1) if residente is not None else None,
+                'cache_bytes_fila': round(medidas[False]['cache_bytes'] / filas, 1),
+                'carga_ms': medidas[False]['carga_ms'],
+            })
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"{'Variante':<12}{'Filas':>9}{'Python B/fila':>16}{'Residente B/fila':>19}"
+          f"{'de ello caché':>16}{'Carga ms':>11}")
+    for r in resultados:
+        residente = r['residente_bytes_fila'] if r['residente_bytes_fila'] is not None else "-"
+        print(f"{r['variante']:<12}{r['filas']:>9}{r['python_bytes_fila']:>16}{residente:>19}"
+              f"{r['cache_bytes_fila']:>16}{r['carga_ms']:>11}")
+    return resultados
+
+
+# --- Suite de rutas críticas ---
+
+USUARIO_SUITE = {'id': 1, 'usuario': 'admin', 'nombre': 'Benchmark', 'tipo_usuario': 'Administrador'}
+# Tablas secundarias: no crecen más allá de esto aunque el tamaño sea mayor
+MAX_FILAS_SECUNDARIAS = 50000
+
+
+def preparar_base(directorio, filas, semilla):
+    """Base con 'filas' presupuestos y órdenes (y tablas secundarias acotadas).
+
+    Se reutiliza si ya existe en 'directorio': generar 1M de filas toma un rato.
+    """
+    ruta = os.path.join(directorio, f"suite_{filas}_{semilla}.db")
+    if os.path.exists(ruta):
+        return ruta
+    config = cargar_configuracion(None)
+    DatabaseManager(ruta, config)
+    fechas = generar_datos.Fechas(datetime(2018, 1, 1), datetime(2025, 7, 25))
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    conn.execute("PRAGMA synchronous = OFF")
+    try:
+        for tabla in generar_datos.TABLAS:
+            cantidad = filas if tabla in ('presupuestos', 'ordenes_compra') else \
+                min(filas, MAX_FILAS_SECUNDARIAS)
+            generar_datos.generar_tabla(conn, tabla, cantidad, semilla, fechas, 5000, 200000)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    DatabaseManager.cerrar_pools()
+    return ruta
+
+
+def cronometrar(funcion, repeticiones, preparar=None):
+    """Tiempos en ms de 'funcion' ('preparar' corre antes de cada repetición, fuera del tiempo)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'min_ms': round(min(tiempos), 3),
+        'repeticiones': repeticiones,
+    }
+
+
+def casos_suite(app, ruta):
+    """Casos medidos sobre una base: {nombre: (funcion, preparar)}"""
+    db = DatabaseManager(ruta, cargar_configuracion(None))
+    db._ejecutor = QueryExecutor(db, sincrono=True)
+    clave = os.path.abspath(ruta)
+    widgets = []
+
+    def sin_cache():
+        # Medir la ruta hasta SQLite, no un acierto del caché de consultas
+        db.cache.limpiar()
+
+    def init_database():
+        DatabaseManager._esquemas_listos.discard(clave)
+        db.init_database()
+
+    presupuestos = PresupuestosModule(db, USUARIO_SUITE)
+    ordenes = OrdenesCompraModule(db, USUARIO_SUITE)
+    dashboard = DashboardModule(db, USUARIO_SUITE)
+    dashboard.timer_refresco.stop()
+    widgets.extend([presupuestos, ordenes, dashboard])
+    app.processEvents()
+
+    def ver_detalle():
+        with mock.patch.object(jurmaq.QMessageBox, 'information'):
+            presupuestos.ver_detalle_presupuesto(0)
+
+    def ventana_principal():
+        ventana = JURMAQMainWindow(USUARIO_SUITE, db)
+        ventana.show()
+        app.processEvents()
+        ventana.close()
+        ventana.deleteLater()
+
+    casos = {
+        'init_database': (init_database, None),
+        'validate_user': (lambda: db.validate_user('admin', 'admin123'), None),
+        'load_presupuestos': (presupuestos.load_presupuestos, sin_cache),
+        'load_ordenes': (ordenes.load_ordenes, sin_cache),
+        'update_metrics': (dashboard.update_metrics, sin_cache),
+        'ver_detalle_presupuesto': (ver_detalle, sin_cache),
+        'ventana_principal': (ventana_principal, sin_cache),
+    }
+    return casos, widgets
+
+
+def entorno():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'sistema': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+    }
+
+
+def comparar_con_base(resultados, base, tolerancia, minimo_ms):
+    """Regresiones: mediana más de 'tolerancia' (fracción) y 'minimo_ms' sobre la base"""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get('resultados', {}).get(nombre)
+        if not anterior:
+            continue
+        limite = anterior['mediana_ms'] * (1 + tolerancia)
+        if actual['mediana_ms'] > limite and actual['mediana_ms'] - anterior['mediana_ms'] > minimo_ms:
+            regresiones.append({
+                'caso': nombre,
+                'base_ms': anterior['mediana_ms'],
+                'actual_ms': actual['mediana_ms'],
+                'variacion': round(actual['mediana_ms'] / max(anterior['mediana_ms'], 1e-9) - 1, 3),
+            })
+    return regresiones
+
+
+def comando_suite(args):
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    directorio = args.datos or tempfile.mkdtemp(prefix="jurmaq_suite_")
+    os.makedirs(directorio, exist_ok=True)
+    resultados = {}
+    try:
+        for filas in args.tamaños:
+            print(f"• Preparando base con {filas:,} filas...")
+            ruta = preparar_base(directorio, filas, args.semilla)
+            casos, widgets = casos_suite(app, ruta)
+            for nombre, (funcion, preparar) in casos.items():
+                if args.casos and nombre not in args.casos:
+                    continue
+                funcion()   # Calentamiento (conexiones, cachés de SQLite)
+                medicion = cronometrar(funcion, args.repeticiones, preparar)
+                medicion['filas'] = filas
+                resultados[f"{nombre}@{filas}"] = medicion
+                print(f"   {nombre:<26}{medicion['mediana_ms']:>10.2f} ms  (p95 {medicion['p95_ms']:.2f})")
+            for widget in widgets:
+                widget.close()
+                widget.deleteLater()
+            app.processEvents()
+            DatabaseManager.cerrar_pools()
+    finally:
+        if not args.datos:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    informe = {
+        'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'entorno': entorno(),
+        'resultados': resultados,
+    }
+
+    codigo = 0
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        regresiones = comparar_con_base(resultados, base, args.tolerancia, args.minimo_ms)
+        informe['regresiones'] = regresiones
+        if regresiones:
+            codigo = 1
+            print(f"❌ {len(regresiones)} regresiones respecto a {args.base}:")
+            for r in regresiones:
+                print(f"   • {r['caso']}: {r['base_ms']:.2f} → {r['actual_ms']:.2f} ms "
+                      f"(+{r['variacion'] * 100:.0f}%)")
+        else:
+            print(f"✅ Sin regresiones respecto a {args.base} (tolerancia {args.tolerancia * 100:.0f}%)")
+
+    if args.guardar_base:
+        with open(args.guardar_base, "w", encoding="utf-8") as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    args.codigo_salida = codigo
+    return informe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks JURMAQ")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("pragmas", help="Lectura/escritura concurrente por perfil de pragmas")
+    p.add_argument("--segundos", type=float, default=5.0)
+    p.add_argument("--lectores", type=int, default=4)
+    p.add_argument("--perfiles", nargs="+", default=["compatible", "rendimiento"],
+                   choices=sorted(PERFILES_PRAGMA))
+    p.add_argument("--salida", help="Guardar resultados en JSON")
+    p.set_defaults(funcion=comando_pragmas)
+
+    p = sub.add_parser("scroll", help="Tiempo por cuadro al desplazar la grilla de presupuestos")
+    p.add_argument("--filas", type=int, default=50000)
+    p.add_argument("--cuadros", type=int, default=300)
+    p.add_argument("--solo-delegado", action="store_true",
+                   help="No medir la grilla antigua con widgets por fila")
+    p.add_argument("--salida", help="Guardar resultados en JSON")
+    p.set_defaults(funcion=comando_scroll)
+
+    p = sub.add_parser("memoria", help="Memoria por fila del listado: tuplas, registros, widgets y modelo")
+    p.add_argument("--filas", type=int, default=50000)
+    p.add_argument("--variantes", nargs="+", default=list(VARIANTES_MEMORIA), choices=VARIANTES_MEMORIA)
+    p.add_argument("--salida", help="Guardar resultados en JSON")
+    # Uso interno: medir una variante en un proceso aparte
+    p.add_argument("--medir", choices=VARIANTES_MEMORIA, help=argparse.SUPPRESS)
+    p.add_argument("--db", help=argparse.SUPPRESS)
+    p.add_argument("--trazar", action="store_true", help=argparse.SUPPRESS)
+    p.set_defaults(funcion=comando_memoria)
+
+    p = sub.add_parser("suite", help="Rutas críticas de datos e interfaz a varios tamaños, con línea base")
+    p.add_argument("--tamaños", nargs="+", type=int, default=[1000, 100000, 1000000])
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.add_argument("--casos", nargs="+", help="Medir solo estos casos")
+    p.add_argument("--semilla", type=int, default=2025)
+    p.add_argument("--datos", help="Carpeta donde generar (y reutilizar) las bases de prueba")
+    p.add_argument("--base", help="Resultados anteriores (JSON) contra los cuales comparar")
+    p.add_argument("--tolerancia", type=float, default=0.25,
+                   help="Aumento relativo de la mediana que se considera regresión")
+    p.add_argument("--minimo-ms", type=float, default=1.0,
+                   help="Diferencia absoluta mínima para reportar una regresión")
+    p.add_argument("--guardar-base", help="Guardar estos resultados como nueva línea base")
+    p.add_argument("--salida", help="Guardar resultados en JSON")
+    p.set_defaults(funcion=comando_suite)
+
+    args = parser.parse_args()
+    resultados = args.funcion(args)
+
+    if getattr(args, "salida", None):
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    return getattr(args, "codigo_salida", 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,7 +22,7 @@ echo ✅ Python encontrado
 
 REM Instalar dependencias si es necesario
 echo 📦 Verificando dependencias...
-pip install cx_Freeze PyQt5 --quiet
+pip install cx_Freeze PyQt5 xlsxwriter --quiet
 
 REM Ejecutar build script
 echo 🔨 Iniciando proceso de build...
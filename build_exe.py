@@ -36,7 +36,8 @@ class JURMAQBuilder:
         
         required_packages = [
             "cx_Freeze",
-            "PyQt5"
+            "PyQt5",
+            "xlsxwriter"
         ]
         
         missing_packages = []
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GENERADOR DE DATOS SINTÉTICOS JURMAQ
+Llena las tablas con datos realistas y reproducibles para pruebas de volumen
+Uso: python generar_datos.py --db prueba.db --filas 100000
+     python generar_datos.py --db prueba.db --presupuestos 2000000 --empleados 5000 --semilla 7
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from main import DatabaseManager, cargar_configuracion, formatear_rut
+
+# --- Vocabulario ---
+
+NOMBRES = ["Juan", "María", "José", "Ana", "Luis", "Carmen", "Pedro", "Francisca", "Diego",
+           "Camila", "Jorge", "Valentina", "Cristián", "Javiera", "Felipe", "Constanza",
+           "Rodrigo", "Catalina", "Matías", "Fernanda", "Sebastián", "Daniela", "Pablo",
+           "Carolina", "Nicolás", "Paula", "Manuel", "Isidora", "Héctor", "Rosa"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva",
+             "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández",
+             "Torres", "Araya", "Flores", "Espinoza", "Valenzuela", "Castillo", "Tapia",
+             "Reyes", "Gutiérrez", "Castro", "Pizarro", "Álvarez", "Vásquez", "Sánchez", "Fernández"]
+COMUNAS = ["Santiago", "Puente Alto", "Maipú", "La Florida", "Antofagasta", "Viña del Mar",
+           "Valparaíso", "Temuco", "Concepción", "Rancagua", "Talca", "Arica", "Iquique",
+           "Puerto Montt", "La Serena", "Coquimbo", "Osorno", "Valdivia", "Calama", "Chillán"]
+RUBROS = ["Constructora", "Inmobiliaria", "Ingeniería", "Servicios", "Inversiones", "Desarrollos"]
+RAZONES = ["S.A.", "SpA", "Ltda.", "E.I.R.L."]
+OBRAS = ["Edificio Residencial", "Condominio", "Reparación Puente", "Pavimentación Calle",
+         "Centro Comercial", "Bodega Industrial", "Colegio", "CESFAM", "Ampliación Hospital",
+         "Muro de Contención", "Planta de Tratamiento", "Paso Superior"]
+MATERIALES = ["Cemento especial", "Fierro 12mm", "Hormigón H30", "Áridos", "Madera pino",
+              "Planchas OSB", "Cañería PVC", "Cable eléctrico", "Pintura látex", "Cerámica",
+              "Diésel", "Perfiles metálicos", "Malla ACMA", "Ladrillo fiscal"]
+CARGOS = [("Jornal", 520000, 700000), ("Maestro Construcción", 750000, 1300000),
+          ("Capataz", 1100000, 1800000), ("Operador Maquinaria", 900000, 1600000),
+          ("Conductor", 800000, 1300000), ("Bodeguero", 650000, 950000),
+          ("Prevencionista de Riesgos", 1300000, 2200000), ("Jefe de Obra", 1800000, 3200000),
+          ("Ingeniero Civil", 2200000, 4500000), ("Arquitecto", 2000000, 4000000),
+          ("Administrativo", 700000, 1200000)]
+VEHICULOS = [("Caterpillar", ["320D", "336", "950H", "D6T"], "Excavadora"),
+             ("Komatsu", ["PC200", "WA380", "D65"], "Excavadora"),
+             ("Volvo", ["FH16", "FMX", "FM"], "Camión"),
+             ("Mercedes-Benz", ["Actros", "Atego", "Arocs"], "Camión"),
+             ("Toyota", ["Hilux", "Land Cruiser"], "Camioneta"),
+             ("Mitsubishi", ["L200"], "Camioneta"),
+             ("JCB", ["3CX", "4CX"], "Retroexcavadora"),
+             ("Hyundai", ["HD78", "Porter"], "Camión Liviano")]
+CATEGORIAS = [("CEM", "Materiales", ["Cemento 25kg", "Yeso 25kg", "Cal 25kg", "Mortero 45kg"], 4000, 12000),
+              ("FIE", "Fierros", ["Varilla 8mm", "Varilla 12mm", "Varilla 16mm", "Perfil C"], 5000, 45000),
+              ("HER", "Herramientas", ["Martillo", "Llana", "Nivel", "Esmeril", "Taladro"], 8000, 180000),
+              ("EPP", "Seguridad", ["Casco", "Guantes", "Arnés", "Lentes", "Zapatos"], 2000, 90000),
+              ("ELE", "Eléctricos", ["Cable 2.5mm", "Interruptor", "Tablero", "Foco LED"], 1500, 120000)]
+DOCUMENTOS = [("Contrato", "PDF", "Contratos"), ("Planos", "CAD", "Planos"),
+              ("Certificado", "PDF", "Certificaciones"), ("Presupuesto", "XLSX", "Finanzas"),
+              ("Informe", "DOCX", "Informes"), ("Permiso de Edificación", "PDF", "Permisos"),
+              ("Factura", "PDF", "Finanzas")]
+LETRAS_PATENTE = "BCDFGHJKLPRSTVWXYZ"
+
+TABLAS = ["presupuestos", "ordenes_compra", "empleados", "vehiculos", "inventario", "documentos"]
+
+
+# --- Utilidades ---
+
+def patente(indice):
+    """Patente formato actual (BC-DF-12), distinta para cada índice < 18^4 * 100"""
+    total = len(LETRAS_PATENTE) ** 4 * 100
+    # Permutación del índice para que patentes consecutivas no se parezcan
+    n = (indice * 7919 + 104729) % total
+    numero, n = n % 100, n // 100
+    letras = []
+    for _ in range(4):
+        n, resto = divmod(n, len(LETRAS_PATENTE))
+        letras.append(LETRAS_PATENTE[resto])
+    return f"{letras[0]}{letras[1]}-{letras[2]}{letras[3]}-{numero:02d}"
+
+def monto_clp(rng, minimo, mediana, maximo, redondeo=1000):
+    """Monto en pesos con distribución log-normal, redondeado"""
+    valor = rng.lognormvariate(math.log(mediana), 0.9)
+    valor = min(maximo, max(minimo, valor))
+    return float(int(valor // redondeo) * redondeo)
+
+def elegir(rng, pesos):
+    """Elegir una clave de {valor: peso}"""
+    return rng.choices(list(pesos), weights=list(pesos.values()))[0]
+
+class Fechas:
+    """Fechas entre 'desde' y 'hasta', con más densidad en los años recientes"""
+
+    def __init__(self, desde, hasta):
+        self.desde = desde
+        self.segundos = int((hasta - desde).total_seconds())
+
+    def fecha(self, rng):
+        # sqrt de un uniforme: densidad creciente hacia el final del rango
+        momento = self.desde + timedelta(seconds=int(math.sqrt(rng.random()) * self.segundos))
+        # Horario hábil
+        return momento.replace(hour=rng.randint(8, 19), minute=rng.randint(0, 59),
+                               second=rng.randint(0, 59))
+
+def empresa(rng):
+    return f"{rng.choice(RUBROS)} {rng.choice(APELLIDOS)} {rng.choice(RAZONES)}"
+
+
+# --- Generadores por tabla: (sql, función fila(rng, n, fechas)) ---
+
+def fila_presupuesto(rng, n, fechas):
+    fecha = fechas.fecha(rng)
+    obra = rng.choice(OBRAS)
+    comuna = rng.choice(COMUNAS)
+    return (f"PRES-{fecha.year}-{n:07d}", empresa(rng), f"{obra} {comuna}",
+            f"{obra} en {comuna}, {rng.randint(1, 40)} etapas",
+            monto_clp(rng, 5_000_000, 180_000_000, 8_000_000_000, 100_000),
+            elegir(rng, {'Borrador': 15, 'En Revisión': 20, 'Pendiente': 20, 'Aprobado': 35, 'Rechazado': 10}),
+            fecha.strftime("%Y-%m-%d %H:%M:%S"), 1)
+
+def fila_orden(rng, n, fechas):
+    fecha = fechas.fecha(rng)
+    material = rng.choice(MATERIALES)
+    return (f"OC-{fecha.year}-{n:07d}", empresa(rng),
+            f"{material} {rng.randint(10, 5000)} unidades",
+            monto_clp(rng, 50_000, 2_500_000, 250_000_000),
+            elegir(rng, {'Pendiente': 25, 'Aprobada': 30, 'Entregada': 40, 'Anulada': 5}),
+            fecha.strftime("%Y-%m-%d %H:%M:%S"),
+            (fecha + timedelta(days=rng.randint(3, 45))).strftime("%Y-%m-%d"), 1)
+
+def fila_empleado(rng, n, fechas):
+    nombre = rng.choice(NOMBRES)
+    apellido = f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+    cargo, minimo, maximo = rng.choice(CARGOS)
+    # Números de RUT crecientes: cada n tiene su propio intervalo, sin choques
+    rut = formatear_rut(5_000_000 + n * 17 + rng.randint(0, 16))
+    usuario = (nombre[0] + apellido.split()[0]).lower()
+    for origen, destino in zip("áéíóúñü", "aeiounu"):
+        usuario = usuario.replace(origen, destino)
+    return (rut, nombre, apellido, cargo,
+            float(int(rng.uniform(minimo, maximo) // 1000) * 1000),
+            elegir(rng, {'Activo': 85, 'Inactivo': 10, 'Licencia': 5}),
+            fechas.fecha(rng).strftime("%Y-%m-%d"),
+            f"{usuario}{n}@empresa.cl", f"+569{rng.randint(10000000, 99999999)}")
+
+def fila_vehiculo(rng, n, fechas):
+    marca, modelos, tipo = rng.choice(VEHICULOS)
+    año = rng.randint(2005, fechas.desde.year + int(fechas.segundos / 31_557_600))
+    antiguedad = max(1, datetime.now().year - año)
+    return (patente(n), marca, rng.choice(modelos), año, tipo,
+            elegir(rng, {'Disponible': 60, 'En Uso': 30, 'Mantención': 10}),
+            int(antiguedad * rng.uniform(2_000, 40_000)))
+
+def fila_inventario(rng, n, fechas):
+    prefijo, categoria, productos, minimo, maximo = rng.choice(CATEGORIAS)
+    stock_minimo = rng.randint(5, 100)
+    return (f"{prefijo}-{n:07d}", f"{rng.choice(productos)} {rng.choice(['Estándar', 'Premium', 'Industrial'])}",
+            categoria, int(stock_minimo * rng.uniform(0.2, 6)), stock_minimo,
+            float(int(rng.uniform(minimo, maximo) // 10) * 10),
+            f"Bodega {rng.choice('ABCDE')}-{rng.randint(1, 30)}",
+            elegir(rng, {'Activo': 95, 'Descontinuado': 5}))
+
+def fila_documento(rng, n, fechas):
+    titulo, tipo, categoria = rng.choice(DOCUMENTOS)
+    subida = fechas.fecha(rng)
+    extension = {'CAD': 'dwg'}.get(tipo, tipo.lower())
+    nombre = f"{titulo} {rng.choice(OBRAS)} {n}.{extension}"
+    vence = (subida + timedelta(days=rng.randint(30, 1500))).strftime("%Y-%m-%d") \
+        if categoria in ("Contratos", "Certificaciones", "Permisos") else None
+    return (nombre, tipo, categoria, f"documentos/{categoria.lower()}/{n}.{extension}",
+            int(rng.lognormvariate(math.log(800_000), 1.2)), subida.strftime("%Y-%m-%d %H:%M:%S"),
+            vence, 1)
+
+GENERADORES = {
+    'presupuestos': ("""
+        INSERT OR IGNORE INTO presupuestos (numero_presupuesto, cliente, proyecto, descripcion,
+                                            monto_total, estado, fecha_creacion, usuario_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", fila_presupuesto),
+    'ordenes_compra': ("""
+        INSERT OR IGNORE INTO ordenes_compra (numero_oc, proveedor, descripcion, monto_total,
+                                              estado, fecha_creacion, fecha_entrega, usuario_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", fila_orden),
+    'empleados': ("""
+        INSERT OR IGNORE INTO empleados (rut, nombre, apellido, cargo, sueldo_base, estado,
+                                         fecha_ingreso, email, telefono)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", fila_empleado),
+    'vehiculos': ("""
+        INSERT OR IGNORE INTO vehiculos (patente, marca, modelo, año, tipo_vehiculo, estado, kilometraje)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""", fila_vehiculo),
+    'inventario': ("""
+        INSERT OR IGNORE INTO inventario (codigo_producto, nombre_producto, categoria, stock_actual,
+                                          stock_minimo, precio_unitario, ubicacion, estado)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", fila_inventario),
+    'documentos': ("""
+        INSERT INTO documentos (nombre_documento, tipo_documento, categoria, ruta_archivo,
+                                tamaño_archivo, fecha_subida, fecha_vencimiento, usuario_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", fila_documento),
+}
+
+
+def generar_tabla(conn, tabla, filas, semilla, fechas, lote, por_transaccion):
+    """Insertar 'filas' filas en 'tabla' con executemany por lotes; devuelve las insertadas"""
+    sql, fila = GENERADORES[tabla]
+    # Generador propio por tabla: agregar tablas no cambia los datos de las demás
+    rng = random.Random(f"{semilla}:{tabla}")
+    # Numerar desde el último id para no chocar con claves existentes
+    inicio = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}").fetchone()[0] + 1
+
+    hechas = insertadas = 0
+    conn.execute("BEGIN")
+    while hechas < filas:
+        cantidad = min(lote, filas - hechas)
+        cursor = conn.executemany(sql, [fila(rng, inicio + hechas + i, fechas) for i in range(cantidad)])
+        insertadas += cursor.rowcount      # Sin contar lo que escriben los triggers
+        hechas += cantidad
+        if hechas % por_transaccion < lote or hechas == filas:
+            conn.commit()
+            print(f"   {tabla}: {hechas:,}/{filas:,}", end="\r", flush=True)
+            if hechas < filas:
+                conn.execute("BEGIN")
+    print()
+    return insertadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de datos sintéticos JURMAQ")
+    parser.add_argument("--db", help="Ruta del archivo SQLite (por defecto el de la configuración)")
+    parser.add_argument("--filas", type=int, default=10000,
+                        help="Filas por tabla (salvo las indicadas individualmente)")
+    for tabla in TABLAS:
+        parser.add_argument(f"--{tabla.replace('_', '-')}", type=int, dest=tabla,
+                            help=f"Filas para {tabla}")
+    parser.add_argument("--tablas", nargs="+", choices=TABLAS, default=TABLAS,
+                        help="Tablas a llenar")
+    parser.add_argument("--semilla", type=int, default=2025)
+    parser.add_argument("--desde", default="2018-01-01", help="Fecha más antigua (AAAA-MM-DD)")
+    parser.add_argument("--hasta", default=datetime.now().strftime("%Y-%m-%d"),
+                        help="Fecha más reciente (AAAA-MM-DD)")
+    parser.add_argument("--lote", type=int, default=5000, help="Filas por executemany")
+    parser.add_argument("--transaccion", type=int, default=200000, help="Filas por transacción")
+    args = parser.parse_args()
+
+    config = cargar_configuracion()
+    db = DatabaseManager(args.db, config)   # Crea el esquema y aplica migraciones
+    fechas = Fechas(datetime.strptime(args.desde, "%Y-%m-%d"), datetime.strptime(args.hasta, "%Y-%m-%d"))
+
+    # Conexión propia para la carga: sin fsync por transacción y caché grande.
+    # Si se corta a medio camino solo se pierde la transacción en curso.
+    conn = sqlite3.connect(db.db_path, isolation_level=None)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    inicio_total = time.perf_counter()
+    try:
+        for tabla in args.tablas:
+            filas = getattr(args, tabla) if getattr(args, tabla) is not None else args.filas
+            if filas <= 0:
+                continue
+            inicio = time.perf_counter()
+            insertadas = generar_tabla(conn, tabla, filas, args.semilla, fechas,
+                                       max(1, args.lote), max(args.lote, args.transaccion))
+            segundos = time.perf_counter() - inicio
+            print(f"✅ {tabla}: {insertadas:,} filas en {segundos:.1f} s "
+                  f"({insertadas / max(segundos, 1e-9):,.0f} filas/s)")
+        # Estadísticas para el planificador y las estimaciones de conteo
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+        DatabaseManager.cerrar_pools()
+
+    print(f"Total: {time.perf_counter() - inicio_total:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
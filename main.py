@@ -10,8 +10,25 @@ Fecha: 2025-07-25 01:43:49 UTC
 import sys
 import os
 import sqlite3
+import threading
+import time
+import atexit
+import logging
+import logging.handlers
 from datetime import datetime, date
+from collections import OrderedDict, namedtuple, deque, Counter
+from itertools import starmap
+import functools
 import json
+import base64
+import re
+import csv
+import gzip
+import queue
+import socket
+import struct
+import zlib
+from concurrent.futures import Future
 
 try:
     from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
@@ -21,207 +38,3000 @@ try:
                                 QTableWidget, QTableWidgetItem, QTextEdit, QComboBox,
                                 QDateEdit, QSpinBox, QDoubleSpinBox, QCheckBox,
                                 QFileDialog, QProgressBar, QGroupBox, QListWidget,
-                                QSplitter, QFormLayout, QHeaderView)
-    from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QDate
-    from PyQt5.QtGui import QFont, QPixmap, QIcon, QColor
+                                QSplitter, QFormLayout, QHeaderView, QTableView,
+                                QAbstractItemView, QStyledItemDelegate, QStyle,
+                                QStyleOptionButton, QStyleOptionViewItem, QToolTip,
+                                QShortcut, QProgressDialog, QListWidgetItem)
+    from PyQt5.QtCore import (Qt, QTimer, pyqtSignal, QDate, QObject,
+                              QRunnable, QThreadPool, QAbstractTableModel,
+                              QModelIndex, QRect, QSize, QEvent)
+    from PyQt5.QtGui import QFont, QPixmap, QIcon, QColor, QKeySequence
     
 except ImportError as e:
     print(f"Error importando PyQt5: {e}")
     sys.exit(1)
 
+try:
+    import psutil
+except ImportError:
+    psutil = None  # Opcional: solo para detectar presión de memoria
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None  # Opcional: exportación a Excel
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None  # Opcional: importación desde Excel
+
+# Configuración por defecto (se puede sobrescribir con jurmaq_config.json)
+CONFIG_POR_DEFECTO = {
+    'db_path': "jurmaq_funcional.db",
+    'pool_max_conexiones': 8,
+    'pool_timeout_espera': 10.0,
+    'pool_verificacion_salud': 30.0,
+    'datos_demo': False,
+    # 'automatico': 'rendimiento' (WAL) en disco local y 'red' en carpetas compartidas
+    'perfil_pragma': 'automatico',
+    'pragmas': {},
+    'wal_limite_bytes': 64 * 1024 * 1024,
+    'wal_revision_cada': 200,
+    'modulos_precalentar': ["Presupuestos", "Órdenes de Compra"],
+    'modulo_inactivo_seg': 600,
+    'max_modulos_pesados': 3,
+    'memoria_limite_mb': 0,
+    'cache_consultas_mb': 16,
+    'dashboard_refresco_seg': 5,
+    'dashboard_refresco_oculto_seg': 60,
+    'instrumentacion_sql': True,
+    'sql_lenta_ms': 200,
+    'sql_log_lentas': "jurmaq_consultas_lentas.log",
+    'sql_log_bytes': 1024 * 1024,
+    'sql_log_copias': 3,
+    'busqueda_candidatos': 2000,
+    'busqueda_espera_ms': 150,
+    'escritura_lote_max': 200,
+    'escritura_lote_ms': 20,
+    # Registro de cambios: lo ya leído por todos los consumidores se borra pasados
+    # 'cambios_retencion_dias'; lo más viejo que 'cambios_retencion_max_dias', siempre
+    'cambios_retencion_dias': 7,
+    'cambios_retencion_max_dias': 90,
+    'cambios_sondeo_ms': 2000,
+    'cambios_sondeo_max': 2000,
+    # 'local': abrir db_path directamente; 'remoto': usar el servicio de datos
+    # (servidor_datos.py) en servidor_direccion ('host:puerto' o 'unix:/ruta')
+    'modo_datos': 'local',
+    'servidor_direccion': "127.0.0.1:8765",
+    'servidor_token': "",
+    'servidor_timeout': 30,
+    # El servidor cierra (y revierte) las sesiones sin tramas durante tantos segundos
+    'servidor_inactividad': 600,
+}
+
+# Perfiles de PRAGMA aplicados a cada conexión nueva. 'red' evita WAL porque
+# la memoria compartida del WAL no funciona en carpetas compartidas (SMB).
+PERFILES_PRAGMA = {
+    'compatible': {
+        'busy_timeout': 5000,
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+    'rendimiento': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+    'red': {
+        'busy_timeout': 15000,
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -32768,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Sistemas de archivos de red (montajes en Linux/macOS) donde WAL no es seguro
+SISTEMAS_ARCHIVOS_RED = {'cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afpfs', 'fuse.sshfs', '9p'}
+
+def ruta_en_red(ruta):
+    """True si el archivo está en una carpeta compartida (UNC, unidad de red o montaje CIFS/NFS)"""
+    ruta = os.path.abspath(ruta)
+    if ruta.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        unidad = os.path.splitdrive(ruta)[0]
+        # 4 = DRIVE_REMOTE (unidad de red mapeada, p. ej. Z:)
+        return bool(unidad) and ctypes.windll.kernel32.GetDriveTypeW(unidad + "\\") == 4
+    try:
+        with open("/proc/mounts", encoding="utf-8") as archivo:
+            montajes = [linea.split()[1:3] for linea in archivo if len(linea.split()) >= 3]
+    except OSError:
+        return False
+    directorio = os.path.dirname(os.path.realpath(ruta))
+    punto_mayor, tipo = "", None
+    for punto, sistema in montajes:
+        punto = punto.replace("\\040", " ")
+        contiene = directorio == punto or directorio.startswith(punto.rstrip("/") + "/")
+        if contiene and len(punto) > len(punto_mayor):
+            punto_mayor, tipo = punto, sistema
+    return tipo in SISTEMAS_ARCHIVOS_RED
+
+# Orden de aplicación: busy_timeout primero para que el cambio de journal espere bloqueos
+ORDEN_PRAGMAS = ['busy_timeout', 'journal_mode', 'synchronous', 'cache_size',
+                 'mmap_size', 'temp_store', 'wal_autocheckpoint']
+
+def cargar_configuracion(ruta="jurmaq_config.json"):
+    """Cargar configuración desde archivo JSON sobre los valores por defecto"""
+    config = dict(CONFIG_POR_DEFECTO)
+    if ruta and os.path.exists(ruta):
+        try:
+            with open(ruta, encoding="utf-8") as archivo:
+                config.update(json.load(archivo))
+        except (OSError, ValueError) as e:
+            print(f"Error leyendo configuración {ruta}: {e}")
+    return config
+
+# --- Instrumentación de SQL ---
+
+_PATRON_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_PATRON_NUMEROS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PATRON_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_PATRON_ESPACIOS = re.compile(r"\s+")
+
+# Clases de la capa de datos: el origen de una consulta es el primer llamador fuera de ellas
+_CAPA_DATOS = {'ConexionMedida', 'CursorMedido', 'PooledConnection', 'ConnectionPool',
+               '_PoolCheckout', 'DatabaseManager', 'QueryCache', '_QueryTask', 'QueryExecutor'}
+
+@functools.lru_cache(maxsize=4096)
+def huella_sql(sql):
+    """Forma normalizada de una consulta: sin literales ni espacios repetidos"""
+    huella = _PATRON_CADENAS.sub("?", sql)
+    huella = _PATRON_NUMEROS.sub("?", huella)
+    huella = _PATRON_ESPACIOS.sub(" ", huella).strip()
+    return _PATRON_LISTAS.sub("(?...)", huella)
+
+def origen_consulta():
+    """Clase (o función) que originó la consulta, fuera de la capa de datos"""
+    marco = sys._getframe(2)
+    for _ in range(16):
+        if marco is None:
+            break
+        propio = marco.f_locals.get('self')
+        nombre = type(propio).__name__ if propio is not None else None
+        if nombre not in _CAPA_DATOS and marco.f_code.co_name != 'ejecutar':
+            return nombre or marco.f_code.co_name
+        marco = marco.f_back
+    return "?"
+
+class EstadisticasSQL:
+    """Tiempos, filas y origen agregados por huella de consulta.
+
+    Guarda las últimas muestras de cada huella para los percentiles y escribe
+    en un log rotativo las consultas que superan el umbral de lentitud.
+    """
+
+    MUESTRAS = 512
+
+    def __init__(self, umbral_ms=200, ruta_log=None, max_bytes=1024 * 1024, copias=3):
+        self.umbral = umbral_ms / 1000.0
+        self._lock = threading.Lock()
+        self._huellas = {}
+        self.log = None
+        if ruta_log:
+            self.log = logging.getLogger(f"jurmaq.sql_lentas.{os.path.abspath(ruta_log)}")
+            self.log.propagate = False
+            if not self.log.handlers:
+                manejador = logging.handlers.RotatingFileHandler(
+                    ruta_log, maxBytes=max_bytes, backupCount=copias, encoding="utf-8", delay=True)
+                manejador.setFormatter(logging.Formatter("%(message)s"))
+                self.log.addHandler(manejador)
+                self.log.setLevel(logging.INFO)
+
+    def registrar(self, huella, parametros, filas, segundos, origen):
+        with self._lock:
+            datos = self._huellas.get(huella)
+            if datos is None:
+                datos = self._huellas[huella] = {
+                    'llamadas': 0, 'total': 0.0, 'maximo': 0.0, 'filas': 0,
+                    'parametros': parametros, 'muestras': deque(maxlen=self.MUESTRAS),
+                    'origenes': Counter(),
+                }
+            datos['llamadas'] += 1
+            datos['total'] += segundos
+            datos['maximo'] = max(datos['maximo'], segundos)
+            datos['filas'] += max(filas, 0)
+            datos['muestras'].append(segundos)
+            datos['origenes'][origen] += 1
+        if segundos >= self.umbral and self.log is not None:
+            self.log.info(json.dumps({
+                'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'ms': round(segundos * 1000, 2),
+                'filas': filas,
+                'parametros': parametros,
+                'origen': origen,
+                'sql': huella,
+            }, ensure_ascii=False))
+
+    def resumen(self):
+        """Una fila por huella, de mayor a menor tiempo total"""
+        with self._lock:
+            copia = [(h, dict(d, muestras=sorted(d['muestras']), origenes=d['origenes'].most_common(3)))
+                     for h, d in self._huellas.items()]
+        filas = []
+        for huella, datos in copia:
+            muestras = datos['muestras']
+
+            def percentil(p):
+                return muestras[min(len(muestras) - 1, int(p / 100.0 * len(muestras)))] * 1000
+
+            filas.append({
+                'sql': huella,
+                'llamadas': datos['llamadas'],
+                'total_ms': round(datos['total'] * 1000, 2),
+                'p50_ms': round(percentil(50), 3),
+                'p95_ms': round(percentil(95), 3),
+                'p99_ms': round(percentil(99), 3),
+                'max_ms': round(datos['maximo'] * 1000, 3),
+                'filas_promedio': round(datos['filas'] / datos['llamadas'], 1),
+                'parametros': datos['parametros'],
+                'origenes': [o for o, _ in datos['origenes']],
+            })
+        filas.sort(key=lambda f: f['total_ms'], reverse=True)
+        return filas
+
+    def reiniciar(self):
+        with self._lock:
+            self._huellas.clear()
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mide ejecución más lectura y cuenta las filas devueltas"""
+
+    _medicion = None
+
+    def _iniciar(self, sql, parametros):
+        self._cerrar_medicion()
+        estadisticas = getattr(self.connection, 'estadisticas', None)
+        if estadisticas is None:
+            return None
+        self._medicion = [estadisticas, huella_sql(sql), parametros, 0, 0.0, origen_consulta()]
+        return self._medicion
+
+    def _sumar(self, segundos, filas=0, fin=False):
+        medicion = self._medicion
+        if medicion is not None:
+            medicion[3] += filas
+            medicion[4] += segundos
+            if fin:
+                self._cerrar_medicion()
+
+    def _cerrar_medicion(self):
+        medicion, self._medicion = self._medicion, None
+        if medicion is not None:
+            estadisticas, huella, parametros, filas, segundos, origen = medicion
+            estadisticas.registrar(huella, parametros, filas, segundos, origen)
+
+    def execute(self, sql, parametros=()):
+        medicion = self._iniciar(sql, len(parametros))
+        inicio = time.perf_counter()
+        try:
+            super().execute(sql, parametros)
+        finally:
+            if medicion is not None:
+                # Sin columnas (INSERT/UPDATE/DELETE): la medición termina aquí
+                sin_filas = self.description is None
+                self._sumar(time.perf_counter() - inicio,
+                            max(self.rowcount, 0) if sin_filas else 0, fin=sin_filas)
+        return self
+
+    def executemany(self, sql, secuencia):
+        medicion = self._iniciar(sql, -1)
+        inicio = time.perf_counter()
+        try:
+            super().executemany(sql, secuencia)
+        finally:
+            if medicion is not None:
+                self._sumar(time.perf_counter() - inicio, max(self.rowcount, 0), fin=True)
+        return self
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self._sumar(time.perf_counter() - inicio, fila is not None, fin=fila is None)
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self._sumar(time.perf_counter() - inicio, len(filas), fin=not filas)
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self._sumar(time.perf_counter() - inicio, len(filas), fin=True)
+        return filas
+
+    def __next__(self):
+        # Al iterar solo se cuentan filas: cronometrar cada una costaría más que leerla
+        try:
+            fila = super().__next__()
+        except StopIteration:
+            self._cerrar_medicion()
+            raise
+        if self._medicion is not None:
+            self._medicion[3] += 1
+        return fila
+
+    def close(self):
+        self._cerrar_medicion()
+        super().close()
+
+    def __del__(self):
+        self._cerrar_medicion()
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores registran cada consulta en 'estadisticas'"""
+
+    estadisticas = None
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+class PooledConnection:
+    """Conexión prestada por el pool; close() la devuelve en vez de cerrarla"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, nombre):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Conexión ya devuelta al pool")
+        return getattr(self._conn, nombre)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        """Devolver la conexión al pool"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class ConnectionPool:
+    """Pool de conexiones SQLite persistentes con afinidad por hilo"""
+
+    def __init__(self, db_path, max_conexiones=8, timeout_espera=10.0, verificacion_salud=30.0,
+                 al_abrir=None, al_devolver=None, fabrica=sqlite3.Connection, conectar=None):
+        self.db_path = db_path
+        self.fabrica = fabrica
+        # conectar(**opciones) reemplaza a sqlite3.connect (p. ej. modo remoto)
+        self._conectar = conectar
+        self.max_conexiones = max(1, int(max_conexiones))
+        self.timeout_espera = timeout_espera
+        self.verificacion_salud = verificacion_salud
+        # Ganchos opcionales: al_abrir(conn) configura cada conexión nueva,
+        # al_devolver(conn) se llama antes de devolverla al pool
+        self.al_abrir = al_abrir
+        self.al_devolver = al_devolver
+
+        self._lock = threading.Condition()
+        self._libres = []           # [(conn, momento_devolucion)]
+        self._abiertas = 0
+        self._local = threading.local()
+        self._cerrado = False
+
+        self.estadisticas = {
+            'aperturas': 0,
+            'reutilizaciones': 0,
+            'descartadas': 0,
+            'esperas': 0,
+        }
+
+    def conectar(self, **opciones):
+        """Abrir una conexión suelta (fuera del pool) al mismo destino"""
+        if self._conectar is not None:
+            return self._conectar(**opciones)
+        return sqlite3.connect(self.db_path, check_same_thread=False, factory=self.fabrica, **opciones)
+
+    def _abrir(self):
+        """Abrir una conexión nueva"""
+        conn = self.conectar()
+        try:
+            if self.al_abrir:
+                self.al_abrir(conn)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        self.estadisticas['aperturas'] += 1
+        return conn
+
+    def _saludable(self, conn, devuelta_en):
+        """Verificar una conexión que estuvo inactiva demasiado tiempo"""
+        if time.monotonic() - devuelta_en < self.verificacion_salud:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _descartar(self, conn):
+        """Cerrar una conexión defectuosa (llamar con el lock tomado)"""
+        self._abiertas -= 1
+        self.estadisticas['descartadas'] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _tomar_libre(self):
+        """Tomar una conexión libre, prefiriendo la última usada por este hilo"""
+        preferida = getattr(self._local, 'conn', None)
+        for i, (conn, devuelta_en) in enumerate(self._libres):
+            if conn is preferida:
+                return self._libres.pop(i)
+        return self._libres.pop()
+
+    def acquire(self):
+        """Obtener una conexión cruda del pool"""
+        limite = time.monotonic() + self.timeout_espera
+        conn = None
+        with self._lock:
+            while True:
+                if self._cerrado:
+                    raise sqlite3.ProgrammingError("El pool de conexiones está cerrado")
+
+                if self._libres:
+                    conn, devuelta_en = self._tomar_libre()
+                    if self._saludable(conn, devuelta_en):
+                        self.estadisticas['reutilizaciones'] += 1
+                        break
+                    self._descartar(conn)
+                    conn = None
+                    continue
+
+                if self._abiertas < self.max_conexiones:
+                    # Reservar el cupo; la conexión se abre fuera del lock
+                    self._abiertas += 1
+                    break
+
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise sqlite3.OperationalError(
+                        f"Sin conexiones disponibles (máximo {self.max_conexiones})")
+                self.estadisticas['esperas'] += 1
+                self._lock.wait(restante)
+
+        if conn is None:
+            try:
+                conn = self._abrir()
+            except sqlite3.Error:
+                with self._lock:
+                    self._abiertas -= 1
+                    self._lock.notify()
+                raise
+
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn):
+        """Devolver una conexión al pool, descartando transacciones abiertas"""
+        if self.al_devolver:
+            try:
+                self.al_devolver(conn)
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._descartar(conn)
+                self._lock.notify()
+                return
+
+            if self._cerrado:
+                self._abiertas -= 1
+                conn.close()
+            else:
+                self._libres.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def checkout(self):
+        """Obtener una conexión envuelta que se devuelve al pool con close()"""
+        return PooledConnection(self, self.acquire())
+
+    def conexion(self):
+        """Context manager: presta una conexión, confirma o revierte y la devuelve"""
+        return _PoolCheckout(self)
+
+    def resumen(self):
+        """Estado actual y contadores del pool"""
+        with self._lock:
+            datos = dict(self.estadisticas)
+            datos['abiertas'] = self._abiertas
+            datos['libres'] = len(self._libres)
+            datos['max_conexiones'] = self.max_conexiones
+        return datos
+
+    def close(self):
+        """Cerrar todas las conexiones libres y rechazar nuevos préstamos"""
+        with self._lock:
+            self._cerrado = True
+            for conn, _ in self._libres:
+                self._abiertas -= 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._libres = []
+            self._lock.notify_all()
+
+class _PoolCheckout:
+    """Préstamo de conexión para usar con 'with'"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    def __enter__(self):
+        self._conn = self._pool.acquire()
+        return self._conn
+
+    def __exit__(self, tipo, valor, traza):
+        conn, self._conn = self._conn, None
+        try:
+            if tipo is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        finally:
+            self._pool.release(conn)
+        return False
+
+# --- Modo remoto: protocolo del servicio de datos ---
+#
+# Trama: 4 bytes de largo (big endian) + 1 byte de opciones (bit 0: zlib) +
+# contenido. El contenido es un valor codificado con etiquetas de un byte:
+# N nulo, T/F booleano, i/q entero 32/64 bits, d float, s/S texto (largo 1/4
+# bytes), b bytes, l lista, t tupla, m diccionario. Cada trama del cliente es
+# una lista de solicitudes [op, *args] que el servidor atiende en orden; la
+# respuesta es [en_transaccion, [resultado, ...]] con resultado ['ok', valor]
+# o ['error', clase, mensaje] (la primera falla corta el resto del lote).
+
+PROTOCOLO_VERSION = 1
+TRAMA_MAXIMA = 256 * 1024 * 1024
+TRAMA_MAXIMA_INICIAL = 64 * 1024        # Antes del 'hola': basta para el handshake
+TRAMA_COMPRIMIR = 16 * 1024
+
+_ENCABEZADO = struct.Struct(">IB")
+_I32 = struct.Struct("<i")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_U32 = struct.Struct("<I")
+
+def codificar(valor, salida=None):
+    """Valor (None, bool, int, float, str, bytes, list, tuple, dict) -> bytearray"""
+    if salida is None:
+        salida = bytearray()
+    tipo = type(valor)
+    if valor is None:
+        salida += b"N"
+    elif tipo is str:
+        datos = valor.encode("utf-8")
+        if len(datos) < 256:
+            salida += b"s"
+            salida.append(len(datos))
+        else:
+            salida += b"S" + _U32.pack(len(datos))
+        salida += datos
+    elif tipo is int:
+        if -2147483648 <= valor <= 2147483647:
+            salida += b"i" + _I32.pack(valor)
+        else:
+            salida += b"q" + _I64.pack(valor)
+    elif tipo is float:
+        salida += b"d" + _F64.pack(valor)
+    elif tipo is bool:
+        salida += b"T" if valor else b"F"
+    elif tipo is tuple or tipo is list:
+        salida += (b"t" if tipo is tuple else b"l") + _U32.pack(len(valor))
+        for elemento in valor:
+            codificar(elemento, salida)
+    elif tipo is dict:
+        salida += b"m" + _U32.pack(len(valor))
+        for clave, elemento in valor.items():
+            codificar(clave, salida)
+            codificar(elemento, salida)
+    elif isinstance(valor, (bytes, bytearray, memoryview)):
+        datos = bytes(valor)
+        salida += b"b" + _U32.pack(len(datos)) + datos
+    elif isinstance(valor, int):
+        codificar(int(valor), salida)           # Subclases (IntEnum, etc.)
+    elif isinstance(valor, float):
+        codificar(float(valor), salida)
+    elif isinstance(valor, str):
+        codificar(str(valor), salida)
+    else:
+        raise sqlite3.InterfaceError(f"Tipo no soportado por el protocolo: {tipo.__name__}")
+    return salida
+
+def decodificar(datos):
+    """bytes -> valor (inverso de codificar)"""
+    datos = bytes(datos)
+
+    def leer(pos):
+        etiqueta = datos[pos]
+        pos += 1
+        if etiqueta == 0x4E:                                    # N
+            return None, pos
+        if etiqueta == 0x73:                                    # s
+            largo = datos[pos]
+            return datos[pos + 1:pos + 1 + largo].decode("utf-8"), pos + 1 + largo
+        if etiqueta == 0x69:                                    # i
+            return _I32.unpack_from(datos, pos)[0], pos + 4
+        if etiqueta == 0x74 or etiqueta == 0x6C:                # t, l
+            cantidad = _U32.unpack_from(datos, pos)[0]
+            pos += 4
+            elementos = []
+            agregar = elementos.append
+            for _ in range(cantidad):
+                # Escalares frecuentes en línea: una fila no paga una llamada por valor
+                e = datos[pos]
+                if e == 0x73:
+                    largo = datos[pos + 1]
+                    agregar(datos[pos + 2:pos + 2 + largo].decode("utf-8"))
+                    pos += 2 + largo
+                elif e == 0x69:
+                    agregar(_I32.unpack_from(datos, pos + 1)[0])
+                    pos += 5
+                elif e == 0x4E:
+                    agregar(None)
+                    pos += 1
+                elif e == 0x64:
+                    agregar(_F64.unpack_from(datos, pos + 1)[0])
+                    pos += 9
+                else:
+                    elemento, pos = leer(pos)
+                    agregar(elemento)
+            return (tuple(elementos) if etiqueta == 0x74 else elementos), pos
+        if etiqueta == 0x64:                                    # d
+            return _F64.unpack_from(datos, pos)[0], pos + 8
+        if etiqueta == 0x71:                                    # q
+            return _I64.unpack_from(datos, pos)[0], pos + 8
+        if etiqueta == 0x53 or etiqueta == 0x62:                # S, b
+            largo = _U32.unpack_from(datos, pos)[0]
+            pos += 4
+            trozo = datos[pos:pos + largo]
+            return (trozo.decode("utf-8") if etiqueta == 0x53 else trozo), pos + largo
+        if etiqueta == 0x54 or etiqueta == 0x46:                # T, F
+            return etiqueta == 0x54, pos
+        if etiqueta == 0x6D:                                    # m
+            cantidad = _U32.unpack_from(datos, pos)[0]
+            pos += 4
+            dic = {}
+            for _ in range(cantidad):
+                clave, pos = leer(pos)
+                dic[clave], pos = leer(pos)
+            return dic, pos
+        raise sqlite3.InterfaceError(f"Etiqueta desconocida en la trama: {etiqueta:#x}")
+
+    try:
+        valor, pos = leer(0)
+    except (IndexError, struct.error, UnicodeDecodeError, RecursionError) as e:
+        raise sqlite3.InterfaceError(f"Trama inválida: {e!r}") from e
+    if pos != len(datos):
+        raise sqlite3.InterfaceError("Trama inválida: sobran bytes")
+    return valor
+
+def enviar_trama(sock, valor):
+    contenido = codificar(valor)
+    opciones = 0
+    if len(contenido) > TRAMA_COMPRIMIR:
+        comprimido = zlib.compress(contenido, 1)
+        if len(comprimido) < len(contenido):
+            contenido, opciones = comprimido, 1
+    sock.sendall(_ENCABEZADO.pack(len(contenido), opciones) + contenido)
+
+def _recibir_exacto(sock, largo):
+    partes = []
+    while largo:
+        parte = sock.recv(min(largo, 1024 * 1024))
+        if not parte:
+            return None
+        partes.append(parte)
+        largo -= len(parte)
+    return b"".join(partes)
+
+def leer_trama(sock, maximo=TRAMA_MAXIMA):
+    """Siguiente trama decodificada, o None si el otro extremo cerró.
+
+    'maximo' acota tanto la trama recibida como su contenido descomprimido.
+    """
+    encabezado = _recibir_exacto(sock, _ENCABEZADO.size)
+    if encabezado is None:
+        return None
+    largo, opciones = _ENCABEZADO.unpack(encabezado)
+    if largo > maximo:
+        raise sqlite3.InterfaceError(f"Trama demasiado grande ({largo} bytes)")
+    contenido = _recibir_exacto(sock, largo) if largo else b""
+    if contenido is None:
+        return None
+    if opciones & 1:
+        descompresor = zlib.decompressobj()
+        try:
+            contenido = descompresor.decompress(contenido, maximo)
+        except zlib.error as e:
+            raise sqlite3.InterfaceError(f"Trama inválida: {e}") from e
+        if descompresor.unconsumed_tail:
+            raise sqlite3.InterfaceError(f"Trama descomprimida demasiado grande (más de {maximo} bytes)")
+        if not descompresor.eof:
+            raise sqlite3.InterfaceError("Trama inválida: contenido comprimido incompleto")
+    return decodificar(contenido)
+
+def abrir_socket(direccion, timeout=None):
+    """'host:puerto' (TCP) o 'unix:/ruta/al.sock'"""
+    if direccion.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(direccion[5:])
+    else:
+        host, _, puerto = direccion.rpartition(":")
+        sock = socket.create_connection((host or "127.0.0.1", int(puerto)), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+def error_remoto(clase, mensaje):
+    """Excepción de sqlite3 equivalente a la que ocurrió en el servidor"""
+    tipo = getattr(sqlite3, clase, None)
+    if not (isinstance(tipo, type) and issubclass(tipo, sqlite3.Error)):
+        tipo = sqlite3.DatabaseError
+    return tipo(mensaje)
+
+class RemoteCursor:
+    """Cursor sobre un servidor de datos: las filas llegan por bloques a pedido"""
+
+    def __init__(self, conexion):
+        self.connection = conexion
+        self.arraysize = 1
+        self.description = None
+        self.lastrowid = None
+        self.rowcount = -1
+        self._id = 0                # cursor abierto en el servidor (0: agotado)
+        self._filas = deque()
+        self._bloque = 256
+
+    def _cerrar_servidor(self):
+        """Solicitud para liberar el cursor del servidor (va en el lote siguiente)"""
+        previo, self._id = self._id, 0
+        return [['cerrar', previo]] if previo else []
+
+    def _recibir_resultado(self, resultado):
+        self._id, nombres, self.lastrowid, self.rowcount, filas = resultado
+        self.description = tuple((n, None, None, None, None, None, None) for n in nombres) if nombres else None
+        self._filas = deque(filas)
+        self._bloque = 256
+
+    def execute(self, sql, parametros=()):
+        previas = self._cerrar_servidor()
+        resultados = self.connection._pedir(
+            previas + [['ejecutar', sql, parametros, self.connection.prefetch]])
+        self._recibir_resultado(resultados[-1])
+        return self
+
+    def executemany(self, sql, secuencia):
+        previas = self._cerrar_servidor()
+        resultados = self.connection._pedir(previas + [['muchos', sql, [tuple(p) for p in secuencia]]])
+        self.description = None
+        self._filas = deque()
+        self.lastrowid, self.rowcount = resultados[-1]
+        return self
+
+    def _traer(self, cantidad):
+        if not self._id:
+            return False
+        filas, hay_mas = self.connection._pedir([['traer', self._id, cantidad]])[0]
+        if not hay_mas:
+            self._id = 0
+        self._filas.extend(filas)
+        return bool(filas)
+
+    def fetchone(self):
+        if not self._filas:
+            # Bloques crecientes: pocas filas si solo se pide una, muchas si se recorre todo
+            self._traer(self._bloque)
+            self._bloque = min(self._bloque * 2, 8192)
+        return self._filas.popleft() if self._filas else None
+
+    def fetchmany(self, cantidad=None):
+        cantidad = self.arraysize if cantidad is None else cantidad
+        while len(self._filas) < cantidad and self._traer(max(cantidad - len(self._filas), self._bloque)):
+            pass
+        return [self._filas.popleft() for _ in range(min(cantidad, len(self._filas)))]
+
+    def fetchall(self):
+        filas, self._filas = list(self._filas), deque()
+        if self._id:
+            previo, self._id = self._id, 0
+            filas.extend(self.connection._traer_todo(previo, 8192))
+        return filas
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        fila = self.fetchone()
+        if fila is None:
+            raise StopIteration
+        return fila
+
+    def close(self):
+        previas = self._cerrar_servidor()
+        self._filas = deque()
+        if previas and not self.connection._cerrada:
+            try:
+                self.connection._pedir(previas)
+            except sqlite3.Error:
+                pass
+
+class RemoteConnection:
+    """Conexión a un servidor de datos JURMAQ con la interfaz de sqlite3.Connection.
+
+    Del otro lado hay una conexión SQLite propia de esta sesión, así que las
+    transacciones, lastrowid y los errores (IntegrityError, etc.) se comportan
+    igual que en modo local. interrupt() usa un socket aparte.
+    """
+
+    def __init__(self, direccion, token="", isolation_level="", timeout=30.0, prefetch=256):
+        self.direccion = direccion
+        self.token = token
+        self.timeout = timeout
+        self.prefetch = prefetch
+        self.isolation_level = isolation_level
+        self.in_transaction = False
+        self._lock = threading.Lock()
+        self._cerrada = False
+        try:
+            self._sock = abrir_socket(direccion, timeout)
+        except OSError as e:
+            raise sqlite3.OperationalError(f"No se pudo conectar al servidor de datos {direccion}: {e}") from e
+        self._sesion, self._clave = self._pedir(
+            [['hola', PROTOCOLO_VERSION, token, {'isolation_level': isolation_level}]])[0]
+
+    def _pedir(self, solicitudes):
+        """Enviar un lote de solicitudes y devolver sus valores (o lanzar el primer error)"""
+        def intercambiar():
+            enviar_trama(self._sock, solicitudes)
+            return self._recibir()
+        return self._valores(self._usar_socket(intercambiar))
+
+    def _traer_todo(self, id_cursor, cantidad):
+        """Todas las filas restantes de un cursor del servidor.
+
+        Siempre hay un 'traer' en vuelo: el servidor lee el bloque siguiente
+        mientras aquí se decodifica el actual.
+        """
+        def recorrer():
+            filas, error = [], None
+            pedido = [['traer', id_cursor, cantidad]]
+            enviar_trama(self._sock, pedido)
+            enviar_trama(self._sock, pedido)
+            pendientes, hay_mas = 2, True
+            while pendientes:
+                respuesta = self._recibir()
+                pendientes -= 1
+                if not hay_mas:
+                    continue        # Respuesta vacía del pedido adelantado
+                try:
+                    bloque, hay_mas = self._valores(respuesta)[0]
+                except sqlite3.Error as e:
+                    error, hay_mas = e, False
+                    continue        # Vaciar lo que quede en vuelo antes de lanzar
+                filas.extend(bloque)
+                if hay_mas:
+                    enviar_trama(self._sock, pedido)
+                    pendientes += 1
+            if error is not None:
+                raise error
+            return filas
+        return self._usar_socket(recorrer)
+
+    def _usar_socket(self, funcion):
+        """Ejecutar funcion() con el socket tomado, traduciendo las fallas de red"""
+        if self._cerrada:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        with self._lock:
+            try:
+                return funcion()
+            except OSError as e:
+                self._cerrar_socket()
+                raise sqlite3.OperationalError(f"Conexión con el servidor de datos perdida: {e}") from e
+
+    def _recibir(self):
+        respuesta = leer_trama(self._sock)
+        if respuesta is None:
+            self._cerrar_socket()
+            raise sqlite3.OperationalError("El servidor de datos cerró la conexión")
+        return respuesta
+
+    def _valores(self, respuesta):
+        self.in_transaction, resultados = respuesta
+        valores = []
+        for resultado in resultados:
+            if resultado[0] != 'ok':
+                raise error_remoto(resultado[1], resultado[2])
+            valores.append(resultado[1])
+        return valores
+
+    def _cerrar_socket(self):
+        self._cerrada = True
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+    def cursor(self):
+        return RemoteCursor(self)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+    def commit(self):
+        self._pedir([['commit']])
+
+    def rollback(self):
+        self._pedir([['rollback']])
+
+    def interrupt(self):
+        """Cortar la consulta en curso de esta sesión (se puede llamar desde otro hilo)"""
+        try:
+            sock = abrir_socket(self.direccion, 5.0)
+            try:
+                enviar_trama(sock, [['interrumpir', self._sesion, self._clave]])
+                leer_trama(sock)
+            finally:
+                sock.close()
+        except (OSError, sqlite3.Error):
+            pass
+
+    def close(self):
+        if not self._cerrada:
+            try:
+                with self._lock:
+                    enviar_trama(self._sock, [['adios']])
+            except OSError:
+                pass
+            self._cerrar_socket()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+ESQUEMA_INICIAL = [
+    # Tabla usuarios
+    """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            nombre TEXT NOT NULL,
+            email TEXT,
+            tipo_usuario TEXT DEFAULT 'Administrador',
+            estado TEXT DEFAULT 'Activo',
+            fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+
+    # Tabla presupuestos
+    """
+        CREATE TABLE IF NOT EXISTS presupuestos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_presupuesto TEXT UNIQUE NOT NULL,
+            cliente TEXT NOT NULL,
+            proyecto TEXT NOT NULL,
+            descripcion TEXT,
+            monto_total REAL DEFAULT 0,
+            estado TEXT DEFAULT 'Borrador',
+            fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+            usuario_id INTEGER,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    """,
+
+    # Tabla órdenes de compra
+    """
+        CREATE TABLE IF NOT EXISTS ordenes_compra (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_oc TEXT UNIQUE NOT NULL,
+            proveedor TEXT NOT NULL,
+            descripcion TEXT,
+            monto_total REAL DEFAULT 0,
+            estado TEXT DEFAULT 'Pendiente',
+            fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+            fecha_entrega DATE,
+            usuario_id INTEGER,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    """,
+
+    # Tabla empleados
+    """
+        CREATE TABLE IF NOT EXISTS empleados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rut TEXT UNIQUE NOT NULL,
+            nombre TEXT NOT NULL,
+            apellido TEXT NOT NULL,
+            cargo TEXT,
+            sueldo_base REAL DEFAULT 0,
+            estado TEXT DEFAULT 'Activo',
+            fecha_ingreso DATE,
+            email TEXT,
+            telefono TEXT
+        )
+    """,
+
+    # Tabla vehículos
+    """
+        CREATE TABLE IF NOT EXISTS vehiculos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patente TEXT UNIQUE NOT NULL,
+            marca TEXT,
+            modelo TEXT,
+            año INTEGER,
+            tipo_vehiculo TEXT,
+            estado TEXT DEFAULT 'Disponible',
+            kilometraje INTEGER DEFAULT 0,
+            fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+
+    # Tabla inventario
+    """
+        CREATE TABLE IF NOT EXISTS inventario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo_producto TEXT UNIQUE NOT NULL,
+            nombre_producto TEXT NOT NULL,
+            categoria TEXT,
+            stock_actual INTEGER DEFAULT 0,
+            stock_minimo INTEGER DEFAULT 0,
+            precio_unitario REAL DEFAULT 0,
+            ubicacion TEXT,
+            estado TEXT DEFAULT 'Activo'
+        )
+    """,
+
+    # Tabla documentos
+    """
+        CREATE TABLE IF NOT EXISTS documentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_documento TEXT NOT NULL,
+            tipo_documento TEXT,
+            categoria TEXT,
+            ruta_archivo TEXT,
+            tamaño_archivo INTEGER,
+            fecha_subida DATETIME DEFAULT CURRENT_TIMESTAMP,
+            fecha_vencimiento DATE,
+            usuario_id INTEGER,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    """,
+
+    # Usuario administrador por defecto
+    """
+        INSERT OR IGNORE INTO usuarios (usuario, password, nombre, tipo_usuario)
+        VALUES ('admin', 'admin123', 'Administrador Sistema', 'Administrador')
+    """,
+]
+
+# Datos de ejemplo (opcionales, se cargan una sola vez con datos_demo=true)
+DATOS_DEMO = [
+    # Presupuestos de ejemplo
+    """INSERT OR IGNORE INTO presupuestos (numero_presupuesto, cliente, proyecto, descripcion, monto_total, estado, usuario_id)
+       VALUES 
+       ('PRES-2025-001', 'Constructora ABC', 'Edificio Residencial Las Torres', 'Construcción edificio 15 pisos', 2500000000, 'Aprobado', 1),
+       ('PRES-2025-002', 'Inmobiliaria XYZ', 'Condominio Los Pinos', 'Conjunto habitacional 120 casas', 1800000000, 'En Revisión', 1),
+       ('PRES-2025-003', 'Municipalidad Central', 'Reparación Puente Principal', 'Refuerzo estructural puente vehicular', 450000000, 'Pendiente', 1)""",
+
+    # Órdenes de compra de ejemplo
+    """INSERT OR IGNORE INTO ordenes_compra (numero_oc, proveedor, descripcion, monto_total, estado, fecha_entrega, usuario_id)
+       VALUES 
+       ('OC-2025-001', 'Cemento Sur S.A.', 'Cemento especial 1000 sacos', 15000000, 'Aprobada', '2025-07-30', 1),
+       ('OC-2025-002', 'Ferretería El Martillo', 'Herramientas y materiales varios', 3500000, 'Pendiente', '2025-08-05', 1),
+       ('OC-2025-003', 'Combustibles Norte', 'Diésel para maquinaria 5000 litros', 4200000, 'Entregada', '2025-07-25', 1)""",
+
+    # Empleados de ejemplo
+    """INSERT OR IGNORE INTO empleados (rut, nombre, apellido, cargo, sueldo_base, fecha_ingreso, email, telefono)
+       VALUES 
+       ('12.345.678-9', 'Juan Carlos', 'Pérez Rojas', 'Ingeniero Civil', 2500000, '2023-01-15', 'jperez@empresa.cl', '+56912345678'),
+       ('98.765.432-1', 'María Elena', 'González Silva', 'Arquitecta', 2800000, '2022-03-10', 'mgonzalez@empresa.cl', '+56987654321'),
+       ('11.222.333-4', 'Pedro Luis', 'Martínez Torres', 'Maestro Construcción', 1800000, '2021-06-20', 'pmartinez@empresa.cl', '+56911222333')""",
+
+    # Vehículos de ejemplo
+    """INSERT OR IGNORE INTO vehiculos (patente, marca, modelo, año, tipo_vehiculo, kilometraje)
+       VALUES 
+       ('AB-CD-12', 'Caterpillar', '320D', 2020, 'Excavadora', 1250),
+       ('EF-GH-34', 'Volvo', 'FH16', 2021, 'Camión', 85000),
+       ('IJ-KL-56', 'Toyota', 'Hilux', 2022, 'Camioneta', 45000)""",
+
+    # Inventario de ejemplo
+    """INSERT OR IGNORE INTO inventario (codigo_producto, nombre_producto, categoria, stock_actual, stock_minimo, precio_unitario, ubicacion)
+       VALUES 
+       ('CEM-001', 'Cemento Especial 25kg', 'Materiales', 150, 50, 8500, 'Bodega A'),
+       ('VAR-001', 'Varilla 12mm x 6m', 'Fierros', 200, 30, 12000, 'Bodega B'),
+       ('HER-001', 'Martillo Carpintero', 'Herramientas', 25, 5, 15000, 'Bodega C')""",
+
+    # Documentos de ejemplo
+    """INSERT OR IGNORE INTO documentos (nombre_documento, tipo_documento, categoria, tamaño_archivo, fecha_vencimiento, usuario_id)
+       VALUES 
+       ('Contrato Proyecto Las Torres.pdf', 'PDF', 'Contratos', 2048000, '2025-12-31', 1),
+       ('Planos Edificio Residencial.dwg', 'CAD', 'Planos', 15360000, '2026-06-30', 1),
+       ('Certificado ISO 9001.pdf', 'PDF', 'Certificaciones', 1024000, '2025-10-15', 1)"""
+]
+
+# Catálogo de índices secundarios. 'version' indica la migración que los crea;
+# un índice nuevo se agrega con la versión de una migración nueva.
+CATALOGO_INDICES = [
+    # Listados ordenados por fecha (y desempate estable por id)
+    {'nombre': 'idx_presupuestos_fecha', 'tabla': 'presupuestos',
+     'columnas': 'fecha_creacion, id', 'version': 3},
+    {'nombre': 'idx_presupuestos_estado_fecha', 'tabla': 'presupuestos',
+     'columnas': 'estado, fecha_creacion, id', 'version': 3},
+    {'nombre': 'idx_presupuestos_cliente', 'tabla': 'presupuestos',
+     'columnas': 'cliente, fecha_creacion', 'version': 3},
+    {'nombre': 'idx_ordenes_fecha', 'tabla': 'ordenes_compra',
+     'columnas': 'fecha_creacion, id', 'version': 3},
+    {'nombre': 'idx_ordenes_estado_fecha', 'tabla': 'ordenes_compra',
+     'columnas': 'estado, fecha_creacion, id', 'version': 3},
+    {'nombre': 'idx_ordenes_proveedor', 'tabla': 'ordenes_compra',
+     'columnas': 'proveedor, fecha_creacion', 'version': 3},
+    # Conteos por estado: cubiertos por el propio índice
+    {'nombre': 'idx_empleados_estado', 'tabla': 'empleados',
+     'columnas': 'estado', 'version': 3},
+    {'nombre': 'idx_vehiculos_estado', 'tabla': 'vehiculos',
+     'columnas': 'estado', 'version': 3},
+    # Parciales: solo las filas que interesan en alertas
+    {'nombre': 'idx_inventario_stock_bajo', 'tabla': 'inventario',
+     'columnas': 'categoria, codigo_producto', 'donde': 'stock_actual <= stock_minimo', 'version': 3},
+    {'nombre': 'idx_documentos_vencimiento', 'tabla': 'documentos',
+     'columnas': 'fecha_vencimiento', 'donde': 'fecha_vencimiento IS NOT NULL', 'version': 3},
+]
+
+def sql_crear_indice(indice):
+    """Sentencia CREATE INDEX para una entrada del catálogo"""
+    sql = f"CREATE INDEX IF NOT EXISTS {indice['nombre']} ON {indice['tabla']} ({indice['columnas']})"
+    if indice.get('donde'):
+        sql += f" WHERE {indice['donde']}"
+    return sql
+
+def indices_de_version(version):
+    """Sentencias de los índices del catálogo que crea una migración"""
+    return [sql_crear_indice(i) for i in CATALOGO_INDICES if i['version'] == version]
+
+# Tablas resumidas en 'metricas': cantidad y suma de una columna por estado.
+# Los triggers mantienen los contadores al día; reconstruir_metricas() los
+# recalcula desde cero.
+METRICAS = {
+    'presupuestos': 'monto_total',
+    'ordenes_compra': 'monto_total',
+    'empleados': 'sueldo_base',
+    'vehiculos': 'kilometraje',
+}
+
+def sql_metricas_desde_tabla(tabla):
+    """SELECT que recalcula las métricas de una tabla (tabla, estado, cantidad, suma)"""
+    return f"""
+        SELECT '{tabla}', COALESCE(estado, ''), COUNT(*), COALESCE(SUM({METRICAS[tabla]}), 0)
+        FROM {tabla} GROUP BY COALESCE(estado, '')
+    """
+
+def sql_triggers_metricas(tabla):
+    """Triggers INSERT/UPDATE/DELETE que mantienen 'metricas' para una tabla"""
+    suma = METRICAS[tabla]
+    sumar = f"""
+            INSERT INTO metricas (tabla, estado, cantidad, suma)
+            VALUES ('{tabla}', COALESCE(NEW.estado, ''), 1, COALESCE(NEW.{suma}, 0))
+            ON CONFLICT (tabla, estado) DO UPDATE
+            SET cantidad = cantidad + 1, suma = suma + excluded.suma;"""
+    restar = f"""
+            UPDATE metricas SET cantidad = cantidad - 1, suma = suma - COALESCE(OLD.{suma}, 0)
+            WHERE tabla = '{tabla}' AND estado = COALESCE(OLD.estado, '');"""
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_metricas_{tabla}_ins AFTER INSERT ON {tabla} BEGIN{sumar}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_metricas_{tabla}_del AFTER DELETE ON {tabla} BEGIN{restar}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_metricas_{tabla}_upd AFTER UPDATE OF estado, {suma} ON {tabla} "
+        f"BEGIN{restar}{sumar}\n        END",
+    ]
+
+def sql_leer_metricas(tablas):
+    """SELECT de los contadores de las tablas indicadas (búsqueda por clave primaria)"""
+    return f"""
+        SELECT tabla, estado, cantidad, suma FROM metricas
+        WHERE tabla IN ({', '.join(f"'{t}'" for t in tablas)})
+    """
+
+def migracion_metricas():
+    """Sentencias de la migración que crea y llena la tabla 'metricas'"""
+    sentencias = ["""
+        CREATE TABLE IF NOT EXISTS metricas (
+            tabla TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            suma REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (tabla, estado)
+        ) WITHOUT ROWID
+    """]
+    for tabla in METRICAS:
+        sentencias.append("INSERT OR REPLACE INTO metricas (tabla, estado, cantidad, suma)"
+                          + sql_metricas_desde_tabla(tabla))
+        sentencias.extend(sql_triggers_metricas(tabla))
+    return sentencias
+
+# Tablas con contador de generación: un trigger lo incrementa en cada escritura,
+# también las hechas por otros procesos. El caché de consultas lo usa para saber
+# qué resultados siguen vigentes.
+TABLAS_GENERACION = ['usuarios', 'presupuestos', 'ordenes_compra', 'empleados',
+                     'vehiculos', 'inventario', 'documentos']
+
+def migracion_generaciones():
+    """Tabla 'generaciones' y sus triggers de escritura"""
+    sentencias = ["""
+        CREATE TABLE IF NOT EXISTS generaciones (
+            tabla TEXT PRIMARY KEY,
+            gen INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """]
+    for tabla in TABLAS_GENERACION:
+        sentencias.append(f"INSERT OR IGNORE INTO generaciones (tabla, gen) VALUES ('{tabla}', 0)")
+        for evento, sufijo in (('INSERT', 'ins'), ('UPDATE', 'upd'), ('DELETE', 'del')):
+            sentencias.append(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_gen_{tabla}_{sufijo} AFTER {evento} ON {tabla} BEGIN
+                    UPDATE generaciones SET gen = gen + 1 WHERE tabla = '{tabla}';
+                END
+            """)
+    return sentencias
+
+# Búsqueda de texto completo: un índice FTS5 de contenido externo por tabla
+# (el texto vive solo en la tabla original). 'pesos' va en el orden de
+# 'columnas' para bm25; 'titulo' y 'subtitulo' son expresiones sobre la tabla 't'.
+BUSQUEDAS = {
+    'presupuestos': {
+        'fts': 'busqueda_presupuestos',
+        'columnas': ('numero_presupuesto', 'cliente', 'proyecto', 'descripcion'),
+        'pesos': (10.0, 4.0, 4.0, 1.0),
+        'titulo': "t.numero_presupuesto",
+        'subtitulo': "t.cliente || ' · ' || t.proyecto",
+    },
+    'ordenes_compra': {
+        'fts': 'busqueda_ordenes',
+        'columnas': ('numero_oc', 'proveedor', 'descripcion'),
+        'pesos': (10.0, 4.0, 1.0),
+        'titulo': "t.numero_oc",
+        'subtitulo': "t.proveedor",
+    },
+    'documentos': {
+        'fts': 'busqueda_documentos',
+        'columnas': ('nombre_documento', 'tipo_documento', 'categoria'),
+        'pesos': (6.0, 2.0, 2.0),
+        'titulo': "t.nombre_documento",
+        'subtitulo': "COALESCE(t.categoria, '') || ' · ' || COALESCE(t.tipo_documento, '')",
+    },
+}
+
+def migracion_busqueda():
+    """Tablas FTS5 sincronizadas por triggers, pobladas con 'rebuild'"""
+    sentencias = []
+    for tabla, b in BUSQUEDAS.items():
+        fts, columnas = b['fts'], ', '.join(b['columnas'])
+        nuevos = ', '.join(f"NEW.{c}" for c in b['columnas'])
+        viejos = ', '.join(f"OLD.{c}" for c in b['columnas'])
+        borrar = f"INSERT INTO {fts} ({fts}, rowid, {columnas}) VALUES ('delete', OLD.id, {viejos});"
+        insertar = f"INSERT INTO {fts} (rowid, {columnas}) VALUES (NEW.id, {nuevos});"
+        sentencias += [
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {columnas}, content='{tabla}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+            """,
+            f"CREATE TRIGGER IF NOT EXISTS trg_fts_{tabla}_ins AFTER INSERT ON {tabla} BEGIN {insertar} END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_fts_{tabla}_del AFTER DELETE ON {tabla} BEGIN {borrar} END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_fts_{tabla}_upd AFTER UPDATE OF {columnas} ON {tabla} "
+            f"BEGIN {borrar} {insertar} END",
+            f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+        ]
+    return sentencias
+
+def sql_busqueda(tabla):
+    """Coincidencias de una tabla, las mejores primero.
+
+    Parámetros: (expresión MATCH, límite, candidatos). bm25 se calcula solo
+    sobre las 'candidatos' coincidencias más recientes (FTS5 las entrega en
+    orden de rowid sin recorrer el resto), así un término que aparece en
+    millones de filas cuesta lo mismo que uno raro. El fragmento se arma
+    solo para las filas que se devuelven.
+    """
+    b = BUSQUEDAS[tabla]
+    fts = b['fts']
+    pesos = ', '.join(str(p) for p in b['pesos'])
+    return f"""
+        SELECT t.id, {b['titulo']}, {b['subtitulo']},
+               (SELECT snippet({fts}, -1, '«', '»', '…', 10) FROM {fts}
+                WHERE {fts} MATCH ?1 AND rowid = c.id),
+               c.puntaje
+        FROM (SELECT id, puntaje FROM (
+                  SELECT rowid AS id, bm25({fts}, {pesos}) AS puntaje FROM {fts}
+                  WHERE {fts} MATCH ?1 ORDER BY rowid DESC LIMIT ?3)
+              ORDER BY puntaje, id DESC LIMIT ?2) c
+        JOIN {tabla} t ON t.id = c.id
+        ORDER BY c.puntaje, c.id DESC
+    """
+
+def consulta_fts(texto):
+    """Texto libre -> expresión MATCH: todas las palabras, cada una como prefijo.
+
+    'edif viña' -> '"edif"* "viña"*'. Un código con guiones o puntos va como
+    frase con prefijo solo al final ('pres-2024-0001' -> '"pres 2024 0001"*'):
+    los prefijos de partes muy repetidas ('pres', '2024') obligan a FTS5 a
+    mezclar listas enteras, la frase las recorre saltando. Las palabras de una
+    letra van exactas para no recorrer medio índice. None si no queda ninguna.
+    """
+    terminos = []
+    for trozo in (texto or "").split():
+        palabras = re.findall(r"\w+", trozo)
+        if not palabras:
+            continue
+        frase = " ".join(palabras)
+        terminos.append(f'"{frase}"*' if len(frase) > 1 else f'"{frase}"')
+    return " ".join(terminos) or None
+
+TABLAS_BUSQUEDA = {b['fts'] for b in BUSQUEDAS.values()}
+
+ResultadoBusqueda = namedtuple('ResultadoBusqueda', 'tabla id titulo subtitulo fragmento puntaje')
+
+# Registro de cambios (CDC): triggers anotan cada INSERT/UPDATE/DELETE de las
+# tablas de negocio en 'cambios' con una secuencia creciente. AUTOINCREMENT
+# garantiza que una secuencia no se reutiliza, tampoco después de compactar.
+# Cada consumidor con nombre (volcados, réplicas) guarda en
+# 'cambios_consumidores' hasta qué secuencia procesó.
+CLAVES_NEGOCIO = {
+    'usuarios': 'usuario',
+    'presupuestos': 'numero_presupuesto',
+    'ordenes_compra': 'numero_oc',
+    'empleados': 'rut',
+    'vehiculos': 'patente',
+    'inventario': 'codigo_producto',
+    'documentos': None,
+}
+
+OPERACIONES_CAMBIO = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+def sql_triggers_cambios(tabla, columnas, con_origen=True, con_clave_anterior=True):
+    """Triggers que anotan los cambios de una tabla.
+
+    El UPDATE solo se anota si alguna columna cambió de verdad: un upsert que
+    reescribe los mismos valores (importaciones) no genera ruido. Con
+    con_origen, el sitio y el momento salen de 'replicacion_contexto' si la
+    transacción los fijó (cambios que llegan de otra base); si no, el cambio
+    es local y de ahora. Con con_clave_anterior, un UPDATE que cambia la clave
+    de negocio anota también la anterior. con_origen=False es la forma de la
+    migración 7; con_clave_anterior=False, la de la 8.
+    """
+    clave = CLAVES_NEGOCIO.get(tabla)
+
+    def anotar(op, fila):
+        valor_clave = f"{fila}.{clave}" if clave else "NULL"
+        if not con_origen:
+            return (f"INSERT INTO cambios (tabla, fila_id, clave, op) "
+                    f"VALUES ('{tabla}', {fila}.id, {valor_clave}, '{op}');")
+        if not con_clave_anterior:
+            return (f"INSERT INTO cambios (tabla, fila_id, clave, op, origen, momento) "
+                    f"VALUES ('{tabla}', {fila}.id, {valor_clave}, '{op}', "
+                    f"(SELECT origen FROM replicacion_contexto), "
+                    f"COALESCE((SELECT momento FROM replicacion_contexto), CURRENT_TIMESTAMP));")
+        anterior = f"CASE WHEN OLD.{clave} IS NOT NEW.{clave} THEN OLD.{clave} END" if clave and op == 'U' else "NULL"
+        return (f"INSERT INTO cambios (tabla, fila_id, clave, op, origen, momento, clave_anterior) "
+                f"VALUES ('{tabla}', {fila}.id, {valor_clave}, '{op}', "
+                f"(SELECT origen FROM replicacion_contexto), "
+                f"COALESCE((SELECT momento FROM replicacion_contexto), CURRENT_TIMESTAMP), {anterior});")
+
+    distinto = " OR ".join(f'OLD."{c}" IS NOT NEW."{c}"' for c in columnas)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_cdc_{tabla}_ins AFTER INSERT ON {tabla} "
+        f"BEGIN {anotar('I', 'NEW')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_cdc_{tabla}_del AFTER DELETE ON {tabla} "
+        f"BEGIN {anotar('D', 'OLD')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_cdc_{tabla}_upd AFTER UPDATE ON {tabla} WHEN {distinto} "
+        f"BEGIN {anotar('U', 'NEW')} END",
+    ]
+
+def sql_linea_base_cambios(tabla):
+    """Un 'I' con el momento actual por cada fila con clave que no tenga cambios anotados.
+
+    Las filas anteriores al registro de cambios no tendrían versión contra la
+    que comparar un cambio de otro sitio; así su estado queda fechado en la
+    migración.
+    """
+    return (f"INSERT INTO cambios (tabla, fila_id, clave, op) "
+            f"SELECT '{tabla}', id, {CLAVES_NEGOCIO[tabla]}, 'I' FROM {tabla} "
+            f"WHERE id NOT IN (SELECT fila_id FROM cambios WHERE tabla = '{tabla}') ORDER BY id")
+
+def migracion_cambios(conn):
+    """Tablas del registro de cambios, sus triggers y la línea base de las filas existentes.
+
+    Las columnas de cada tabla se leen del esquema al migrar: una migración
+    que agregue columnas debe recrear los triggers trg_cdc_*_upd.
+    """
+    sentencias = ["""
+        CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            fila_id INTEGER NOT NULL,
+            clave TEXT,
+            op TEXT NOT NULL,
+            momento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS cambios_consumidores (
+            consumidor TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL DEFAULT 0,
+            actualizado DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """]
+    for tabla in TABLAS_GENERACION:
+        columnas = [fila[1] for fila in conn.execute(f'PRAGMA table_info("{tabla}")')]
+        sentencias.extend(sql_triggers_cambios(tabla, columnas, con_origen=False))
+    sentencias.extend(sql_linea_base_cambios(tabla) for tabla in TABLAS_GENERACION if CLAVES_NEGOCIO.get(tabla))
+    return sentencias
+
+def migracion_replicacion(conn):
+    """Origen de cada cambio, contexto de aplicación y estado por sitio para la replicación"""
+    sentencias = [
+        "ALTER TABLE cambios ADD COLUMN origen TEXT",
+        # Una fila como máximo, solo mientras se aplica un paquete (nunca se confirma)
+        """
+        CREATE TABLE IF NOT EXISTS replicacion_contexto (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            origen TEXT,
+            momento TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS replicacion_sitios (
+            sitio TEXT PRIMARY KEY,
+            nombre TEXT,
+            enviado_hasta INTEGER NOT NULL DEFAULT 0,
+            recibido_hasta INTEGER NOT NULL DEFAULT 0,
+            ultimo_envio DATETIME,
+            ultima_recepcion DATETIME
+        ) WITHOUT ROWID
+        """,
+        # Último cambio de una fila por su clave de negocio (resolución de conflictos)
+        "CREATE INDEX IF NOT EXISTS idx_cambios_clave ON cambios (tabla, clave)",
+    ]
+    for tabla in TABLAS_GENERACION:
+        columnas = [fila[1] for fila in conn.execute(f'PRAGMA table_info("{tabla}")')]
+        for sufijo in ('ins', 'del', 'upd'):
+            sentencias.append(f"DROP TRIGGER IF EXISTS trg_cdc_{tabla}_{sufijo}")
+        sentencias.extend(sql_triggers_cambios(tabla, columnas, con_clave_anterior=False))
+    return sentencias
+
+def migracion_clave_anterior(conn):
+    """Clave anterior en los cambios que renombran una fila, y línea base de las filas sin cambios.
+
+    Con la clave anterior otro sitio encuentra la fila renombrada; la línea
+    base cubre las bases que pasaron la migración 7 antes de que la sembrara.
+    """
+    sentencias = ["ALTER TABLE cambios ADD COLUMN clave_anterior TEXT"]
+    for tabla in TABLAS_GENERACION:
+        columnas = [fila[1] for fila in conn.execute(f'PRAGMA table_info("{tabla}")')]
+        for sufijo in ('ins', 'del', 'upd'):
+            sentencias.append(f"DROP TRIGGER IF EXISTS trg_cdc_{tabla}_{sufijo}")
+        sentencias.extend(sql_triggers_cambios(tabla, columnas))
+    sentencias.extend(sql_linea_base_cambios(tabla) for tabla in TABLAS_GENERACION if CLAVES_NEGOCIO.get(tabla))
+    return sentencias
+
+def sql_leer_cambios(tablas=None):
+    """Cambios en (desde, hasta] en orden de secuencia; parámetros: desde, hasta, límite"""
+    filtro = "AND tabla IN (" + ", ".join(f"'{t}'" for t in tablas) + ")" if tablas else ""
+    return f"""
+        SELECT seq, tabla, fila_id, clave, op, momento, origen, clave_anterior FROM cambios
+        WHERE seq > ? AND seq <= ? {filtro}
+        ORDER BY seq LIMIT ?
+    """
+
+# Cambio leído del registro; op en palabras, como en Cambio. origen es el sitio
+# donde se hizo el cambio (None: en esta base); clave_anterior, la clave de
+# negocio que la fila tenía si el cambio la renombró
+CambioRegistrado = namedtuple('CambioRegistrado', 'seq tabla id clave op momento origen clave_anterior',
+                              defaults=(None,))
+
+# Resultado de leer_cambios(): 'hasta' es la secuencia desde la que sigue la
+# próxima lectura; completo=False si se compactaron cambios posteriores a
+# 'desde' (el consumidor debe releer las tablas enteras).
+LoteCambios = namedtuple('LoteCambios', 'cambios hasta hay_mas completo')
+
+def resumir_cambios(cambios):
+    """Un cambio por fila con el efecto neto de todos sus cambios, en orden de secuencia.
+
+    insert…delete se anulan; insert…update queda insert; …delete queda
+    delete; cualquier otra combinación queda update.
+    """
+    primeros, ultimos = {}, {}
+    for cambio in cambios:
+        fila = (cambio.tabla, cambio.id)
+        primeros.setdefault(fila, cambio.op)
+        ultimos.pop(fila, None)     # Reinsertar para mantener el orden del último cambio
+        ultimos[fila] = cambio
+    resumen = []
+    for fila, cambio in ultimos.items():
+        primero = primeros[fila]
+        if cambio.op == 'delete':
+            if primero != 'insert':
+                resumen.append(cambio)
+        elif primero == 'insert':
+            resumen.append(cambio._replace(op='insert'))
+        else:
+            resumen.append(cambio._replace(op='update'))
+    return resumen
+
+# Registros tipados de las tablas principales. Cada clase declara sus columnas
+# en __slots__, en el orden del SELECT: sin __dict__ por instancia, un registro
+# pesa menos que la tupla equivalente y se lee por nombre en vez de posición.
+# Cada consulta usa el registro con exactamente sus columnas (los listados
+# tienen el suyo): un campo que la consulta no trae no existe, en vez de
+# aparentar ser None.
+
+class Registro:
+    """Base de los registros: las subclases definen __slots__ (columnas) y tabla"""
+
+    __slots__ = ()
+    tabla = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.columnas_sql = ", ".join(cls.__slots__)
+
+    def __init__(self, *valores):
+        """Un valor por columna, en el orden de __slots__"""
+        campos = self.__slots__
+        if len(valores) != len(campos):
+            raise TypeError(f"{type(self).__name__} espera {len(campos)} valores y recibió {len(valores)}")
+        for campo, valor in zip(campos, valores):
+            setattr(self, campo, valor)
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Registros a partir de las tuplas leídas (también las del caché y del modo remoto).
+
+        Mapear la lista con starmap cuesta la mitad que un row_factory de
+        sqlite3, que llama a Python por cada fila con el cursor como argumento.
+        """
+        return list(starmap(cls, filas))
+
+    def __iter__(self):
+        for campo in self.__slots__:
+            yield getattr(self, campo)
+
+    def __eq__(self, otro):
+        return type(otro) is type(self) and tuple(self) == tuple(otro)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{c}={getattr(self, c)!r}' for c in self.__slots__)})"
+
+class Presupuesto(Registro):
+    __slots__ = ('id', 'numero_presupuesto', 'cliente', 'proyecto', 'monto_total', 'estado',
+                 'fecha_creacion', 'descripcion', 'usuario_id')
+    tabla = 'presupuestos'
+
+class OrdenCompra(Registro):
+    __slots__ = ('id', 'numero_oc', 'proveedor', 'descripcion', 'monto_total', 'estado',
+                 'fecha_entrega', 'fecha_creacion', 'usuario_id')
+    tabla = 'ordenes_compra'
+
+class PresupuestoListado(Registro):
+    __slots__ = ('id', 'numero_presupuesto', 'cliente', 'proyecto', 'monto_total', 'estado',
+                 'fecha_creacion')
+    tabla = 'presupuestos'
+
+class OrdenCompraListado(Registro):
+    __slots__ = ('id', 'numero_oc', 'proveedor', 'descripcion', 'monto_total', 'estado',
+                 'fecha_entrega', 'fecha_creacion')
+    tabla = 'ordenes_compra'
+
+class Empleado(Registro):
+    __slots__ = ('id', 'rut', 'nombre', 'apellido', 'cargo', 'sueldo_base', 'estado',
+                 'fecha_ingreso', 'email', 'telefono')
+    tabla = 'empleados'
+
+class Vehiculo(Registro):
+    __slots__ = ('id', 'patente', 'marca', 'modelo', 'año', 'tipo_vehiculo', 'estado',
+                 'kilometraje', 'fecha_registro')
+    tabla = 'vehiculos'
+
+class Producto(Registro):
+    __slots__ = ('id', 'codigo_producto', 'nombre_producto', 'categoria', 'stock_actual',
+                 'stock_minimo', 'precio_unitario', 'ubicacion', 'estado')
+    tabla = 'inventario'
+
+class Documento(Registro):
+    __slots__ = ('id', 'nombre_documento', 'tipo_documento', 'categoria', 'ruta_archivo',
+                 'tamaño_archivo', 'fecha_subida', 'fecha_vencimiento', 'usuario_id')
+    tabla = 'documentos'
+
+REGISTROS = {clase.tabla: clase for clase in
+             (Presupuesto, OrdenCompra, Empleado, Vehiculo, Producto, Documento)}
+
+# Listados paginados por keyset sobre (fecha_creacion, id). La primera columna
+# debe ser id y la última fecha_creacion: de ellas se arma el cursor. Las
+# columnas son las del registro del listado.
+LISTADOS = {
+    'presupuestos': {
+        'tabla': 'presupuestos',
+        'registro': PresupuestoListado,
+        'columnas': PresupuestoListado.columnas_sql,
+        'filtros': ('estado', 'cliente'),
+    },
+    'ordenes_compra': {
+        'tabla': 'ordenes_compra',
+        'registro': OrdenCompraListado,
+        'columnas': OrdenCompraListado.columnas_sql,
+        'filtros': ('estado', 'proveedor'),
+    },
+}
+
+Pagina = namedtuple('Pagina', 'filas cursor hay_mas total_estimado')
+
+# Columnas de cada exportación: (columna, título, tipo). El tipo decide el
+# formato en la planilla: 'texto', 'monto' o 'fecha'.
+EXPORTACIONES = {
+    'presupuestos': [
+        ('numero_presupuesto', "N° Presupuesto", 'texto'),
+        ('cliente', "Cliente", 'texto'),
+        ('proyecto', "Proyecto", 'texto'),
+        ('descripcion', "Descripción", 'texto'),
+        ('monto_total', "Monto Total", 'monto'),
+        ('estado', "Estado", 'texto'),
+        ('fecha_creacion', "Fecha Creación", 'fecha'),
+    ],
+}
+
+def sql_pagina(listado, filtros=(), con_cursor=False):
+    """SELECT de una página: filtros por igualdad y, si hay cursor, continuar desde él"""
+    definicion = LISTADOS[listado]
+    condiciones = [f"{columna} = ?" for columna in filtros]
+    if con_cursor:
+        condiciones.append("(fecha_creacion, id) < (?, ?)")
+    donde = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    return f"""
+        SELECT {definicion['columnas']}
+        FROM {definicion['tabla']}
+        {donde}
+        ORDER BY fecha_creacion DESC, id DESC
+        LIMIT ?
+    """
+
+# Columnas que nunca salen en un volcado
+EXCLUIR_VOLCADO = {'usuarios': {'password'}}
+
+def sql_exportacion(listado, filtros=()):
+    """SELECT completo de una exportación, en el mismo orden que el listado"""
+    definicion = LISTADOS[listado]
+    columnas = ", ".join(c for c, _, _ in EXPORTACIONES[listado])
+    donde = ("WHERE " + " AND ".join(f"{c} = ?" for c in filtros)) if filtros else ""
+    return f"""
+        SELECT {columnas}
+        FROM {definicion['tabla']}
+        {donde}
+        ORDER BY fecha_creacion DESC, id DESC
+    """
+
+def sql_conteo(listado, filtros=()):
+    """COUNT(*) de un listado con filtros por igualdad (resuelto con índices)"""
+    donde = ("WHERE " + " AND ".join(f"{c} = ?" for c in filtros)) if filtros else ""
+    return f"SELECT COUNT(*) FROM {LISTADOS[listado]['tabla']} {donde}"
+
+def sql_por_ids(listado):
+    """SELECT de las filas de un listado cuyos ids vienen en un arreglo JSON"""
+    definicion = LISTADOS[listado]
+    return f"""
+        SELECT {definicion['columnas']}
+        FROM {definicion['tabla']}
+        WHERE id IN (SELECT value FROM json_each(?))
+    """
+
+def codificar_cursor(fila):
+    """Cursor opaco a partir del último registro de una página"""
+    return base64.urlsafe_b64encode(json.dumps([fila.fecha_creacion, fila.id]).encode("utf-8")).decode("ascii")
+
+def decodificar_cursor(cursor):
+    """(fecha_creacion, id) de un cursor generado por codificar_cursor"""
+    try:
+        fecha, id_fila = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return fecha, int(id_fila)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor de paginación inválido: {cursor!r}") from e
+
+# Consultas de los módulos. Todas pasan por aquí para que verificar_planes()
+# pueda revisar su plan de ejecución.
+CONSULTAS = {
+    'usuarios_validar': """
+        SELECT id, usuario, nombre, tipo_usuario FROM usuarios 
+        WHERE usuario = ? AND password = ? AND estado = 'Activo'
+    """,
+    'presupuestos_pagina': sql_pagina('presupuestos'),
+    'presupuestos_pagina_desde': sql_pagina('presupuestos', con_cursor=True),
+    'presupuestos_pagina_estado': sql_pagina('presupuestos', ('estado',), con_cursor=True),
+    'presupuestos_pagina_cliente': sql_pagina('presupuestos', ('cliente',), con_cursor=True),
+    'presupuestos_por_ids': sql_por_ids('presupuestos'),
+    'presupuestos_detalle': f"""
+        SELECT {Presupuesto.columnas_sql} FROM presupuestos WHERE numero_presupuesto = ?
+    """,
+    'presupuestos_insertar': """
+        INSERT INTO presupuestos (numero_presupuesto, cliente, proyecto, descripcion, 
+                                monto_total, estado, usuario_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    'presupuestos_eliminar': "DELETE FROM presupuestos WHERE numero_presupuesto = ?",
+    'presupuestos_id': "SELECT id FROM presupuestos WHERE numero_presupuesto = ?",
+    'ordenes_pagina': sql_pagina('ordenes_compra'),
+    'ordenes_pagina_desde': sql_pagina('ordenes_compra', con_cursor=True),
+    'ordenes_pagina_estado': sql_pagina('ordenes_compra', ('estado',), con_cursor=True),
+    'ordenes_pagina_proveedor': sql_pagina('ordenes_compra', ('proveedor',), con_cursor=True),
+    'ordenes_por_ids': sql_por_ids('ordenes_compra'),
+    'ordenes_detalle': f"""
+        SELECT {OrdenCompra.columnas_sql} FROM ordenes_compra WHERE numero_oc = ?
+    """,
+    'dashboard_metricas': sql_leer_metricas(METRICAS),
+    'buscar_presupuestos': sql_busqueda('presupuestos'),
+    'buscar_ordenes_compra': sql_busqueda('ordenes_compra'),
+    'buscar_documentos': sql_busqueda('documentos'),
+    'documentos_detalle': f"SELECT {Documento.columnas_sql} FROM documentos WHERE id = ?",
+    'cambios_desde': sql_leer_cambios(),
+}
+
+# Parámetros de ejemplo para EXPLAIN QUERY PLAN de las consultas con '?'
+PARAMETROS_PLAN = {
+    'usuarios_validar': ('admin', 'admin123'),
+    'presupuestos_pagina': (201,),
+    'presupuestos_pagina_desde': ('2025-07-25 00:00:00', 10, 201),
+    'presupuestos_pagina_estado': ('Aprobado', '2025-07-25 00:00:00', 10, 201),
+    'presupuestos_pagina_cliente': ('Constructora ABC', '2025-07-25 00:00:00', 10, 201),
+    'presupuestos_por_ids': ('[1, 2, 3]',),
+    'presupuestos_detalle': ('PRES-2025-001',),
+    'presupuestos_insertar': ('PRES-PLAN', 'Cliente', 'Proyecto', '', 0, 'Borrador', 1),
+    'presupuestos_eliminar': ('PRES-2025-001',),
+    'presupuestos_id': ('PRES-2025-001',),
+    'ordenes_detalle': ('OC-2025-001',),
+    'ordenes_pagina': (201,),
+    'ordenes_pagina_desde': ('2025-07-25 00:00:00', 10, 201),
+    'ordenes_pagina_estado': ('Pendiente', '2025-07-25 00:00:00', 10, 201),
+    'ordenes_pagina_proveedor': ('Cemento Sur S.A.', '2025-07-25 00:00:00', 10, 201),
+    'ordenes_por_ids': ('[1, 2, 3]',),
+    'buscar_presupuestos': ('"edificio"*', 20, 2000),
+    'buscar_ordenes_compra': ('"cemento"*', 20, 2000),
+    'buscar_documentos': ('"contrato"*', 20, 2000),
+    'documentos_detalle': (1,),
+    'cambios_desde': (0, 1000, 1000),
+}
+
+# Migraciones del esquema, en orden. Cada una se aplica una sola vez y deja
+# PRAGMA user_version en su número. Las sentencias pueden venir de una función
+# que recibe la conexión (cuando dependen del esquema ya existente).
+MIGRACIONES = [
+    (1, "Esquema inicial", ESQUEMA_INICIAL),
+    (2, "Tabla de metadatos del sistema", [
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        )
+        """,
+    ]),
+    (3, "Índices secundarios del catálogo", indices_de_version(3)),
+    (4, "Contadores del dashboard mantenidos por triggers", migracion_metricas()),
+    (5, "Generaciones por tabla para el caché de consultas", migracion_generaciones()),
+    (6, "Búsqueda de texto completo (FTS5)", migracion_busqueda()),
+    (7, "Registro de cambios por fila (CDC)", migracion_cambios),
+    (8, "Replicación entre sitios", migracion_replicacion),
+    (9, "Clave anterior y línea base en el registro de cambios", migracion_clave_anterior),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# Cambio a nivel de fila emitido por la capa de datos tras confirmar una escritura.
+# op: 'insert' | 'update' | 'delete' | 'reload' (la tabla cambió en bloque).
+# 'fila' trae las columnas del listado de la tabla (LISTADOS) si corresponde.
+Cambio = namedtuple('Cambio', 'tabla op id fila')
+
+class ChangeNotifier(QObject):
+    """Publica los cambios confirmados; las señales cruzan hilos de forma segura"""
+
+    cambios = pyqtSignal(object)    # lista de Cambio
+
+    def publicar(self, cambios):
+        if cambios:
+            self.cambios.emit(list(cambios))
+
+class SeguimientoCambios:
+    """Posición de este proceso en el registro de cambios.
+
+    Los rangos de secuencias escritos por este mismo proceso (hilo escritor,
+    importaciones) ya se publicaron al confirmarse: al seguir el registro se
+    saltan y solo se leen los cambios hechos por otros procesos.
+    """
+
+    def __init__(self):
+        self.seq = None             # None: aún no se leyó la posición inicial
+        self._propios = []          # [(desde, hasta)] ordenados, sin solaparse
+        self._lock = threading.Lock()
+
+    def registrar_propios(self, desde, hasta):
+        """Secuencias (desde, hasta] escritas por este proceso"""
+        if hasta > desde:
+            with self._lock:
+                self._propios.append((desde, hasta))
+                self._propios.sort()
+
+    def descartar_propios(self, desde, hasta):
+        """La transacción que iba a escribir (desde, hasta] se revirtió"""
+        with self._lock:
+            if (desde, hasta) in self._propios:
+                self._propios.remove((desde, hasta))
+
+    def ajenos(self, hasta):
+        """Tramos (desde, hasta] posteriores a la posición actual no escritos por este proceso"""
+        with self._lock:
+            tramos, inicio = [], self.seq
+            for desde, fin in self._propios:
+                if fin <= inicio:
+                    continue
+                if desde > inicio:
+                    tramos.append((inicio, min(desde, hasta)))
+                inicio = max(inicio, fin)
+                if inicio >= hasta:
+                    break
+            if inicio < hasta:
+                tramos.append((inicio, hasta))
+            return [(d, h) for d, h in tramos if h > d]
+
+    def avanzar(self, hasta):
+        with self._lock:
+            self.seq = hasta
+            self._propios = [(max(d, hasta), h) for d, h in self._propios if h > hasta]
+
+# Tablas derivadas: su contenido cambia cuando cambian las tablas de origen
+DEPENDENCIAS_DERIVADAS = {'metricas': list(METRICAS)}
+
+_PATRON_TABLAS = re.compile(
+    r"\b(" + "|".join(TABLAS_GENERACION + list(DEPENDENCIAS_DERIVADAS)) + r")\b", re.IGNORECASE)
+
+def tablas_de_consulta(sql):
+    """Tablas con generación de las que depende una consulta"""
+    tablas = set()
+    for nombre in _PATRON_TABLAS.findall(sql):
+        nombre = nombre.lower()
+        tablas.update(DEPENDENCIAS_DERIVADAS.get(nombre, [nombre]))
+    return frozenset(tablas)
+
+def tamaño_filas(filas):
+    """Tamaño aproximado en bytes de una lista de filas"""
+    return 64 + sum(56 + sum(sys.getsizeof(v) for v in fila) for fila in filas)
+
+class QueryCache:
+    """Caché de lectura (SQL + parámetros) con presupuesto LRU en bytes.
+
+    Cada resultado guarda la generación de las tablas que consulta. Antes de
+    servirlo se compara con las generaciones actuales, que solo se releen
+    cuando PRAGMA data_version indica que alguien (este u otro proceso)
+    confirmó una escritura. Las consultas sin tablas conocidas no se guardan.
+    """
+
+    def __init__(self, db_path, max_bytes, conectar=None):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.conectar = conectar or (lambda: sqlite3.connect(db_path, check_same_thread=False))
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()   # (sql, params) -> (generaciones, filas, bytes)
+        self._bytes = 0
+        self._monitor = None
+        self._version = None
+        self._generaciones = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidadas = 0
+
+    def _generaciones_actuales(self):
+        """Generaciones vigentes; llamar con el lock tomado"""
+        if self._monitor is None:
+            self._monitor = self.conectar()
+        try:
+            version = self._monitor.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version:
+                self._generaciones = dict(self._monitor.execute("SELECT tabla, gen FROM generaciones"))
+                self._version = version
+        except sqlite3.OperationalError:
+            # Conexión caída (p. ej. reinicio del servidor de datos): reabrir la próxima vez
+            monitor, self._monitor, self._version = self._monitor, None, None
+            try:
+                monitor.close()
+            except sqlite3.Error:
+                pass
+            raise
+        return self._generaciones
+
+    def obtener(self, sql, params, ejecutar):
+        """Resultado de 'ejecutar()' para (sql, params), desde el caché si sigue vigente"""
+        tablas = tablas_de_consulta(sql)
+        if not tablas or self.max_bytes <= 0:
+            return ejecutar()
+
+        clave = (sql, tuple(params))
+        with self._lock:
+            generaciones = self._generaciones_actuales()
+            vigentes = {t: generaciones.get(t) for t in tablas}
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[0] == vigentes:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return entrada[1]
+                self._quitar(clave)
+                self.invalidadas += 1
+            self.fallos += 1
+
+        # Las generaciones se tomaron antes de consultar: si alguien escribe
+        # entretanto, la entrada nace vencida y no se sirve
+        filas = ejecutar()
+        tamaño = tamaño_filas(filas)
+        if tamaño <= self.max_bytes // 4:
+            with self._lock:
+                if clave in self._entradas:
+                    self._quitar(clave)
+                self._entradas[clave] = (vigentes, filas, tamaño)
+                self._bytes += tamaño
+                while self._bytes > self.max_bytes:
+                    self._quitar(next(iter(self._entradas)))
+        return filas
+
+    def _quitar(self, clave):
+        self._bytes -= self._entradas.pop(clave)[2]
+
+    def generaciones(self):
+        """Copia de las generaciones vigentes por tabla (marcador de cambios barato)"""
+        with self._lock:
+            return dict(self._generaciones_actuales())
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def resumen(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'invalidadas': self.invalidadas,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            if self._monitor is not None:
+                self._monitor.close()
+                self._monitor = None
+                self._version = None
+
 class DatabaseManager:
     """Gestor de base de datos JURMAQ"""
-    
-    def __init__(self):
-        self.db_path = "jurmaq_funcional.db"
+
+    # Un pool por archivo, compartido entre todas las instancias del gestor
+    _pools = {}
+    _pools_lock = threading.Lock()
+    # Archivos cuyo esquema ya se verificó en este proceso
+    _esquemas_listos = set()
+    # Un notificador de cambios, un caché de consultas y estadísticas de SQL por archivo
+    _notificadores = {}
+    _caches = {}
+    _estadisticas_sql = {}
+    _escritores = {}
+    _seguimientos = {}
+    # Pragmas con que se creó cada pool: sus conexiones se configuran siempre con estos
+    _pragmas_pools = {}
+
+    def __init__(self, db_path=None, config=None):
+        self.config = config if config is not None else cargar_configuracion()
+        self.db_path = db_path or self.config['db_path']
+        # En modo remoto el archivo lo abre el servicio de datos; aquí solo hay sockets
+        self.remoto = self.config.get('modo_datos', 'local') == 'remoto'
+        self.destino = self.config['servidor_direccion'] if self.remoto else os.path.abspath(self.db_path)
+        self.pragmas = self.resolver_pragmas()
+        self._devoluciones = 0
+        self._lock_devoluciones = threading.Lock()
+        self._ejecutor = None
+        self.estadisticas_sql = self._obtener_estadisticas_sql()
+        self.pool = self._obtener_pool()
+        self.notificador = DatabaseManager._notificadores.setdefault(self.destino, ChangeNotifier())
+        self.seguimiento = DatabaseManager._seguimientos.setdefault(self.destino, SeguimientoCambios())
         self.init_database()
-    
+        self.cache = DatabaseManager._caches.get(self.destino)
+        if self.cache is None:
+            self.cache = DatabaseManager._caches.setdefault(self.destino, QueryCache(
+                self.db_path, int(self.config.get('cache_consultas_mb', 0) * 1024 * 1024),
+                self.pool.conectar))
+
+    def _obtener_pool(self):
+        """Obtener (o crear) el pool compartido para este archivo"""
+        clave = self.destino
+        with DatabaseManager._pools_lock:
+            pool = DatabaseManager._pools.get(clave)
+            if pool is None or pool._cerrado:
+                pool = ConnectionPool(
+                    self.db_path,
+                    max_conexiones=self.config['pool_max_conexiones'],
+                    timeout_espera=self.config['pool_timeout_espera'],
+                    verificacion_salud=self.config['pool_verificacion_salud'],
+                    al_abrir=self._preparar_conexion,
+                    al_devolver=self._revisar_checkpoint,
+                    fabrica=ConexionMedida if self.estadisticas_sql else sqlite3.Connection,
+                    conectar=self._conectar_remoto if self.remoto else None,
+                )
+                DatabaseManager._pools[clave] = pool
+                DatabaseManager._pragmas_pools[clave] = self.pragmas
+            elif DatabaseManager._pragmas_pools.get(clave, self.pragmas) != self.pragmas:
+                # El pool ya abierto fija journal_mode y demás: no se puede tener dos perfiles
+                print(f"Pragmas distintos para {clave}: se mantienen los del pool ya abierto "
+                      f"({DatabaseManager._pragmas_pools[clave]})")
+                self.pragmas = DatabaseManager._pragmas_pools[clave]
+        return pool
+
+    def _conectar_remoto(self, **opciones):
+        """Conexión al servicio de datos configurado"""
+        return RemoteConnection(self.config['servidor_direccion'], self.config.get('servidor_token', ""),
+                                timeout=self.config.get('servidor_timeout', 30), **opciones)
+
+    def _obtener_estadisticas_sql(self):
+        """Estadísticas de SQL compartidas por archivo (None si la instrumentación está apagada)"""
+        # En modo remoto las mide el servidor, que es quien ejecuta el SQL
+        if self.remoto or not self.config.get('instrumentacion_sql', True):
+            return None
+        clave = self.destino
+        with DatabaseManager._pools_lock:
+            estadisticas = DatabaseManager._estadisticas_sql.get(clave)
+            if estadisticas is None:
+                estadisticas = DatabaseManager._estadisticas_sql[clave] = EstadisticasSQL(
+                    umbral_ms=self.config.get('sql_lenta_ms', 200),
+                    ruta_log=self.config.get('sql_log_lentas'),
+                    max_bytes=self.config.get('sql_log_bytes', 1024 * 1024),
+                    copias=self.config.get('sql_log_copias', 3))
+        return estadisticas
+
+    def _preparar_conexion(self, conn):
+        """Pragmas de la conexión nueva y, si corresponde, su registro de consultas"""
+        if self.remoto:
+            return      # El servidor configura sus propias conexiones
+        self._aplicar_pragmas(conn)
+        if isinstance(conn, ConexionMedida):
+            conn.estadisticas = self.estadisticas_sql
+
+    @classmethod
+    def cerrar_pools(cls):
+        """Cerrar todos los pools abiertos (al salir de la aplicación)"""
+        with cls._pools_lock:
+            # Primero confirmar las escrituras encoladas
+            for escritor in cls._escritores.values():
+                escritor.cerrar()
+            cls._escritores.clear()
+            for pool in cls._pools.values():
+                # Vaciar el WAL antes de cerrar para dejar un único archivo
+                # (los pools remotos no tienen archivo: eso lo hace el servidor)
+                if pool._conectar is None:
+                    try:
+                        with pool.conexion() as conn:
+                            conn.execute("PRAGMA optimize")
+                            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    except sqlite3.Error:
+                        pass
+                pool.close()
+            cls._pools.clear()
+            for cache in cls._caches.values():
+                cache.close()
+            cls._caches.clear()
+
+    def resolver_pragmas(self):
+        """Pragmas del perfil configurado más los ajustes individuales"""
+        nombre = self.config.get('perfil_pragma', 'automatico')
+        if nombre == 'automatico':
+            nombre = 'red' if ruta_en_red(self.db_path) else 'rendimiento'
+        if nombre not in PERFILES_PRAGMA:
+            print(f"Perfil de pragmas desconocido '{nombre}', usando 'compatible'")
+            nombre = 'compatible'
+        pragmas = dict(PERFILES_PRAGMA[nombre])
+        pragmas.update(self.config.get('pragmas') or {})
+        return pragmas
+
+    def _aplicar_pragmas(self, conn):
+        """Configurar una conexión recién abierta según el perfil"""
+        pendientes = dict(self.pragmas)
+        for nombre in ORDEN_PRAGMAS + sorted(pendientes):
+            if nombre not in pendientes:
+                continue
+            valor = pendientes.pop(nombre)
+            if not str(nombre).replace('_', '').isalnum() or not str(valor).lstrip('-').replace('_', '').isalnum():
+                raise sqlite3.ProgrammingError(f"PRAGMA inválido: {nombre}={valor}")
+            conn.execute(f"PRAGMA {nombre} = {valor}").fetchall()
+
+    def _revisar_checkpoint(self, conn):
+        """Cada cierto número de devoluciones, hacer checkpoint si el WAL creció demasiado"""
+        with self._lock_devoluciones:
+            self._devoluciones += 1
+            devoluciones = self._devoluciones
+        if self.remoto or devoluciones % max(1, int(self.config.get('wal_revision_cada', 200))):
+            return
+        if conn.in_transaction:
+            return
+        try:
+            tamaño_wal = os.path.getsize(self.db_path + "-wal")
+        except OSError:
+            return
+        if tamaño_wal > self.config.get('wal_limite_bytes', 64 * 1024 * 1024):
+            self.checkpoint("PASSIVE", conn)
+
+    def checkpoint(self, modo="PASSIVE", conn=None):
+        """Ejecutar un checkpoint del WAL; devuelve (ocupado, páginas_log, páginas_copiadas)"""
+        modo = modo.upper()
+        if modo not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Modo de checkpoint inválido: {modo}")
+        if conn is not None:
+            return conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        with self.conexion() as propia:
+            return propia.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+
     def init_database(self):
-        """Inicializar base de datos completa"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabla usuarios
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                nombre TEXT NOT NULL,
-                email TEXT,
-                tipo_usuario TEXT DEFAULT 'Administrador',
-                estado TEXT DEFAULT 'Activo',
-                fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Tabla presupuestos
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS presupuestos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_presupuesto TEXT UNIQUE NOT NULL,
-                cliente TEXT NOT NULL,
-                proyecto TEXT NOT NULL,
-                descripcion TEXT,
-                monto_total REAL DEFAULT 0,
-                estado TEXT DEFAULT 'Borrador',
-                fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
-                usuario_id INTEGER,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        """)
-        
-        # Tabla órdenes de compra
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ordenes_compra (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_oc TEXT UNIQUE NOT NULL,
-                proveedor TEXT NOT NULL,
-                descripcion TEXT,
-                monto_total REAL DEFAULT 0,
-                estado TEXT DEFAULT 'Pendiente',
-                fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
-                fecha_entrega DATE,
-                usuario_id INTEGER,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        """)
-        
-        # Tabla empleados
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS empleados (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                rut TEXT UNIQUE NOT NULL,
-                nombre TEXT NOT NULL,
-                apellido TEXT NOT NULL,
-                cargo TEXT,
-                sueldo_base REAL DEFAULT 0,
-                estado TEXT DEFAULT 'Activo',
-                fecha_ingreso DATE,
-                email TEXT,
-                telefono TEXT
-            )
-        """)
-        
-        # Tabla vehículos
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS vehiculos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patente TEXT UNIQUE NOT NULL,
-                marca TEXT,
-                modelo TEXT,
-                año INTEGER,
-                tipo_vehiculo TEXT,
-                estado TEXT DEFAULT 'Disponible',
-                kilometraje INTEGER DEFAULT 0,
-                fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Tabla inventario
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS inventario (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                codigo_producto TEXT UNIQUE NOT NULL,
-                nombre_producto TEXT NOT NULL,
-                categoria TEXT,
-                stock_actual INTEGER DEFAULT 0,
-                stock_minimo INTEGER DEFAULT 0,
-                precio_unitario REAL DEFAULT 0,
-                ubicacion TEXT,
-                estado TEXT DEFAULT 'Activo'
-            )
-        """)
-        
-        # Tabla documentos
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_documento TEXT NOT NULL,
-                tipo_documento TEXT,
-                categoria TEXT,
-                ruta_archivo TEXT,
-                tamaño_archivo INTEGER,
-                fecha_subida DATETIME DEFAULT CURRENT_TIMESTAMP,
-                fecha_vencimiento DATE,
-                usuario_id INTEGER,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        """)
-        
-        # Insertar datos iniciales
-        cursor.execute("""
-            INSERT OR IGNORE INTO usuarios (usuario, password, nombre, tipo_usuario)
-            VALUES ('admin', 'admin123', 'Administrador Sistema', 'Administrador')
-        """)
-        
-        # Datos de ejemplo
-        ejemplos = [
-            # Presupuestos de ejemplo
-            """INSERT OR IGNORE INTO presupuestos (numero_presupuesto, cliente, proyecto, descripcion, monto_total, estado, usuario_id)
-               VALUES 
-               ('PRES-2025-001', 'Constructora ABC', 'Edificio Residencial Las Torres', 'Construcción edificio 15 pisos', 2500000000, 'Aprobado', 1),
-               ('PRES-2025-002', 'Inmobiliaria XYZ', 'Condominio Los Pinos', 'Conjunto habitacional 120 casas', 1800000000, 'En Revisión', 1),
-               ('PRES-2025-003', 'Municipalidad Central', 'Reparación Puente Principal', 'Refuerzo estructural puente vehicular', 450000000, 'Pendiente', 1)""",
-            
-            # Órdenes de compra de ejemplo
-            """INSERT OR IGNORE INTO ordenes_compra (numero_oc, proveedor, descripcion, monto_total, estado, fecha_entrega, usuario_id)
-               VALUES 
-               ('OC-2025-001', 'Cemento Sur S.A.', 'Cemento especial 1000 sacos', 15000000, 'Aprobada', '2025-07-30', 1),
-               ('OC-2025-002', 'Ferretería El Martillo', 'Herramientas y materiales varios', 3500000, 'Pendiente', '2025-08-05', 1),
-               ('OC-2025-003', 'Combustibles Norte', 'Diésel para maquinaria 5000 litros', 4200000, 'Entregada', '2025-07-25', 1)""",
-            
-            # Empleados de ejemplo
-            """INSERT OR IGNORE INTO empleados (rut, nombre, apellido, cargo, sueldo_base, fecha_ingreso, email, telefono)
-               VALUES 
-               ('12.345.678-9', 'Juan Carlos', 'Pérez Rojas', 'Ingeniero Civil', 2500000, '2023-01-15', 'jperez@empresa.cl', '+56912345678'),
-               ('98.765.432-1', 'María Elena', 'González Silva', 'Arquitecta', 2800000, '2022-03-10', 'mgonzalez@empresa.cl', '+56987654321'),
-               ('11.222.333-4', 'Pedro Luis', 'Martínez Torres', 'Maestro Construcción', 1800000, '2021-06-20', 'pmartinez@empresa.cl', '+56911222333')""",
-            
-            # Vehículos de ejemplo
-            """INSERT OR IGNORE INTO vehiculos (patente, marca, modelo, año, tipo_vehiculo, kilometraje)
-               VALUES 
-               ('AB-CD-12', 'Caterpillar', '320D', 2020, 'Excavadora', 1250),
-               ('EF-GH-34', 'Volvo', 'FH16', 2021, 'Camión', 85000),
-               ('IJ-KL-56', 'Toyota', 'Hilux', 2022, 'Camioneta', 45000)""",
-            
-            # Inventario de ejemplo
-            """INSERT OR IGNORE INTO inventario (codigo_producto, nombre_producto, categoria, stock_actual, stock_minimo, precio_unitario, ubicacion)
-               VALUES 
-               ('CEM-001', 'Cemento Especial 25kg', 'Materiales', 150, 50, 8500, 'Bodega A'),
-               ('VAR-001', 'Varilla 12mm x 6m', 'Fierros', 200, 30, 12000, 'Bodega B'),
-               ('HER-001', 'Martillo Carpintero', 'Herramientas', 25, 5, 15000, 'Bodega C')""",
-            
-            # Documentos de ejemplo
-            """INSERT OR IGNORE INTO documentos (nombre_documento, tipo_documento, categoria, tamaño_archivo, fecha_vencimiento, usuario_id)
-               VALUES 
-               ('Contrato Proyecto Las Torres.pdf', 'PDF', 'Contratos', 2048000, '2025-12-31', 1),
-               ('Planos Edificio Residencial.dwg', 'CAD', 'Planos', 15360000, '2026-06-30', 1),
-               ('Certificado ISO 9001.pdf', 'PDF', 'Certificaciones', 1024000, '2025-10-15', 1)"""
-        ]
-        
-        for sql in ejemplos:
+        """Inicializar base de datos: aplica migraciones pendientes y datos demo"""
+        clave = self.destino
+        if clave in DatabaseManager._esquemas_listos:
+            return
+
+        conn = self.get_connection()
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if self.remoto:
+                # Las migraciones las aplica el servidor al iniciar
+                if version < VERSION_ESQUEMA:
+                    raise sqlite3.DatabaseError(
+                        f"El servidor de datos tiene el esquema {version} y este cliente requiere "
+                        f"el {VERSION_ESQUEMA}: actualice servidor_datos.py")
+            elif version < VERSION_ESQUEMA:
+                self.aplicar_migraciones(conn, version)
+            if self.config.get('datos_demo'):
+                self.cargar_datos_demo(conn)
+        finally:
+            conn.close()
+
+        DatabaseManager._esquemas_listos.add(clave)
+
+    def aplicar_migraciones(self, conn, version_actual):
+        """Aplicar en orden las migraciones posteriores a version_actual"""
+        for version, descripcion, sentencias in MIGRACIONES:
+            if version <= version_actual:
+                continue
             try:
-                cursor.execute(sql)
+                conn.execute("BEGIN IMMEDIATE")
+                # Otro proceso pudo migrar mientras esperábamos el bloqueo
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    conn.rollback()
+                    continue
+                for sql in (sentencias(conn) if callable(sentencias) else sentencias):
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
             except sqlite3.Error as e:
-                print(f"Error insertando datos: {e}")
-        
-        conn.commit()
-        conn.close()
-    
+                conn.rollback()
+                raise sqlite3.DatabaseError(
+                    f"Error aplicando migración {version} ({descripcion}): {e}") from e
+
+    def cargar_datos_demo(self, conn=None):
+        """Insertar datos de ejemplo una sola vez (opt-in con datos_demo)"""
+        propia = conn is None
+        if propia:
+            conn = self.get_connection()
+        try:
+            marca = conn.execute(
+                "SELECT valor FROM meta WHERE clave = 'datos_demo_cargados'").fetchone()
+            if marca:
+                return False
+
+            cursor = conn.cursor()
+            for sql in DATOS_DEMO:
+                try:
+                    cursor.execute(sql)
+                except sqlite3.Error as e:
+                    print(f"Error insertando datos: {e}")
+
+            cursor.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('datos_demo_cargados', ?)",
+                           (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+            conn.commit()
+            return True
+        finally:
+            if propia:
+                conn.close()
+
     def get_connection(self):
-        """Obtener conexión a la base de datos"""
-        return sqlite3.connect(self.db_path)
+        """Obtener conexión del pool (close() la devuelve al pool)"""
+        return self.pool.checkout()
+
+    def conexion(self):
+        """Context manager de conexión: 'with db.conexion() as conn:'"""
+        return self.pool.conexion()
+
+    @property
+    def ejecutor(self):
+        """Ejecutor de consultas en segundo plano (se crea en el hilo de la interfaz)"""
+        if self._ejecutor is None:
+            self._ejecutor = QueryExecutor(self)
+        return self._ejecutor
+
+    @property
+    def escritor(self):
+        """Hilo escritor compartido por archivo (se crea en el hilo de la interfaz)"""
+        clave = self.destino
+        escritor = DatabaseManager._escritores.get(clave)
+        if escritor is None:
+            with DatabaseManager._pools_lock:
+                escritor = DatabaseManager._escritores.get(clave)
+                if escritor is None:
+                    escritor = DatabaseManager._escritores[clave] = WriteQueue(
+                        self, self.config.get('escritura_lote_max', 200),
+                        self.config.get('escritura_lote_ms', 20))
+        return escritor
+
+    def estadisticas_pool(self):
+        """Contadores de aperturas/reutilizaciones del pool"""
+        return self.pool.resumen()
+
+    def paginar(self, listado, cursor=None, tamaño=200, filtros=None, conn=None):
+        """Página de un listado con paginación keyset sobre (fecha_creacion, id).
+
+        'cursor' es el devuelto por la página anterior (None para la primera).
+        El costo no depende del total de filas: cada página es un rango del
+        índice. El total estimado solo se calcula en la primera página.
+        """
+        definicion = LISTADOS[listado]
+        filtros = {k: v for k, v in (filtros or {}).items() if v not in (None, "")}
+        desconocidos = set(filtros) - set(definicion['filtros'])
+        if desconocidos:
+            raise ValueError(f"Filtros no permitidos en {listado}: {sorted(desconocidos)}")
+
+        nombres = sorted(filtros)
+        params = [filtros[n] for n in nombres]
+        if cursor is not None:
+            params.extend(decodificar_cursor(cursor))
+        params.append(int(tamaño) + 1)
+        sql = sql_pagina(listado, nombres, cursor is not None)
+
+        propia = conn is None
+        if propia:
+            conn = self.get_connection()
+        try:
+            filas = self.consultar(sql, params, conn=conn, registro=definicion['registro'])
+            total = self.estimar_total(listado, filtros, conn) if cursor is None else None
+        finally:
+            if propia:
+                conn.close()
+
+        hay_mas = len(filas) > tamaño
+        filas = filas[:tamaño]
+        siguiente = codificar_cursor(filas[-1]) if hay_mas and filas else None
+        return Pagina(filas, siguiente, hay_mas, total)
+
+    def consultar(self, sql, params=(), conn=None, fresco=False, registro=None):
+        """Filas de una consulta de lectura pasando por el caché.
+
+        fresco=True la ejecuta siempre (p. ej. releer justo después de escribir
+        en la misma transacción, que el caché aún no ve). Con registro (una
+        subclase de Registro) las filas se entregan como registros; el caché
+        sigue guardando tuplas.
+        """
+        def ejecutar():
+            if conn is not None:
+                return conn.execute(sql, params).fetchall()
+            with self.conexion() as propia:
+                return propia.execute(sql, params).fetchall()
+
+        filas = ejecutar() if fresco else self.cache.obtener(sql, params, ejecutar)
+        return registro.desde_filas(filas) if registro is not None else filas
+
+    def estimar_total(self, listado, filtros=None, conn=None):
+        """Cantidad aproximada de filas de un listado sin recorrer la tabla.
+
+        Usa las estadísticas de ANALYZE (sqlite_stat1) y, si no existen, el
+        último id asignado. Devuelve None si no hay base para estimar.
+        """
+        tabla = LISTADOS[listado]['tabla']
+        filtros = filtros or {}
+        propia = conn is None
+        if propia:
+            conn = self.get_connection()
+        try:
+            estadisticas = {}
+            try:
+                for idx, stat in conn.execute(
+                        "SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ?", (tabla,)):
+                    estadisticas[idx] = [int(x) for x in stat.split() if x.isdigit()]
+            except sqlite3.OperationalError:
+                pass    # Nunca se ejecutó ANALYZE
+
+            if estadisticas:
+                total = next(iter(estadisticas.values()))[0]
+            else:
+                fila = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabla,)).fetchone()
+                total = fila[0] if fila else 0
+
+            estimado = float(total)
+            for columna in filtros:
+                promedio = None
+                for indice in CATALOGO_INDICES:
+                    primera = indice['columnas'].split(',')[0].strip()
+                    datos = estadisticas.get(indice['nombre'])
+                    if indice['tabla'] == tabla and primera == columna and not indice.get('donde') and datos:
+                        promedio = datos[1] if len(datos) > 1 else None
+                        break
+                if promedio is None or not total:
+                    return None
+                estimado *= promedio / float(total)
+            return int(round(estimado))
+        finally:
+            if propia:
+                conn.close()
+
+    def verificar_planes(self, umbral_filas=1000, consultas=None):
+        """Revisar con EXPLAIN QUERY PLAN las consultas registradas.
+
+        Devuelve una lista de problemas: recorridos completos de tabla (SCAN sin
+        índice) u ordenamientos en B-tree temporal sobre tablas con más de
+        umbral_filas filas. Una lista vacía significa que todos los planes usan índices.
+        """
+        consultas = consultas or CONSULTAS
+        problemas = []
+        tamaños = {}
+
+        with self.conexion() as conn:
+            def filas_de(tabla):
+                if tabla not in tamaños:
+                    try:
+                        tamaños[tabla] = conn.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0]
+                    except sqlite3.Error:
+                        tamaños[tabla] = 0
+                return tamaños[tabla]
+
+            for nombre, sql in consultas.items():
+                params = PARAMETROS_PLAN.get(nombre, ())
+                plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                tabla_actual = None
+                for fila in plan:
+                    detalle = fila[-1]
+                    partes = detalle.split()
+                    if partes[:1] in (['SCAN'], ['SEARCH']) and len(partes) > 1:
+                        tabla_actual = partes[1]
+                    recorrido = (len(partes) >= 2 and partes[0] == 'SCAN'
+                                 and 'INDEX' not in partes and 'PRIMARY' not in partes)
+                    # Las búsquedas FTS ordenan solo sus candidatos (LIMIT acotado)
+                    orden_temporal = (detalle.startswith('USE TEMP B-TREE')
+                                      and tabla_actual not in TABLAS_BUSQUEDA)
+                    if (recorrido or orden_temporal) and tabla_actual:
+                        filas = filas_de(tabla_actual)
+                        if filas > umbral_filas:
+                            problemas.append({
+                                'consulta': nombre,
+                                'tabla': tabla_actual,
+                                'filas': filas,
+                                'detalle': detalle,
+                            })
+        return problemas
+    
+    def generaciones(self):
+        """Generación de escritura de cada tabla; cambia cuando la tabla cambia"""
+        return self.cache.generaciones()
+
+    def leer_metricas(self, conn=None, tablas=None):
+        """Métricas por tabla: {tabla: {'cantidad', 'suma', 'por_estado': {estado: (cantidad, suma)}}}
+
+        'tablas' limita la lectura a esas tablas (por defecto todas las de METRICAS).
+        """
+        tablas = [t for t in METRICAS if tablas is None or t in tablas]
+        sql = CONSULTAS['dashboard_metricas'] if len(tablas) == len(METRICAS) else sql_leer_metricas(tablas)
+        propia = conn is None
+        if propia:
+            conn = self.get_connection()
+        try:
+            metricas = {tabla: {'cantidad': 0, 'suma': 0.0, 'por_estado': {}} for tabla in tablas}
+            for tabla, estado, cantidad, suma in self.consultar(sql, conn=conn):
+                if tabla not in metricas or not cantidad:
+                    continue
+                metricas[tabla]['cantidad'] += cantidad
+                metricas[tabla]['suma'] += suma
+                metricas[tabla]['por_estado'][estado] = (cantidad, suma)
+            return metricas
+        finally:
+            if propia:
+                conn.close()
+
+    def buscar(self, texto, limite=20, tablas=None, conn=None):
+        """Búsqueda de texto completo en presupuestos, órdenes y documentos.
+
+        Cada palabra se busca como prefijo y deben estar todas. Devuelve hasta
+        'limite' ResultadoBusqueda ordenados por relevancia (bm25: menor es
+        mejor) entre las coincidencias más recientes de cada tabla
+        (config 'busqueda_candidatos'); el fragmento marca las coincidencias con «».
+        """
+        expresion = consulta_fts(texto)
+        if expresion is None:
+            return []
+        candidatos = max(limite, self.config.get('busqueda_candidatos', 2000))
+        resultados = []
+        for tabla in BUSQUEDAS:
+            if tablas is not None and tabla not in tablas:
+                continue
+            filas = self.consultar(CONSULTAS[f'buscar_{tabla}'], (expresion, limite, candidatos), conn=conn)
+            resultados.extend(ResultadoBusqueda(tabla, *fila) for fila in filas)
+        resultados.sort(key=lambda r: r.puntaje)
+        return resultados[:limite]
+
+    def mantener_busqueda(self, reconstruir=False):
+        """Compactar los índices FTS5 ('optimize') y verificarlos contra sus tablas.
+
+        integrity-check lanza sqlite3.DatabaseError si un índice no coincide;
+        reconstruir=True lo rehace antes desde las tablas ('rebuild').
+        """
+        with self.conexion() as conn:
+            for b in BUSQUEDAS.values():
+                if reconstruir:
+                    conn.execute(f"INSERT INTO {b['fts']} ({b['fts']}) VALUES ('rebuild')")
+                conn.execute(f"INSERT INTO {b['fts']} ({b['fts']}) VALUES ('optimize')")
+                conn.execute(f"INSERT INTO {b['fts']} ({b['fts']}) VALUES ('integrity-check')")
+
+    def verificar_metricas(self):
+        """Comparar 'metricas' con un recálculo completo; devuelve las diferencias"""
+        with self.conexion() as conn:
+            guardadas = {(t, e): (c, s) for t, e, c, s in conn.execute(CONSULTAS['dashboard_metricas'])
+                         if c}
+            reales = {}
+            for tabla in METRICAS:
+                for t, e, c, s in conn.execute(sql_metricas_desde_tabla(tabla)):
+                    reales[(t, e)] = (c, s)
+        diferencias = []
+        for clave in sorted(set(guardadas) | set(reales)):
+            guardado = guardadas.get(clave, (0, 0.0))
+            real = reales.get(clave, (0, 0.0))
+            if guardado[0] != real[0] or abs(guardado[1] - real[1]) > 0.005:
+                diferencias.append({'tabla': clave[0], 'estado': clave[1],
+                                    'guardado': guardado, 'real': real})
+        return diferencias
+
+    def reconstruir_metricas(self):
+        """Recalcular 'metricas' desde cero en una sola transacción"""
+        with self.conexion() as conn:
+            conn.execute("DELETE FROM metricas")
+            for tabla in METRICAS:
+                conn.execute("INSERT INTO metricas (tabla, estado, cantidad, suma)"
+                             + sql_metricas_desde_tabla(tabla))
     
+    # --- Registro de cambios ---
+
+    def _con_conexion(self, conn, funcion):
+        """funcion(conn) con la conexión dada o con una propia del pool"""
+        if conn is not None:
+            return funcion(conn)
+        with self.conexion() as propia:
+            return funcion(propia)
+
+    @staticmethod
+    def ultimo_cambio(conn):
+        """Última secuencia asignada en el registro de cambios (0 si no hay)"""
+        # sqlite_sequence conserva el valor aunque se hayan compactado todas las filas
+        fila = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios'").fetchone()
+        return fila[0] if fila else 0
+
+    def leer_cambios(self, desde=0, limite=1000, tablas=None, hasta=None, conn=None):
+        """Cambios con secuencia mayor a 'desde' (y hasta 'hasta', si se indica).
+
+        Se lee primero la última secuencia y luego los cambios hasta ella: lo
+        que se confirme entretanto queda para la lectura siguiente, nunca se
+        salta. Con 'tablas' se omiten las demás, pero 'hasta' avanza igual.
+        Con limite 0 no se lee nada: solo se informa si hay cambios pendientes.
+        """
+        limite = max(0, int(limite))
+
+        def leer(conn):
+            ultimo = self.ultimo_cambio(conn)
+            tope = ultimo if hasta is None else min(hasta, ultimo)
+            filas = conn.execute(sql_leer_cambios(tablas), (desde, tope, limite + 1)).fetchall()
+            hay_mas = len(filas) > limite
+            cambios = [CambioRegistrado(seq, tabla, fila_id, clave, OPERACIONES_CAMBIO[op], momento, origen, anterior)
+                       for seq, tabla, fila_id, clave, op, momento, origen, anterior in filas[:limite]]
+            if hay_mas:
+                siguiente = cambios[-1].seq if cambios else desde
+            else:
+                siguiente = max(desde, tope)
+            return LoteCambios(cambios, siguiente, hay_mas, desde >= self._compactado_hasta(conn))
+        return self._con_conexion(conn, leer)
+
+    @staticmethod
+    def _compactado_hasta(conn):
+        fila = conn.execute("SELECT valor FROM meta WHERE clave = 'cambios_compactado'").fetchone()
+        return int(fila[0]) if fila else 0
+
+    def posicion_consumidor(self, consumidor, conn=None):
+        """Secuencia hasta la que un consumidor procesó el registro (None si no existe)"""
+        fila = self._con_conexion(conn, lambda c: c.execute(
+            "SELECT seq FROM cambios_consumidores WHERE consumidor = ?", (consumidor,)).fetchone())
+        return fila[0] if fila else None
+
+    def confirmar_cambios(self, consumidor, seq, conn=None):
+        """Guardar la posición de un consumidor (con conn, dentro de su transacción)"""
+        self._con_conexion(conn, lambda c: c.execute("""
+            INSERT INTO cambios_consumidores (consumidor, seq, actualizado) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (consumidor) DO UPDATE SET seq = excluded.seq, actualizado = excluded.actualizado
+        """, (consumidor, seq)))
+
+    def olvidar_consumidor(self, consumidor):
+        """Dejar de retener cambios para un consumidor que ya no existe"""
+        with self.conexion() as conn:
+            conn.execute("DELETE FROM cambios_consumidores WHERE consumidor = ?", (consumidor,))
+
+    def consumidores_cambios(self):
+        """[(consumidor, seq, actualizado)] de los consumidores registrados"""
+        with self.conexion() as conn:
+            return conn.execute("SELECT consumidor, seq, actualizado FROM cambios_consumidores "
+                                "ORDER BY consumidor").fetchall()
+
+    def compactar_cambios(self, retencion_dias=None, maximo_dias=None):
+        """Borrar del registro lo que ya no se necesita; devuelve (borrados, compactado_hasta).
+
+        Se borra lo que leyeron todos los consumidores y tiene más de
+        retencion_dias, y todo lo que tenga más de maximo_dias aunque algún
+        consumidor no lo haya leído (ese consumidor verá completo=False).
+        """
+        if retencion_dias is None:
+            retencion_dias = self.config.get('cambios_retencion_dias', 7)
+        if maximo_dias is None:
+            maximo_dias = self.config.get('cambios_retencion_max_dias', 90)
+
+        def corte_por_antiguedad(conn, dias, ultimo):
+            # La primera fila reciente: solo se recorren las filas viejas
+            fila = conn.execute("SELECT seq FROM cambios WHERE momento >= datetime('now', ?) "
+                                "ORDER BY seq LIMIT 1", (f"-{float(dias)} days",)).fetchone()
+            return fila[0] - 1 if fila else ultimo
+
+        conn = self.pool.acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            ultimo = self.ultimo_cambio(conn)
+            leido = conn.execute("SELECT MIN(seq) FROM cambios_consumidores").fetchone()[0]
+            corte = min(ultimo if leido is None else leido, corte_por_antiguedad(conn, retencion_dias, ultimo))
+            if maximo_dias:
+                corte = max(corte, corte_por_antiguedad(conn, maximo_dias, ultimo))
+            anterior = self._compactado_hasta(conn)
+            borrados = 0
+            if corte > anterior:
+                borrados = conn.execute("DELETE FROM cambios WHERE seq <= ?", (corte,)).rowcount
+                conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('cambios_compactado', ?)",
+                             (str(corte),))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+        return borrados, max(corte, anterior)
+
+    def cambios_externos(self, conn=None):
+        """Cambios confirmados por otros procesos desde la última llamada, como Cambio.
+
+        La primera llamada solo toma la posición actual. Si hay más de
+        'cambios_sondeo_max' cambios, o el registro se compactó por delante,
+        se devuelve un 'reload' por tabla afectada en vez de fila por fila.
+        """
+        def revisar(conn):
+            seguimiento = self.seguimiento
+            ultimo = self.ultimo_cambio(conn)
+            if seguimiento.seq is None or ultimo < seguimiento.seq:
+                seguimiento.avanzar(ultimo)     # Primera vez, o base restaurada
+                return []
+            maximo = int(self.config.get('cambios_sondeo_max', 2000))
+            leidos, tablas = [], None
+
+            def afectadas(desde):
+                # Lo ya leído más lo que queda sin leer hasta 'ultimo'
+                return {c.tabla for c in leidos} | {t for (t,) in conn.execute(
+                    "SELECT DISTINCT tabla FROM cambios WHERE seq > ? AND seq <= ?", (desde, ultimo))}
+
+            for desde, hasta in seguimiento.ajenos(ultimo):
+                if len(leidos) >= maximo:
+                    tablas = afectadas(desde)
+                    break
+                lote = self.leer_cambios(desde, maximo - len(leidos), hasta=hasta, conn=conn)
+                leidos.extend(lote.cambios)
+                if not lote.completo:
+                    tablas = set(TABLAS_GENERACION)
+                    break
+                if lote.hay_mas:
+                    tablas = afectadas(lote.hasta)
+                    break
+            seguimiento.avanzar(ultimo)
+            if tablas is not None:
+                return [Cambio(tabla, 'reload', None, None) for tabla in sorted(tablas)]
+            cambios = []
+            for c in resumir_cambios(leidos):
+                fila = None
+                if c.op != 'delete' and c.tabla in LISTADOS:
+                    fila = self.fila_listado(c.tabla, c.id, conn)
+                cambios.append(Cambio(c.tabla, c.op, c.id, fila))
+            return cambios
+        return self._con_conexion(conn, revisar)
+
+    # --- Volcados CSV/NDJSON ---
+
+    def columnas_volcado(self, tabla, conn):
+        """Columnas de una tabla que se incluyen en los volcados"""
+        excluir = EXCLUIR_VOLCADO.get(tabla, set())
+        return [fila[1] for fila in conn.execute(f'PRAGMA table_info("{tabla}")')
+                if fila[1] not in excluir]
+
+    def marca_volcado(self, tabla, conn=None):
+        """Último id volcado de una tabla en modo incremental (0 si nunca)"""
+        propia = conn is None
+        if propia:
+            conn = self.get_connection()
+        try:
+            fila = conn.execute("SELECT valor FROM meta WHERE clave = ?",
+                                (f"volcado_marca:{tabla}",)).fetchone()
+            return int(fila[0]) if fila else 0
+        finally:
+            if propia:
+                conn.close()
+
+    def volcar_tablas(self, tablas=None, directorio=".", formato='csv', comprimir=False,
+                      incremental=False, bloque=5000, al_progreso=None):
+        """Volcar tablas a CSV/NDJSON recorriéndolas por bloques con fetchmany.
+
+        Todas las tablas se leen en una misma transacción de lectura, así que el
+        volcado es una foto consistente. Con incremental=True salen las filas con
+        id mayor a la marca del volcado anterior más las que el registro de
+        cambios anota como modificadas desde entonces; los ids borrados van a un
+        archivo '_eliminados' aparte. Las marcas se avanzan recién cuando los
+        archivos quedaron escritos completos. Devuelve una lista con {tabla, ruta,
+        filas, segundos, filas_por_segundo, desde, hasta, actualizadas,
+        eliminadas, ruta_eliminadas, completo}; completo=False si se compactaron
+        cambios que el volcado anterior no alcanzó a ver.
+        """
+        if formato not in ESCRITORES_VOLCADO:
+            raise ValueError(f"Formato de volcado desconocido: {formato}")
+        clase, extension = ESCRITORES_VOLCADO[formato]
+        extension += ".gz" if comprimir else ""
+        tablas = list(tablas or TABLAS_GENERACION)
+        desconocidas = set(tablas) - set(TABLAS_GENERACION)
+        if desconocidas:
+            raise ValueError(f"Tablas desconocidas: {sorted(desconocidas)}")
+        os.makedirs(directorio, exist_ok=True)
+        sello = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        resultados = []
+        conn = self.pool.acquire()
+        try:
+            conn.execute("BEGIN")
+            seq_hasta = self.ultimo_cambio(conn)
+            for tabla in tablas:
+                columnas = self.columnas_volcado(tabla, conn)
+                desde = self.marca_volcado(tabla, conn) if incremental else 0
+                seq_desde = (self.posicion_consumidor(f"volcado:{tabla}", conn) or 0) if incremental else 0
+                nombre = f"{tabla}_{sello}" + (f"_desde_{desde}" if incremental else "")
+                ruta = os.path.join(directorio, nombre + extension)
+
+                inicio = time.perf_counter()
+                escritor = clase(ruta, columnas, comprimir)
+                filas = actualizadas = 0
+                hasta = desde
+                try:
+                    seleccion = f'SELECT {", ".join(columnas)} FROM "{tabla}" WHERE '
+                    consultas = [(seleccion + "id > ? ORDER BY id", (desde,), False)]
+                    if incremental:
+                        # Las modificadas tienen id <= desde: salen antes y el archivo queda en orden de id
+                        consultas.insert(0, (
+                            seleccion + "id <= ? AND id IN (SELECT fila_id FROM cambios"
+                            " WHERE seq > ? AND seq <= ? AND tabla = ? AND op = 'U') ORDER BY id",
+                            (desde, seq_desde, seq_hasta, tabla), True))
+                    posicion_id = columnas.index('id')
+                    for sql, parametros, modificadas in consultas:
+                        cursor = conn.execute(sql, parametros)
+                        while True:
+                            bloque_filas = cursor.fetchmany(bloque)
+                            if not bloque_filas:
+                                break
+                            escritor.escribir(bloque_filas)
+                            filas += len(bloque_filas)
+                            if modificadas:
+                                actualizadas += len(bloque_filas)
+                            else:
+                                hasta = bloque_filas[-1][posicion_id]
+                            if al_progreso:
+                                al_progreso(tabla, filas)
+                finally:
+                    escritor.cerrar()
+
+                eliminadas, ruta_eliminadas, completo = 0, None, True
+                if incremental:
+                    completo = seq_desde >= self._compactado_hasta(conn)
+                    borradas = conn.execute(
+                        "SELECT fila_id, MAX(clave) FROM cambios WHERE seq > ? AND seq <= ? AND tabla = ? "
+                        "AND op = 'D' AND fila_id <= ? GROUP BY fila_id ORDER BY fila_id",
+                        (seq_desde, seq_hasta, tabla, desde)).fetchall()
+                    if borradas:
+                        ruta_eliminadas = os.path.join(directorio, f"{nombre}_eliminados{extension}")
+                        escritor = clase(ruta_eliminadas, ['id', CLAVES_NEGOCIO.get(tabla) or 'clave'], comprimir)
+                        try:
+                            escritor.escribir(borradas)
+                        finally:
+                            escritor.cerrar()
+                        eliminadas = len(borradas)
+                segundos = time.perf_counter() - inicio
+                resultados.append({
+                    'tabla': tabla,
+                    'ruta': ruta,
+                    'filas': filas,
+                    'segundos': round(segundos, 3),
+                    'filas_por_segundo': round(filas / segundos) if segundos > 0 else 0,
+                    'desde': desde,
+                    'hasta': hasta,
+                    'actualizadas': actualizadas,
+                    'eliminadas': eliminadas,
+                    'ruta_eliminadas': ruta_eliminadas,
+                    'completo': completo,
+                })
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+        if incremental:
+            with self.conexion() as escritura:
+                escritura.executemany(
+                    "INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)",
+                    [(f"volcado_marca:{r['tabla']}", str(r['hasta'])) for r in resultados])
+                for r in resultados:
+                    self.confirmar_cambios(f"volcado:{r['tabla']}", seq_hasta, escritura)
+        return resultados
+
+    # --- Importación ---
+
+    def importar_archivo(self, tabla, ruta, lote=1000, transaccion=20000, ruta_rechazos=None,
+                         al_progreso=None, max_rechazos_memoria=1000):
+        """Importar un archivo con upsert sobre la clave de negocio de la tabla.
+
+        Las filas se leen en streaming, se normalizan por lotes y se escriben con
+        executemany en transacciones de 'transaccion' filas. Si la clave ya
+        existe la fila se actualiza (las celdas vacías no borran datos). Una fila
+        inválida se rechaza sin detener la carga: queda en 'rechazos' (y en
+        ruta_rechazos, si se indica) con su número de línea y el motivo.
+        """
+        if tabla not in IMPORTACIONES:
+            raise ValueError(f"La tabla {tabla} no admite importación")
+        definicion = IMPORTACIONES[tabla]
+        clave = definicion['clave']
+        normalizadores = definicion['columnas']
+
+        inicio = time.perf_counter()
+        leidas = insertadas = actualizadas = 0
+        rechazos = []
+        total_rechazos = 0
+        archivo_rechazos = escritor_rechazos = None
+        if ruta_rechazos:
+            archivo_rechazos = open(ruta_rechazos, "w", encoding="utf-8-sig", newline="")
+            escritor_rechazos = csv.writer(archivo_rechazos)
+            escritor_rechazos.writerow(["linea", "motivo", "datos"])
+
+        def rechazar(linea, motivo, valores):
+            nonlocal total_rechazos
+            total_rechazos += 1
+            if len(rechazos) < max_rechazos_memoria:
+                rechazos.append((linea, motivo))
+            if escritor_rechazos:
+                escritor_rechazos.writerow([linea, motivo, json.dumps(list(valores), ensure_ascii=False,
+                                                                      default=str)])
+
+        columnas = None         # Columnas del archivo reconocidas, en orden
+        posiciones = None
+        sql_insertar = sql_actualizar = None
+        pendientes = []         # [(linea, valores_normalizados)]
+
+        def preparar(encabezados):
+            nonlocal columnas, posiciones, sql_insertar, sql_actualizar
+            nombres = [ALIAS_ENCABEZADOS.get(clave_encabezado(e), clave_encabezado(e)) for e in encabezados]
+            columnas = [n for n in dict.fromkeys(nombres) if n in normalizadores]
+            faltantes = [c for c in definicion['obligatorias'] if c not in columnas]
+            if faltantes:
+                raise ErrorImportacion(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+            posiciones = [nombres.index(c) for c in columnas]
+            sql_insertar = (f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+                            f"VALUES ({', '.join('?' * len(columnas))})")
+            # Parámetros en el mismo orden que 'columnas'; la clave va al final
+            actualizar = [c for c in columnas if c != clave]
+            sql_actualizar = (f"UPDATE {tabla} SET "
+                              + ", ".join(f"{c} = COALESCE(?, {c})" for c in actualizar)
+                              + f" WHERE {clave} = ?") if actualizar else None
+
+        def normalizar(linea, valores):
+            fila = []
+            for columna, posicion in zip(columnas, posiciones):
+                valor = valores[posicion] if posicion < len(valores) else None
+                valor = None if valor is None or (isinstance(valor, str) and not valor.strip()) \
+                    else normalizadores[columna](valor)
+                if valor is None and columna == clave:
+                    raise ErrorImportacion(f"{columna} vacío")
+                fila.append(valor)
+            return fila
+
+        def por_defecto(columna):
+            valor = definicion['defecto'].get(columna)
+            return valor() if callable(valor) else valor
+
+        def escribir_lote(conn):
+            nonlocal insertadas, actualizadas
+            if not pendientes:
+                return
+            posicion_clave = columnas.index(clave)
+            existentes = {c for (c,) in conn.execute(
+                f"SELECT {clave} FROM {tabla} WHERE {clave} IN (SELECT value FROM json_each(?))",
+                (json.dumps([fila[posicion_clave] for _, fila in pendientes]),))}
+            # Las obligatorias y los valores por defecto solo aplican al insertar:
+            # al actualizar, una celda vacía conserva el valor guardado. Una clave
+            # repetida dentro del lote se inserta la primera vez y luego se actualiza.
+            nuevas, cambios = [], []
+            for linea, fila in pendientes:
+                valor_clave = fila[posicion_clave]
+                if valor_clave in existentes:
+                    if sql_actualizar:
+                        cambios.append((linea, fila[:posicion_clave] + fila[posicion_clave + 1:] + [valor_clave]))
+                    continue
+                vacias = [c for c, v in zip(columnas, fila) if v is None and c in definicion['obligatorias']]
+                if vacias:
+                    rechazar(linea, f"{', '.join(vacias)} vacío", fila)
+                    continue
+                nuevas.append((linea, [por_defecto(c) if v is None else v for c, v in zip(columnas, fila)]))
+                existentes.add(valor_clave)
+            pendientes.clear()
+            # Sin SAVEPOINT por lote (multiplica el tiempo de carga): si executemany
+            # falla, las filas previas a la fallida ya quedaron escritas.
+            try:
+                conn.executemany(sql_insertar, [fila for _, fila in nuevas])
+                if cambios:
+                    conn.executemany(sql_actualizar, [fila for _, fila in cambios])
+                insertadas += len(nuevas)
+                actualizadas += len(cambios)
+                return
+            except sqlite3.Error:
+                pass
+            # Aislar las filas que fallan: las nuevas ya escritas se reconocen por su
+            # clave y los UPDATE se pueden repetir (son idempotentes)
+            escritas = {c for (c,) in conn.execute(
+                f"SELECT {clave} FROM {tabla} WHERE {clave} IN (SELECT value FROM json_each(?))",
+                (json.dumps([fila[posicion_clave] for _, fila in nuevas]),))}
+            for sql, filas, es_nueva in ((sql_insertar, nuevas, True), (sql_actualizar, cambios, False)):
+                for linea, fila in filas:
+                    if not (es_nueva and fila[posicion_clave] in escritas):
+                        try:
+                            conn.execute(sql, fila)
+                        except sqlite3.Error as e:
+                            rechazar(linea, str(e), fila)
+                            continue
+                    if es_nueva:
+                        insertadas += 1
+                    else:
+                        actualizadas += 1
+
+        def confirmar(conn):
+            # El 'reload' de abajo ya cubre estos cambios: quien siga el registro los salta
+            despues = self.ultimo_cambio(conn)
+            self.seguimiento.registrar_propios(antes, despues)
+            try:
+                conn.commit()
+            except sqlite3.Error:
+                self.seguimiento.descartar_propios(antes, despues)
+                raise
+
+        conn = self.pool.acquire()
+        try:
+            en_transaccion = 0
+            conn.execute("BEGIN IMMEDIATE")
+            antes = self.ultimo_cambio(conn)
+            for linea, encabezados, valores in leer_filas_archivo(ruta):
+                if columnas is None and encabezados:
+                    preparar(encabezados)
+                leidas += 1
+                if valores is None or columnas is None:
+                    rechazar(linea, "línea ilegible", [] if valores is None else valores)
+                    continue
+                try:
+                    pendientes.append((linea, normalizar(linea, valores)))
+                except ErrorImportacion as e:
+                    rechazar(linea, str(e), valores)
+                if len(pendientes) >= lote:
+                    en_transaccion += len(pendientes)
+                    escribir_lote(conn)
+                    if en_transaccion >= transaccion:
+                        confirmar(conn)
+                        conn.execute("BEGIN IMMEDIATE")
+                        antes = self.ultimo_cambio(conn)
+                        en_transaccion = 0
+                    if al_progreso:
+                        al_progreso(leidas)
+            escribir_lote(conn)
+            confirmar(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+            if archivo_rechazos:
+                archivo_rechazos.close()
+
+        if insertadas or actualizadas:
+            self.notificador.publicar([Cambio(tabla, 'reload', None, None)])
+        rechazos.sort()
+        segundos = time.perf_counter() - inicio
+        return ResultadoImportacion(tabla, leidas, insertadas, actualizadas, total_rechazos,
+                                    round(segundos, 3), round(leidas / segundos) if segundos > 0 else 0,
+                                    rechazos)
+
     def validate_user(self, usuario, password):
         """Validar usuario"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, usuario, nombre, tipo_usuario FROM usuarios 
-            WHERE usuario = ? AND password = ? AND estado = 'Activo'
-        """, (usuario, password))
+        cursor.execute(CONSULTAS['usuarios_validar'], (usuario, password))
         
         result = cursor.fetchone()
         conn.close()
@@ -235,6 +3045,882 @@ class DatabaseManager:
             }
         return None
 
+    def fila_listado(self, listado, id_fila, conn):
+        """Registro de un listado (mismas columnas que paginar) por id, o None"""
+        fila = conn.execute(sql_por_ids(listado), (json.dumps([id_fila]),)).fetchone()
+        return LISTADOS[listado]['registro'](*fila) if fila is not None else None
+
+    def crear_presupuesto(self, datos, esperar=True):
+        """Insertar un presupuesto y publicar el cambio; devuelve el id nuevo.
+
+        Lanza sqlite3.IntegrityError si el número de presupuesto ya existe.
+        Con esperar=False devuelve el Future del hilo escritor.
+        """
+        futuro = self.escritor.enviar(self._insertar_presupuesto, datos)
+        return futuro.result() if esperar else futuro
+
+    def eliminar_presupuesto(self, numero_presupuesto, esperar=True):
+        """Eliminar un presupuesto por número y publicar el cambio; True si existía"""
+        futuro = self.escritor.enviar(self._borrar_presupuesto, numero_presupuesto)
+        return futuro.result() if esperar else futuro
+
+    def eliminar_presupuestos(self, numeros):
+        """Eliminar varios presupuestos; van juntos en pocas transacciones. Devuelve cuántos existían"""
+        futuros = [self.escritor.enviar(self._borrar_presupuesto, n) for n in numeros]
+        return sum(1 for f in futuros if f.result())
+
+    # Comandos del hilo escritor: escriben con conn (sin commit) y anotan sus cambios
+
+    def _insertar_presupuesto(self, conn, cambios, datos):
+        cursor = conn.execute(CONSULTAS['presupuestos_insertar'], (
+            datos['numero_presupuesto'],
+            datos['cliente'],
+            datos.get('proyecto', ''),
+            datos.get('descripcion', ''),
+            datos.get('monto_total', 0),
+            datos.get('estado', 'Borrador'),
+            datos.get('usuario_id'),
+        ))
+        id_nuevo = cursor.lastrowid
+        cambios.append(Cambio('presupuestos', 'insert', id_nuevo,
+                              self.fila_listado('presupuestos', id_nuevo, conn)))
+        return id_nuevo
+
+    def _borrar_presupuesto(self, conn, cambios, numero_presupuesto):
+        fila = conn.execute(CONSULTAS['presupuestos_id'], (numero_presupuesto,)).fetchone()
+        if fila is None:
+            return False
+        conn.execute(CONSULTAS['presupuestos_eliminar'], (numero_presupuesto,))
+        cambios.append(Cambio('presupuestos', 'delete', fila[0], None))
+        return True
+
+class QueryTicket:
+    """Suscripción a una consulta en curso; permite cancelarla"""
+
+    def __init__(self, al_terminar, al_fallar=None, al_cancelar=None, propietario=None):
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.al_cancelar = al_cancelar
+        self.propietario = propietario
+        self.cancelado = False
+
+class _QueryTask(QRunnable):
+    """Tarea que ejecuta una consulta en un hilo del QThreadPool"""
+
+    def __init__(self, ejecutor, id_tarea, clave, funcion):
+        super().__init__()
+        self.setAutoDelete(True)
+        self.ejecutor = ejecutor
+        self.id_tarea = id_tarea
+        self.clave = clave
+        self.funcion = funcion
+        self.suscriptores = []
+        self.cancelado = False
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def interrumpir(self):
+        """Marcar como cancelada e interrumpir la consulta si ya está corriendo"""
+        with self.lock:
+            self.cancelado = True
+            if self.conn is not None:
+                self.conn.interrupt()
+
+    def run(self):
+        if self.cancelado:
+            self.ejecutor._error.emit(self.id_tarea, None)
+            return
+        try:
+            conn = self.ejecutor.db.pool.acquire()
+        except sqlite3.Error as e:
+            self.ejecutor._error.emit(self.id_tarea, e)
+            return
+        try:
+            with self.lock:
+                self.conn = conn
+            resultado = self.funcion(conn)
+        except Exception as e:
+            self.ejecutor._error.emit(self.id_tarea, None if self.cancelado else e)
+        else:
+            self.ejecutor._resultado.emit(self.id_tarea, resultado)
+        finally:
+            with self.lock:
+                self.conn = None
+            self.ejecutor.db.pool.release(conn)
+
+class QueryExecutor(QObject):
+    """Ejecutor de consultas fuera del hilo de la interfaz.
+
+    Cada consulta corre en un QThreadPool con una conexión del pool y su
+    resultado vuelve al hilo de la interfaz por señales. Las solicitudes con la
+    misma clave mientras una está en curso se agrupan en una sola ejecución.
+    """
+
+    _resultado = pyqtSignal(int, object)
+    _error = pyqtSignal(int, object)
+
+    def __init__(self, db_manager, max_hilos=None, sincrono=False, parent=None):
+        super().__init__(parent)
+        self.db = db_manager
+        self.sincrono = sincrono
+        self.hilos = QThreadPool()
+        if max_hilos is None:
+            max_hilos = max(1, min(4, self.db.pool.max_conexiones - 1))
+        self.hilos.setMaxThreadCount(max_hilos)
+
+        self._tareas = {}       # id_tarea -> _QueryTask
+        self._en_curso = {}     # clave -> _QueryTask
+        self._siguiente_id = 0
+        self.estadisticas = {'ejecutadas': 0, 'agrupadas': 0, 'canceladas': 0}
+
+        self._resultado.connect(self._al_resultado)
+        self._error.connect(self._al_error)
+
+    def consultar(self, clave, funcion, al_terminar, al_fallar=None, al_cancelar=None, propietario=None):
+        """Ejecutar funcion(conn) en segundo plano y entregar su resultado a al_terminar"""
+        ticket = QueryTicket(al_terminar, al_fallar, al_cancelar, propietario)
+
+        if self.sincrono:
+            self.estadisticas['ejecutadas'] += 1
+            try:
+                with self.db.conexion() as conn:
+                    resultado = funcion(conn)
+            except Exception as e:
+                self._notificar_error(ticket, e)
+            else:
+                ticket.al_terminar(resultado)
+            return ticket
+
+        tarea = self._en_curso.get(clave)
+        if tarea is not None and not tarea.cancelado:
+            self.estadisticas['agrupadas'] += 1
+            tarea.suscriptores.append(ticket)
+            return ticket
+
+        self._siguiente_id += 1
+        tarea = _QueryTask(self, self._siguiente_id, clave, funcion)
+        tarea.suscriptores.append(ticket)
+        self._tareas[tarea.id_tarea] = tarea
+        self._en_curso[clave] = tarea
+        self.estadisticas['ejecutadas'] += 1
+        self.hilos.start(tarea)
+        return ticket
+
+    def consultar_sql(self, nombre, params=(), al_terminar=None, **opciones):
+        """Ejecutar una consulta registrada en CONSULTAS y entregar fetchall()"""
+        sql = CONSULTAS[nombre]
+        return self.consultar((nombre, tuple(params)),
+                              lambda conn: conn.execute(sql, params).fetchall(),
+                              al_terminar, **opciones)
+
+    def cancelar(self, propietario=None, ticket=None):
+        """Cancelar las suscripciones de un propietario (o un ticket puntual)"""
+        for tarea in list(self._tareas.values()):
+            for t in tarea.suscriptores:
+                if t.cancelado:
+                    continue
+                if t is ticket or (ticket is None and t.propietario is propietario):
+                    t.cancelado = True
+                    self.estadisticas['canceladas'] += 1
+                    if t.al_cancelar:
+                        t.al_cancelar()
+            if all(t.cancelado for t in tarea.suscriptores):
+                tarea.interrumpir()
+                if self._en_curso.get(tarea.clave) is tarea:
+                    del self._en_curso[tarea.clave]
+
+    def en_curso(self, propietario=None):
+        """¿Hay consultas activas (de este propietario)?"""
+        return any(not t.cancelado and (propietario is None or t.propietario is propietario)
+                   for tarea in self._tareas.values() for t in tarea.suscriptores)
+
+    def esperar(self, timeout_ms=-1):
+        """Esperar a que terminen las tareas en curso (útil en scripts y pruebas)"""
+        return self.hilos.waitForDone(timeout_ms)
+
+    def _terminar_tarea(self, id_tarea):
+        tarea = self._tareas.pop(id_tarea, None)
+        if tarea is not None and self._en_curso.get(tarea.clave) is tarea:
+            del self._en_curso[tarea.clave]
+        return tarea
+
+    def _al_resultado(self, id_tarea, resultado):
+        tarea = self._terminar_tarea(id_tarea)
+        if tarea is None:
+            return
+        for ticket in tarea.suscriptores:
+            if not ticket.cancelado and ticket.al_terminar:
+                ticket.al_terminar(resultado)
+
+    def _al_error(self, id_tarea, error):
+        tarea = self._terminar_tarea(id_tarea)
+        if tarea is None or error is None:
+            return
+        for ticket in tarea.suscriptores:
+            if not ticket.cancelado:
+                self._notificar_error(ticket, error)
+
+    def _notificar_error(self, ticket, error):
+        if ticket.al_fallar:
+            ticket.al_fallar(error)
+        else:
+            print(f"Error en consulta: {error}")
+
+class WriteQueue(QObject):
+    """Hilo escritor único con confirmación agrupada (group commit).
+
+    Es dueño de la única conexión que hace escrituras de filas. Los comandos
+    llegan por una cola y se ejecutan en el orden de llegada (así dos
+    escrituras sobre la misma entidad nunca se adelantan); los que se
+    acumulan mientras hay una transacción abierta entran en ella, hasta
+    max_lote comandos o max_ms de transacción. Cada comando corre en su
+    propio SAVEPOINT: si falla solo se deshace el suyo.
+
+    enviar() devuelve un Future que se resuelve tras el COMMIT; al_terminar y
+    al_fallar, si se indican, se llaman en el hilo de la interfaz.
+    """
+
+    _hecho = pyqtSignal(object, object)     # función a llamar, argumento
+
+    def __init__(self, db_manager, max_lote=200, max_ms=20):
+        super().__init__()
+        self.db = db_manager
+        self.max_lote = max(1, int(max_lote))
+        self.max_ms = max_ms
+        self.cola = queue.Queue()
+        self._cerrado = False
+        self._en_curso = []         # comandos sacados de la cola en el lote actual
+        self._reabrir = False       # la conexión quedó en un estado que no se pudo revertir
+        self._lock = threading.Lock()
+        self.estadisticas = {'comandos': 0, 'fallidos': 0, 'transacciones': 0, 'lote_maximo': 0,
+                             'reconexiones': 0}
+        self._hecho.connect(lambda funcion, argumento: funcion(argumento))
+        self.hilo = threading.Thread(target=self._bucle, name="jurmaq-escritor", daemon=True)
+        self.hilo.start()
+
+    def enviar(self, funcion, *args, al_terminar=None, al_fallar=None):
+        """Encolar funcion(conn, cambios, *args).
+
+        La función escribe con conn (sin commit) y agrega a 'cambios' los
+        Cambio a publicar; su valor de retorno es el resultado del Future.
+        """
+        futuro = Future()
+        with self._lock:
+            if self._cerrado:
+                raise sqlite3.ProgrammingError("La cola de escritura está cerrada")
+            self.cola.put((funcion, args, futuro, al_terminar, al_fallar))
+        return futuro
+
+    def ejecutar(self, funcion, *args, timeout=None):
+        """enviar() y esperar el resultado (relanza el error del comando)"""
+        return self.enviar(funcion, *args).result(timeout)
+
+    def cerrar(self, timeout=10.0):
+        """Terminar los comandos pendientes y cerrar la conexión"""
+        with self._lock:
+            if not self._cerrado:
+                self._cerrado = True
+                self.cola.put(None)
+        self.hilo.join(timeout)
+
+    def resumen(self):
+        """Copia de los contadores (se leen desde el diálogo de diagnóstico)"""
+        with self._lock:
+            datos = dict(self.estadisticas)
+        datos['pendientes'] = self.cola.qsize()
+        return datos
+
+    def _conectar(self):
+        conn = self.db.pool.conectar(isolation_level=None)
+        try:
+            self.db._preparar_conexion(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _descartar(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _bucle(self):
+        conn = None
+        usada_en = 0.0
+        try:
+            while True:
+                comando = self.cola.get()
+                if comando is None:
+                    return
+                self._en_curso = [comando]
+                try:
+                    # Tras mucho tiempo sin uso (p. ej. el servidor de datos cerró la
+                    # sesión por inactividad) se verifica antes de escribir
+                    if conn is not None and not self.db.pool._saludable(conn, usada_en):
+                        self._descartar(conn)
+                        conn = None
+                    if conn is None:
+                        conn = self._conectar()
+                    fin = self._ejecutar_lote(conn, comando)
+                    usada_en = time.monotonic()
+                    if fin:
+                        return
+                except Exception as e:
+                    # Error inesperado (conexión caída, ROLLBACK imposible...): ningún
+                    # Future del lote puede quedar sin resolver
+                    self._resolver([(c, None, e, []) for c in self._en_curso])
+                    self._reabrir = True
+                if self._reabrir:
+                    # Siguiente comando con una conexión nueva
+                    self._reabrir = False
+                    if conn is not None:
+                        self._descartar(conn)
+                        conn = None
+                        with self._lock:
+                            self.estadisticas['reconexiones'] += 1
+        finally:
+            # Si el hilo termina por cualquier motivo, enviar() debe fallar y lo
+            # que quedó en la cola no puede esperar para siempre
+            with self._lock:
+                self._cerrado = True
+            error = sqlite3.ProgrammingError("La cola de escritura está cerrada")
+            pendientes = []
+            while True:
+                try:
+                    comando = self.cola.get_nowait()
+                except queue.Empty:
+                    break
+                if comando is not None:
+                    pendientes.append((comando, None, error, []))
+            if pendientes:
+                self._resolver(pendientes)
+            if conn is not None:
+                self._descartar(conn)
+
+    def _revertir(self, conn):
+        """ROLLBACK si la transacción sigue abierta; si falla, reabrir la conexión"""
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            self._reabrir = True
+
+    def _ejecutar_lote(self, conn, primero):
+        """Una transacción con el primer comando y los que lleguen mientras está abierta.
+
+        Devuelve True si en la cola apareció la marca de cierre.
+        """
+        hechos = []             # [(comando, resultado, error, cambios)]
+        fin = False
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            antes = self.db.ultimo_cambio(conn)
+        except sqlite3.Error as e:
+            # Base bloqueada más allá de busy_timeout o conexión caída: se reabre
+            self._reabrir = True
+            self._resolver([(primero, None, e, [])])
+            return False
+
+        limite = time.monotonic() + self.max_ms / 1000
+        comando = primero
+        while True:
+            funcion, args, futuro = comando[:3]
+            cambios = []
+            if futuro.set_running_or_notify_cancel():
+                try:
+                    conn.execute("SAVEPOINT comando")
+                    resultado = funcion(conn, cambios, *args)
+                    conn.execute("RELEASE comando")
+                    hechos.append((comando, resultado, None, cambios))
+                except Exception as e:
+                    hechos.append((comando, None, e, []))
+                    try:
+                        conn.execute("ROLLBACK TO comando")
+                        conn.execute("RELEASE comando")
+                    except sqlite3.Error:
+                        pass
+                    if not conn.in_transaction:
+                        # Error grave (disco lleno, E/S): SQLite ya revirtió todo el lote
+                        self._resolver([(c, None, e, []) for c, _, _, _ in hechos])
+                        return False
+            # Sumar lo que ya está en la cola, sin esperar a que llegue más
+            if len(hechos) >= self.max_lote or time.monotonic() >= limite:
+                break
+            try:
+                comando = self.cola.get_nowait()
+            except queue.Empty:
+                break
+            if comando is None:
+                fin = True
+                break
+            self._en_curso.append(comando)
+
+        # Estos cambios se publican aquí: quien siga el registro no debe repetirlos
+        despues = antes
+        try:
+            despues = self.db.ultimo_cambio(conn)
+            self.db.seguimiento.registrar_propios(antes, despues)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            self.db.seguimiento.descartar_propios(antes, despues)
+            self._revertir(conn)
+            hechos = [(c, None, e, []) for c, _, _, _ in hechos]
+        with self._lock:
+            self.estadisticas['transacciones'] += 1
+            self.estadisticas['lote_maximo'] = max(self.estadisticas['lote_maximo'], len(hechos))
+        self._resolver(hechos)
+        return fin
+
+    def _resolver(self, hechos):
+        """Completar los Future en orden y publicar los cambios confirmados juntos"""
+        confirmados = []
+        for (_, _, futuro, al_terminar, al_fallar), resultado, error, cambios in hechos:
+            if futuro.done():
+                continue
+            with self._lock:
+                self.estadisticas['comandos'] += 1
+                if error is not None:
+                    self.estadisticas['fallidos'] += 1
+            if error is None:
+                confirmados.extend(cambios)
+                futuro.set_result(resultado)
+                if al_terminar:
+                    self._hecho.emit(al_terminar, resultado)
+            else:
+                futuro.set_exception(error)
+                if al_fallar:
+                    self._hecho.emit(al_fallar, error)
+        self.db.notificador.publicar(confirmados)
+
+class EscritorXlsx:
+    """Planilla Excel escrita fila a fila en modo de memoria constante.
+
+    En constant_memory xlsxwriter vuelca cada fila a disco al pasar a la
+    siguiente, así que el uso de memoria no depende del total exportado.
+    Si se supera el límite de filas de Excel se continúa en otra hoja.
+    """
+
+    MAX_FILAS_HOJA = 1048576
+
+    def __init__(self, ruta, columnas, titulo="Datos"):
+        self.columnas = columnas
+        self.titulo = titulo
+        self.libro = xlsxwriter.Workbook(ruta, {'constant_memory': True})
+        self.formatos = {
+            'encabezado': self.libro.add_format({'bold': True, 'bg_color': '#1e40af',
+                                                 'font_color': 'white'}),
+            'monto': self.libro.add_format({'num_format': '"$"#,##0'}),
+            'fecha': self.libro.add_format({'num_format': 'dd/mm/yyyy hh:mm'}),
+            'texto': None,
+        }
+        self.tipos = [tipo for _, _, tipo in columnas]
+        self.hojas = 0
+        self._nueva_hoja()
+
+    def _nueva_hoja(self):
+        self.hojas += 1
+        nombre = self.titulo if self.hojas == 1 else f"{self.titulo} ({self.hojas})"
+        self.hoja = self.libro.add_worksheet(nombre[:31])
+        for col, (_, titulo, tipo) in enumerate(self.columnas):
+            self.hoja.set_column(col, col, 18 if tipo != 'texto' else 28)
+            self.hoja.write_string(0, col, titulo, self.formatos['encabezado'])
+        self.hoja.freeze_panes(1, 0)
+        self.fila = 1
+
+    def escribir(self, filas):
+        for valores in filas:
+            if self.fila >= self.MAX_FILAS_HOJA:
+                self._nueva_hoja()
+            for col, valor in enumerate(valores):
+                if valor is None:
+                    continue
+                tipo = self.tipos[col]
+                if tipo == 'monto':
+                    self.hoja.write_number(self.fila, col, valor, self.formatos['monto'])
+                elif tipo == 'fecha':
+                    try:
+                        self.hoja.write_datetime(self.fila, col, datetime.fromisoformat(valor),
+                                                 self.formatos['fecha'])
+                    except (TypeError, ValueError):
+                        self.hoja.write_string(self.fila, col, str(valor))
+                else:
+                    self.hoja.write_string(self.fila, col, str(valor))
+            self.fila += 1
+
+    def cerrar(self):
+        self.libro.close()
+
+def abrir_salida(ruta, comprimir=False):
+    """Archivo de texto UTF-8 para escribir, comprimido con gzip si se pide"""
+    if comprimir:
+        return gzip.open(ruta, "wt", encoding="utf-8", newline="", compresslevel=6)
+    return open(ruta, "w", encoding="utf-8", newline="")
+
+class EscritorCsv:
+    """CSV con encabezado (UTF-8 con BOM para que Excel respete los acentos)"""
+
+    def __init__(self, ruta, columnas, comprimir=False):
+        self.archivo = abrir_salida(ruta, comprimir)
+        self.archivo.write("\ufeff")
+        self.csv = csv.writer(self.archivo)
+        self.csv.writerow(columnas)
+
+    def escribir(self, filas):
+        self.csv.writerows(filas)
+
+    def cerrar(self):
+        self.archivo.close()
+
+class EscritorNdjson:
+    """Un objeto JSON por línea (newline-delimited JSON)"""
+
+    def __init__(self, ruta, columnas, comprimir=False):
+        self.archivo = abrir_salida(ruta, comprimir)
+        self.columnas = list(columnas)
+        self.codificar = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+    def escribir(self, filas):
+        columnas, codificar = self.columnas, self.codificar
+        self.archivo.write("".join(codificar(dict(zip(columnas, fila))) + "\n" for fila in filas))
+
+    def cerrar(self):
+        self.archivo.close()
+
+ESCRITORES_VOLCADO = {'csv': (EscritorCsv, ".csv"), 'ndjson': (EscritorNdjson, ".ndjson")}
+
+# --- Importación ---
+
+def digito_verificador(numero):
+    """Dígito verificador de un RUT chileno (módulo 11)"""
+    suma, factor = 0, 2
+    while numero:
+        suma += (numero % 10) * factor
+        numero //= 10
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: "0", 10: "K"}.get(resto, str(resto))
+
+def formatear_rut(numero):
+    """12345678 -> '12.345.678-5'"""
+    return f"{numero:,}".replace(",", ".") + "-" + digito_verificador(numero)
+
+class ErrorImportacion(ValueError):
+    """Valor de una fila que no se puede normalizar"""
+
+def normalizar_texto(valor):
+    texto = str(valor).strip()
+    return texto or None
+
+def normalizar_monto(valor):
+    """'$1.234.567', '1,234,567', '1234567.5' o número -> float"""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).strip().replace("$", "").replace(" ", "")
+    if not texto:
+        return None
+    if "," in texto and "." in texto:
+        # El último separador es el decimal
+        if texto.rfind(",") > texto.rfind("."):
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    elif texto.count(".") > 1 or re.fullmatch(r"-?\d{1,3}(\.\d{3})+", texto):
+        texto = texto.replace(".", "")      # Miles con punto (formato chileno)
+    else:
+        texto = texto.replace(",", "." if texto.count(",") == 1 and len(texto.split(",")[1]) != 3 else "")
+    try:
+        return float(texto)
+    except ValueError:
+        raise ErrorImportacion(f"monto inválido: {valor!r}")
+
+def normalizar_entero(valor):
+    monto = normalizar_monto(valor)
+    return None if monto is None else int(round(monto))
+
+_FORMATOS_FECHA = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S",
+                   "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y")
+
+def normalizar_fecha(valor, con_hora=True):
+    """Fecha a texto ISO ('AAAA-MM-DD[ HH:MM:SS]') como la guarda SQLite"""
+    if isinstance(valor, datetime):
+        fecha = valor
+    elif isinstance(valor, date):
+        fecha = datetime(valor.year, valor.month, valor.day)
+    else:
+        texto = str(valor).strip().replace("T", " ")
+        if not texto:
+            return None
+        for formato in _FORMATOS_FECHA:
+            try:
+                fecha = datetime.strptime(texto, formato)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ErrorImportacion(f"fecha inválida: {valor!r}")
+    return fecha.strftime("%Y-%m-%d %H:%M:%S" if con_hora else "%Y-%m-%d")
+
+def normalizar_dia(valor):
+    return normalizar_fecha(valor, con_hora=False)
+
+def normalizar_rut(valor):
+    """RUT con o sin puntos/guion -> '12.345.678-5', validando el dígito verificador"""
+    texto = re.sub(r"[^0-9kK]", "", str(valor))
+    if len(texto) < 2:
+        raise ErrorImportacion(f"RUT inválido: {valor!r}")
+    numero, dv = int(texto[:-1]), texto[-1].upper()
+    if digito_verificador(numero) != dv:
+        raise ErrorImportacion(f"RUT con dígito verificador incorrecto: {valor!r}")
+    return formatear_rut(numero)
+
+def normalizar_patente(valor):
+    """'bcdf12', 'BC DF 12', 'BC-DF-12' -> 'BC-DF-12'; formato antiguo 'AB1234' -> 'AB-1234'"""
+    texto = re.sub(r"[^0-9A-Za-z]", "", str(valor)).upper()
+    if re.fullmatch(r"[A-Z]{4}\d{2}", texto):
+        return f"{texto[:2]}-{texto[2:4]}-{texto[4:]}"
+    if re.fullmatch(r"[A-Z]{2}\d{4}", texto):
+        return f"{texto[:2]}-{texto[2:]}"
+    raise ErrorImportacion(f"patente inválida: {valor!r}")
+
+def ahora_sql():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Tablas importables: clave de negocio (UNIQUE), columnas con su normalizador,
+# obligatorias y valores por defecto para celdas vacías (constantes o funciones).
+IMPORTACIONES = {
+    'presupuestos': {
+        'clave': 'numero_presupuesto',
+        'columnas': {'numero_presupuesto': normalizar_texto, 'cliente': normalizar_texto,
+                     'proyecto': normalizar_texto, 'descripcion': normalizar_texto,
+                     'monto_total': normalizar_monto, 'estado': normalizar_texto,
+                     'fecha_creacion': normalizar_fecha},
+        'obligatorias': ('numero_presupuesto', 'cliente', 'proyecto'),
+        'defecto': {'monto_total': 0, 'estado': 'Borrador', 'fecha_creacion': ahora_sql},
+    },
+    'ordenes_compra': {
+        'clave': 'numero_oc',
+        'columnas': {'numero_oc': normalizar_texto, 'proveedor': normalizar_texto,
+                     'descripcion': normalizar_texto, 'monto_total': normalizar_monto,
+                     'estado': normalizar_texto, 'fecha_creacion': normalizar_fecha,
+                     'fecha_entrega': normalizar_dia},
+        'obligatorias': ('numero_oc', 'proveedor'),
+        'defecto': {'monto_total': 0, 'estado': 'Pendiente', 'fecha_creacion': ahora_sql},
+    },
+    'empleados': {
+        'clave': 'rut',
+        'columnas': {'rut': normalizar_rut, 'nombre': normalizar_texto, 'apellido': normalizar_texto,
+                     'cargo': normalizar_texto, 'sueldo_base': normalizar_monto,
+                     'estado': normalizar_texto, 'fecha_ingreso': normalizar_dia,
+                     'email': normalizar_texto, 'telefono': normalizar_texto},
+        'obligatorias': ('rut', 'nombre', 'apellido'),
+        'defecto': {'sueldo_base': 0, 'estado': 'Activo'},
+    },
+    'vehiculos': {
+        'clave': 'patente',
+        'columnas': {'patente': normalizar_patente, 'marca': normalizar_texto,
+                     'modelo': normalizar_texto, 'año': normalizar_entero,
+                     'tipo_vehiculo': normalizar_texto, 'estado': normalizar_texto,
+                     'kilometraje': normalizar_entero},
+        'obligatorias': ('patente',),
+        'defecto': {'estado': 'Disponible', 'kilometraje': 0},
+    },
+    'inventario': {
+        'clave': 'codigo_producto',
+        'columnas': {'codigo_producto': normalizar_texto, 'nombre_producto': normalizar_texto,
+                     'categoria': normalizar_texto, 'stock_actual': normalizar_entero,
+                     'stock_minimo': normalizar_entero, 'precio_unitario': normalizar_monto,
+                     'ubicacion': normalizar_texto, 'estado': normalizar_texto},
+        'obligatorias': ('codigo_producto', 'nombre_producto'),
+        'defecto': {'stock_actual': 0, 'stock_minimo': 0, 'precio_unitario': 0, 'estado': 'Activo'},
+    },
+}
+
+def clave_encabezado(texto):
+    """'N° Presupuesto' -> 'n_presupuesto': minúsculas, sin tildes ni símbolos"""
+    texto = str(texto or "").strip().lower()
+    for origen, destino in zip("áéíóúüñ", "aeiouun"):
+        texto = texto.replace(origen, destino)
+    return re.sub(r"[^a-z0-9]+", "_", texto).strip("_")
+
+# Encabezados alternativos (incluye los títulos de las exportaciones)
+ALIAS_ENCABEZADOS = {
+    'n_presupuesto': 'numero_presupuesto', 'numero': 'numero_presupuesto',
+    'n_oc': 'numero_oc', 'orden': 'numero_oc', 'fecha': 'fecha_creacion',
+    'monto': 'monto_total', 'sueldo': 'sueldo_base', 'ano': 'año', 'anio': 'año',
+    'tipo': 'tipo_vehiculo', 'codigo': 'codigo_producto', 'producto': 'nombre_producto',
+    'precio': 'precio_unitario', 'stock': 'stock_actual',
+}
+for _columnas_exportadas in EXPORTACIONES.values():
+    for _columna, _titulo, _ in _columnas_exportadas:
+        ALIAS_ENCABEZADOS.setdefault(clave_encabezado(_titulo), _columna)
+
+def leer_filas_archivo(ruta):
+    """Recorrer un CSV (',' o ';', opcionalmente .gz), NDJSON o XLSX sin cargarlo entero.
+
+    Entrega (número de línea, encabezados, valores); en NDJSON los encabezados
+    son las claves del primer objeto y valores es None si la línea no es JSON.
+    """
+    nombre = ruta.lower()
+    base = nombre[:-3] if nombre.endswith(".gz") else nombre
+    if base.endswith(".xlsx"):
+        if openpyxl is None:
+            raise ErrorImportacion("Leer Excel requiere el paquete openpyxl (pip install openpyxl)")
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezados = next(filas, None) or ()
+            for linea, valores in enumerate(filas, start=2):
+                if any(v not in (None, "") for v in valores):
+                    yield linea, encabezados, valores
+        finally:
+            libro.close()
+        return
+
+    abrir = gzip.open if nombre.endswith(".gz") else open
+    with abrir(ruta, "rt", encoding="utf-8-sig", newline="") as archivo:
+        if base.endswith(".ndjson") or base.endswith(".jsonl"):
+            encabezados = None
+            for linea, texto in enumerate(archivo, start=1):
+                if not texto.strip():
+                    continue
+                try:
+                    objeto = json.loads(texto)
+                except ValueError:
+                    objeto = None
+                if not isinstance(objeto, dict):
+                    yield linea, encabezados or (), None
+                    continue
+                if encabezados is None:
+                    encabezados = tuple(objeto)
+                yield linea, encabezados, tuple(objeto.get(k) for k in encabezados)
+            return
+        muestra = archivo.read(8192)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(archivo, dialecto)
+        encabezados = next(lector, None) or []
+        for valores in lector:
+            if any(v.strip() for v in valores):
+                yield lector.line_num, encabezados, valores
+
+ResultadoImportacion = namedtuple(
+    'ResultadoImportacion',
+    'tabla leidas insertadas actualizadas rechazadas segundos filas_por_segundo rechazos')
+
+class _SenalesExportacion(QObject):
+    progreso = pyqtSignal(int, int)         # filas escritas, total
+    terminado = pyqtSignal(str, int)        # ruta, filas
+    fallo = pyqtSignal(str)
+    cancelado = pyqtSignal()
+
+class ExportTask(QRunnable):
+    """Exportación en segundo plano: recorre un cursor por bloques y los escribe.
+
+    Lee con fetchmany() sobre una sola consulta (una lectura consistente de la
+    base) y nunca tiene más de 'bloque' filas en memoria. cancelar() detiene el
+    recorrido entre bloques y borra el archivo a medio escribir.
+    """
+
+    def __init__(self, db_manager, listado, filtros, ruta, crear_escritor, bloque=5000):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.db = db_manager
+        self.listado = listado
+        self.filtros = {k: v for k, v in (filtros or {}).items() if v not in (None, "")}
+        self.ruta = ruta
+        self.crear_escritor = crear_escritor
+        self.bloque = bloque
+        self.senales = _SenalesExportacion()
+        self._cancelado = False
+        self._conn = None
+
+    def cancelar(self):
+        self._cancelado = True
+        conn = self._conn
+        if conn is not None:
+            conn.interrupt()
+
+    def run(self):
+        nombres = sorted(self.filtros)
+        params = [self.filtros[n] for n in nombres]
+        escritor = None
+        escritas = 0
+        conn = None
+        try:
+            # Dentro del try: si el pool no entrega conexión también se avisa con 'fallo'
+            conn = self._conn = self.db.pool.acquire()
+            total = conn.execute(sql_conteo(self.listado, nombres), params).fetchone()[0]
+            self.senales.progreso.emit(0, total)
+            escritor = self.crear_escritor(self.ruta)
+            cursor = conn.execute(sql_exportacion(self.listado, nombres), params)
+            while not self._cancelado:
+                filas = cursor.fetchmany(self.bloque)
+                if not filas:
+                    break
+                escritor.escribir(filas)
+                escritas += len(filas)
+                self.senales.progreso.emit(escritas, max(total, escritas))
+            cursor.close()
+            escritor.cerrar()
+            escritor = None
+        except Exception as e:
+            if not self._cancelado:
+                self.senales.fallo.emit(str(e))
+                self._borrar_archivo(escritor)
+                return
+        finally:
+            self._conn = None
+            if conn is not None:
+                self.db.pool.release(conn)
+
+        if self._cancelado:
+            self._borrar_archivo(escritor)
+            self.senales.cancelado.emit()
+        else:
+            self.senales.terminado.emit(self.ruta, escritas)
+
+    def _borrar_archivo(self, escritor):
+        try:
+            if escritor is not None:
+                escritor.cerrar()
+        except Exception:
+            pass
+        try:
+            os.remove(self.ruta)
+        except OSError:
+            pass
+
+class _SenalesImportacion(QObject):
+    progreso = pyqtSignal(int)              # filas leídas
+    terminado = pyqtSignal(object)          # ResultadoImportacion
+    fallo = pyqtSignal(str)
+
+class ImportTask(QRunnable):
+    """Importación en segundo plano con DatabaseManager.importar_archivo"""
+
+    def __init__(self, db_manager, tabla, ruta, ruta_rechazos=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.db = db_manager
+        self.tabla = tabla
+        self.ruta = ruta
+        self.ruta_rechazos = ruta_rechazos
+        self.senales = _SenalesImportacion()
+
+    def run(self):
+        try:
+            resultado = self.db.importar_archivo(self.tabla, self.ruta, ruta_rechazos=self.ruta_rechazos,
+                                                 al_progreso=self.senales.progreso.emit)
+        except Exception as e:
+            self.senales.fallo.emit(str(e))
+            return
+        self.senales.terminado.emit(resultado)
+
 class LoginDialog(QDialog):
     """Diálogo de login funcional"""
     
@@ -367,6 +4053,443 @@ class LoginDialog(QDialog):
         else:
             QMessageBox.critical(self, "Error", "Usuario o contraseña incorrectos")
 
+def conservar_scroll(vista):
+    """Mantener las filas visibles cuando el modelo inserta o quita filas más arriba"""
+    def desplazar(filas):
+        barra = vista.verticalScrollBar()
+        if vista.verticalScrollMode() == QAbstractItemView.ScrollPerPixel:
+            filas *= vista.verticalHeader().defaultSectionSize()
+        barra.setValue(barra.value() + filas)
+
+    def insertadas(parent, primera, ultima):
+        if vista.verticalScrollBar().value() > 0 and primera <= vista.rowAt(0):
+            desplazar(ultima - primera + 1)
+
+    def quitadas(parent, primera, ultima):
+        if vista.verticalScrollBar().value() > 0 and ultima < vista.rowAt(0):
+            desplazar(-(ultima - primera + 1))
+
+    vista.model().rowsInserted.connect(insertadas)
+    vista.model().rowsRemoved.connect(quitadas)
+
+def formato_monto(valor):
+    """Monto en pesos: $1,234,567"""
+    try:
+        return f"${valor:,.0f}"
+    except (TypeError, ValueError):
+        return str(valor) if valor is not None else ""
+
+def formato_fecha(valor):
+    """Fecha 'YYYY-MM-DD[ HH:MM:SS]' como dd/mm/aaaa"""
+    if not valor:
+        return ""
+    try:
+        return datetime.strptime(valor[:10], "%Y-%m-%d").strftime("%d/%m/%Y")
+    except (TypeError, ValueError):
+        return str(valor)
+
+class ActionButtonDelegate(QStyledItemDelegate):
+    """Delegado que pinta botones de acción en una celda y detecta clics.
+
+    Reemplaza los QWidget+QPushButton por fila (setCellWidget): los botones se
+    dibujan con el estilo de Qt y el clic se resuelve comparando la posición
+    del mouse con el rectángulo de cada botón.
+    """
+
+    accion = pyqtSignal(str, QModelIndex)
+
+    def __init__(self, botones, parent=None, ancho_boton=30, margen=4):
+        super().__init__(parent)
+        self.botones = botones          # [(clave, texto, tooltip)]
+        self.ancho_boton = ancho_boton
+        self.margen = margen
+        self._presionado = None         # (fila, columna, clave)
+        self._sobre = None              # (fila, columna, clave)
+
+    def rectangulos(self, rect):
+        """Rectángulo de cada botón dentro de la celda, centrados"""
+        total = len(self.botones) * self.ancho_boton + (len(self.botones) - 1) * self.margen
+        x = rect.x() + max(0, (rect.width() - total) // 2)
+        alto = max(0, rect.height() - 2 * self.margen)
+        y = rect.y() + self.margen
+        rects = []
+        for clave, texto, tooltip in self.botones:
+            rects.append((clave, texto, QRect(x, y, self.ancho_boton, alto)))
+            x += self.ancho_boton + self.margen
+        return rects
+
+    def boton_en(self, rect, pos):
+        for clave, texto, r in self.rectangulos(rect):
+            if r.contains(pos):
+                return clave
+        return None
+
+    def paint(self, painter, option, index):
+        # Fondo de la celda (selección, filas alternas) sin texto
+        fondo = QStyleOptionViewItem(option)
+        self.initStyleOption(fondo, index)
+        fondo.text = ""
+        estilo = option.widget.style() if option.widget else QApplication.style()
+        estilo.drawControl(QStyle.CE_ItemViewItem, fondo, painter, option.widget)
+
+        for clave, texto, r in self.rectangulos(option.rect):
+            boton = QStyleOptionButton()
+            boton.rect = r
+            boton.text = texto
+            boton.state = QStyle.State_Enabled
+            marca = (index.row(), index.column(), clave)
+            if self._presionado == marca:
+                boton.state |= QStyle.State_Sunken
+            else:
+                boton.state |= QStyle.State_Raised
+            if self._sobre == marca:
+                boton.state |= QStyle.State_MouseOver
+            estilo.drawControl(QStyle.CE_PushButton, boton, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        ancho = len(self.botones) * (self.ancho_boton + self.margen) + self.margen
+        return QSize(ancho, 28)
+
+    def editorEvent(self, event, model, option, index):
+        tipo = event.type()
+        if tipo not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease,
+                        QEvent.MouseMove, QEvent.MouseButtonDblClick):
+            return False
+
+        clave = self.boton_en(option.rect, event.pos())
+        marca = (index.row(), index.column(), clave) if clave else None
+
+        if tipo == QEvent.MouseMove:
+            if marca != self._sobre:
+                self._sobre = marca
+                self._repintar(option)
+            return False
+
+        if tipo == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+            self._presionado = marca
+            self._repintar(option)
+            return marca is not None
+
+        if tipo == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            presionado, self._presionado = self._presionado, None
+            self._repintar(option)
+            if marca is not None and marca == presionado:
+                self.accion.emit(clave, index)
+                return True
+            return False
+
+        # Doble clic sobre un botón: no abrir edición ni propagar
+        return marca is not None
+
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.ToolTip:
+            clave = self.boton_en(option.rect, event.pos())
+            for c, texto, tooltip in self.botones:
+                if c == clave:
+                    QToolTip.showText(event.globalPos(), tooltip, view)
+                    return True
+        return super().helpEvent(event, view, option, index)
+
+    def _repintar(self, option):
+        if option.widget is not None:
+            option.widget.viewport().update(option.rect)
+
+class PagedTableModel(QAbstractTableModel):
+    """Modelo de tabla que pagina filas desde SQLite bajo demanda.
+
+    Solo guarda la lista de ids en orden; los registros viven en un caché
+    LRU de tamaño fijo y se formatean recién en data(). Las páginas
+    (keyset, ver DatabaseManager.paginar) y las filas expulsadas del caché se
+    piden al ejecutor en segundo plano.
+    """
+
+    pagina_cargada = pyqtSignal()
+    conteo_cambiado = pyqtSignal()
+
+    def __init__(self, db_manager, listado, columnas, filtros=None,
+                 tamaño_pagina=200, max_filas=2000, propietario=None, parent=None):
+        super().__init__(parent)
+        self.db = db_manager
+        self.listado = listado
+        self.filtros = dict(filtros or {})
+        self.columnas = columnas        # [(titulo, campo del registro | None, formato)]
+        self.tamaño_pagina = tamaño_pagina
+        self.max_filas = max(max_filas, tamaño_pagina * 2)
+        self.propietario = propietario
+        self.al_cancelar = None
+
+        self._ids = []
+        self._claves = []               # (fecha_creacion, id) de cada id, para ubicar inserciones
+        self._filas = OrderedDict()     # id -> registro
+        self._registro = LISTADOS[listado]['registro']
+        self._pendientes = set()
+        self._fin = False
+        self._cargando = False
+        self._generacion = 0
+        self._cursor = None
+        self.total_estimado = None
+
+        # Aplicar inserciones/eliminaciones publicadas por la capa de datos
+        self.db.notificador.cambios.connect(self.aplicar_cambios)
+
+    # --- API Qt ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columnas)
+
+    def headerData(self, seccion, orientacion, rol=Qt.DisplayRole):
+        if rol == Qt.DisplayRole and orientacion == Qt.Horizontal:
+            return self.columnas[seccion][0]
+        return None
+
+    def data(self, index, rol=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if rol == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if rol != Qt.DisplayRole:
+            return None
+
+        titulo, campo, formato = self.columnas[index.column()]
+        if campo is None:
+            return formato(None) if formato else None
+
+        fila = self.fila(index.row())
+        if fila is None:
+            return "…"
+        valor = getattr(fila, campo)
+        return formato(valor) if formato else ("" if valor is None else str(valor))
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._fin and not self._cargando
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._fin or self._cargando:
+            return
+        self._cargando = True
+        generacion = self._generacion
+        cursor, filtros = self._cursor, dict(self.filtros)
+        clave = ('pagina', self.listado, cursor, tuple(sorted(filtros.items())), self.tamaño_pagina)
+        self.db.ejecutor.consultar(
+            clave,
+            lambda conn: self.db.paginar(self.listado, cursor, self.tamaño_pagina, filtros, conn),
+            lambda pagina: self._agregar_pagina(generacion, pagina),
+            al_cancelar=self._pagina_cancelada,
+            propietario=self.propietario)
+
+    # --- Acceso a filas ---
+    def fila(self, row):
+        """Registro en caché (o None y se solicita en segundo plano)"""
+        id_fila = self._ids[row]
+        fila = self._filas.get(id_fila)
+        if fila is not None:
+            self._filas.move_to_end(id_fila)
+            return fila
+        self._solicitar_filas(row)
+        return self._filas.get(id_fila)
+
+    def fila_sincrona(self, row):
+        """Registro de la fila, leyéndolo de inmediato si no está en caché"""
+        if row < 0 or row >= len(self._ids):
+            return None
+        id_fila = self._ids[row]
+        fila = self._filas.get(id_fila)
+        if fila is None:
+            with self.db.conexion() as conn:
+                filas = conn.execute(sql_por_ids(self.listado), (json.dumps([id_fila]),)).fetchall()
+            self._guardar(self._registro.desde_filas(filas))
+            fila = self._filas.get(id_fila)
+        return fila
+
+    def id_en_fila(self, row):
+        return self._ids[row] if 0 <= row < len(self._ids) else None
+
+    def filas_en_memoria(self):
+        return len(self._filas)
+
+    def recargar(self):
+        """Descartar todo y volver a pedir la primera página"""
+        self.beginResetModel()
+        self._generacion += 1
+        self._ids = []
+        self._claves = []
+        self._filas.clear()
+        self._pendientes.clear()
+        self._fin = False
+        self._cargando = False
+        self._cursor = None
+        self.total_estimado = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_filtros(self, filtros):
+        """Cambiar los filtros por igualdad y recargar desde la primera página"""
+        self.filtros = {k: v for k, v in filtros.items() if v not in (None, "")}
+        self.recargar()
+
+    def texto_conteo(self):
+        """Texto 'Mostrando N de ~Total' para la barra del módulo"""
+        cargadas = len(self._ids)
+        if self._fin:
+            return f"Mostrando {cargadas:,} registros"
+        if self.total_estimado:
+            return f"Mostrando {cargadas:,} de ~{max(self.total_estimado, cargadas):,}"
+        return f"Mostrando {cargadas:,} (desplace para cargar más)"
+
+    # --- Internos ---
+    def _guardar(self, filas):
+        for fila in filas:
+            self._filas[fila.id] = fila
+            self._filas.move_to_end(fila.id)
+        while len(self._filas) > self.max_filas:
+            self._filas.popitem(last=False)
+
+    def _agregar_pagina(self, generacion, pagina):
+        if generacion != self._generacion:
+            return
+        self._cargando = False
+        self._cursor = pagina.cursor
+        self._fin = not pagina.hay_mas
+        if pagina.total_estimado is not None:
+            self.total_estimado = pagina.total_estimado
+        filas = pagina.filas
+        if filas:
+            inicio = len(self._ids)
+            self.beginInsertRows(QModelIndex(), inicio, inicio + len(filas) - 1)
+            self._ids.extend(fila.id for fila in filas)
+            self._claves.extend(self._clave_orden(fila) for fila in filas)
+            self._guardar(filas)
+            self.endInsertRows()
+        self.pagina_cargada.emit()
+        self.conteo_cambiado.emit()
+
+    def aplicar_cambios(self, cambios):
+        """Aplicar cambios de fila sin recargar: trabajo de interfaz O(1) por cambio"""
+        tabla = LISTADOS[self.listado]['tabla']
+        aplicados = False
+        for cambio in cambios:
+            if cambio.tabla != tabla:
+                continue
+            if cambio.op == 'reload':
+                self.recargar()
+                return
+            if cambio.op == 'insert':
+                self._insertar(cambio.fila)
+            elif cambio.op == 'update':
+                self._actualizar(cambio.id, cambio.fila)
+            elif cambio.op == 'delete':
+                self._quitar(cambio.id)
+            aplicados = True
+        if aplicados:
+            self.conteo_cambiado.emit()
+
+    def _cumple_filtros(self, fila):
+        return all(getattr(fila, c) == v for c, v in self.filtros.items())
+
+    @staticmethod
+    def _clave_orden(fila):
+        return (fila.fecha_creacion or "", fila.id)
+
+    def _posicion_insercion(self, clave):
+        """Primera fila cargada que va después de 'clave' (orden descendente).
+
+        Compara con las claves guardadas de cada id: no lee filas expulsadas
+        del caché, así que no toca SQLite desde el hilo de la interfaz.
+        """
+        bajo, alto = 0, len(self._claves)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._claves[medio] > clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
+
+    def _insertar(self, fila):
+        if fila is None or not self._cumple_filtros(fila):
+            return
+        if not self._ids and self._cargando:
+            return      # La primera página en curso ya la incluirá
+        clave = self._clave_orden(fila)
+        posicion = self._posicion_insercion(clave)
+        if posicion < len(self._claves) and self._claves[posicion] == clave:
+            return      # Ya está cargada
+        if posicion == len(self._ids) and not self._fin:
+            return      # Cae en una zona aún no cargada; llegará con su página
+        self.beginInsertRows(QModelIndex(), posicion, posicion)
+        self._ids.insert(posicion, fila.id)
+        self._claves.insert(posicion, clave)
+        self._guardar([fila])
+        self.endInsertRows()
+        if self.total_estimado is not None:
+            self.total_estimado += 1
+
+    def _quitar(self, id_fila):
+        """Quitar una fila cargada; las no cargadas (o de otro filtro) no cambian el conteo"""
+        self._filas.pop(id_fila, None)
+        try:
+            posicion = self._ids.index(id_fila)
+        except ValueError:
+            return
+        self.beginRemoveRows(QModelIndex(), posicion, posicion)
+        del self._ids[posicion]
+        del self._claves[posicion]
+        self.endRemoveRows()
+        if self.total_estimado:
+            self.total_estimado -= 1
+
+    def _actualizar(self, id_fila, fila):
+        try:
+            posicion = self._ids.index(id_fila)
+        except ValueError:
+            self._insertar(fila)
+            return
+        if fila is None or not self._cumple_filtros(fila):
+            self._quitar(id_fila)
+            return
+        if self._claves[posicion] != self._clave_orden(fila):
+            # Cambió su lugar en el orden: reubicarla
+            self._quitar(id_fila)
+            self._insertar(fila)
+            return
+        self._guardar([fila])
+        self.dataChanged.emit(self.index(posicion, 0),
+                              self.index(posicion, len(self.columnas) - 1))
+
+    def _pagina_cancelada(self):
+        self._cargando = False
+        if self.al_cancelar:
+            self.al_cancelar()
+
+    def _solicitar_filas(self, row):
+        """Pedir en lote las filas faltantes alrededor de 'row'"""
+        inicio = max(0, row - self.tamaño_pagina // 4)
+        fin = min(len(self._ids), inicio + self.tamaño_pagina)
+        faltantes = [i for i in self._ids[inicio:fin]
+                     if i not in self._filas and i not in self._pendientes]
+        if not faltantes:
+            return
+        self._pendientes.update(faltantes)
+        generacion = self._generacion
+
+        def recibir(filas):
+            self._pendientes.difference_update(faltantes)
+            if generacion != self._generacion:
+                return
+            self._guardar(filas)
+            self.dataChanged.emit(self.index(inicio, 0),
+                                  self.index(fin - 1, len(self.columnas) - 1))
+
+        sql, registro = sql_por_ids(self.listado), self._registro
+        self.db.ejecutor.consultar(
+            ('ids', self.listado, tuple(faltantes)),
+            lambda conn: registro.desde_filas(conn.execute(sql, (json.dumps(faltantes),)).fetchall()),
+            recibir,
+            al_cancelar=lambda: self._pendientes.difference_update(faltantes),
+            propietario=self.propietario)
+
 class PresupuestosModule(QWidget):
     """Módulo de presupuestos completamente funcional"""
     
@@ -410,18 +4533,35 @@ class PresupuestosModule(QWidget):
         header_layout.addWidget(nuevo_btn)
         header.setLayout(header_layout)
         
-        # Tabla de presupuestos
-        self.tabla_presupuestos = QTableWidget()
-        self.tabla_presupuestos.setColumnCount(7)
-        self.tabla_presupuestos.setHorizontalHeaderLabels([
-            "N° Presupuesto", "Cliente", "Proyecto", "Monto Total", "Estado", "Fecha Creación", "Acciones"
-        ])
+        # Tabla de presupuestos (modelo paginado desde la base de datos)
+        self.modelo = PagedTableModel(
+            self.db, 'presupuestos',
+            [
+                ("N° Presupuesto", 'numero_presupuesto', None),
+                ("Cliente", 'cliente', None),
+                ("Proyecto", 'proyecto', None),
+                ("Monto Total", 'monto_total', formato_monto),
+                ("Estado", 'estado', None),
+                ("Fecha Creación", 'fecha_creacion', formato_fecha),
+                ("Acciones", None, None),
+            ],
+            propietario=self, parent=self)
+        self.modelo.al_cancelar = self._marcar_recarga
+        
+        self.tabla_presupuestos = QTableView()
+        self.tabla_presupuestos.setModel(self.modelo)
+        self.tabla_presupuestos.setMouseTracking(True)
+        
+        self.acciones_delegate = ActionButtonDelegate(
+            [("ver", "👁️", "Ver detalles")], self.tabla_presupuestos)
+        self.acciones_delegate.accion.connect(self._accion_tabla)
+        self.tabla_presupuestos.setItemDelegateForColumn(6, self.acciones_delegate)
         
         # Configurar tabla
         self.tabla_presupuestos.setAlternatingRowColors(True)
-        self.tabla_presupuestos.setSelectionBehavior(QTableWidget.SelectRows)
-        header = self.tabla_presupuestos.horizontalHeader()
-        header.setStretchLastSection(True)
+        self.tabla_presupuestos.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabla_presupuestos.verticalHeader().setDefaultSectionSize(28)
+        self.tabla_presupuestos.horizontalHeader().setStretchLastSection(True)
         
         # Botones de acción
         acciones_layout = QHBoxLayout()
@@ -435,10 +4575,29 @@ class PresupuestosModule(QWidget):
         exportar_btn = QPushButton("📤 Exportar")
         exportar_btn.clicked.connect(self.exportar_presupuestos)
         
+        importar_btn = QPushButton("📥 Importar")
+        importar_btn.clicked.connect(self.importar_presupuestos)
+        
+        # Filtro por estado (también lo respeta la exportación)
+        self.estado_combo = QComboBox()
+        self.estado_combo.addItems(["Todos", "Borrador", "En Revisión", "Pendiente",
+                                    "Aprobado", "Rechazado"])
+        self.estado_combo.currentTextChanged.connect(self.filtrar_estado)
+        
+        self.conteo_label = QLabel("")
+        self.conteo_label.setStyleSheet("color: #6b7280;")
+        self.modelo.conteo_cambiado.connect(
+            lambda: self.conteo_label.setText(self.modelo.texto_conteo()))
+        conservar_scroll(self.tabla_presupuestos)
+        
         acciones_layout.addWidget(editar_btn)
         acciones_layout.addWidget(eliminar_btn)
         acciones_layout.addWidget(exportar_btn)
+        acciones_layout.addWidget(importar_btn)
         acciones_layout.addStretch()
+        acciones_layout.addWidget(QLabel("Estado:"))
+        acciones_layout.addWidget(self.estado_combo)
+        acciones_layout.addWidget(self.conteo_label)
         
         layout.addWidget(header)
         layout.addWidget(self.tabla_presupuestos)
@@ -447,119 +4606,198 @@ class PresupuestosModule(QWidget):
         self.setLayout(layout)
         
     def load_presupuestos(self):
-        """Cargar presupuestos desde la base de datos"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT numero_presupuesto, cliente, proyecto, monto_total, estado, fecha_creacion
-            FROM presupuestos
-            ORDER BY fecha_creacion DESC
-        """)
-        
-        presupuestos = cursor.fetchall()
-        conn.close()
-        
-        self.tabla_presupuestos.setRowCount(len(presupuestos))
-        
-        for row, presupuesto in enumerate(presupuestos):
-            for col, valor in enumerate(presupuesto):
-                if col == 3:  # Monto total
-                    item = QTableWidgetItem(f"${valor:,.0f}")
-                elif col == 5:  # Fecha
-                    fecha = datetime.strptime(valor, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y")
-                    item = QTableWidgetItem(fecha)
-                else:
-                    item = QTableWidgetItem(str(valor))
-                
-                item.setTextAlignment(Qt.AlignCenter)
-                self.tabla_presupuestos.setItem(row, col, item)
-            
-            # Botón de acciones
-            acciones_widget = QWidget()
-            acciones_layout = QHBoxLayout()
-            acciones_layout.setContentsMargins(5, 2, 5, 2)
-            
-            ver_btn = QPushButton("👁️")
-            ver_btn.setMaximumWidth(30)
-            ver_btn.setToolTip("Ver detalles")
-            ver_btn.clicked.connect(lambda checked, r=row: self.ver_detalle_presupuesto(r))
-            
-            acciones_layout.addWidget(ver_btn)
-            acciones_widget.setLayout(acciones_layout)
-            
-            self.tabla_presupuestos.setCellWidget(row, 6, acciones_widget)
+        """Cargar presupuestos desde la base de datos (por páginas, en segundo plano)"""
+        self._recargar_al_mostrar = False
+        self.modelo.recargar()
+
+    def _marcar_recarga(self):
+        """La carga se canceló al cambiar de módulo: repetirla al volver"""
+        self._recargar_al_mostrar = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if getattr(self, '_recargar_al_mostrar', False):
+            self.load_presupuestos()
+
+    def _accion_tabla(self, accion, index):
+        """Botones pintados en la columna de acciones"""
+        if accion == "ver":
+            self.ver_detalle_presupuesto(index.row())
+
+    def numero_en_fila(self, row):
+        """Número de presupuesto de una fila del modelo"""
+        fila = self.modelo.fila_sincrona(row)
+        return fila.numero_presupuesto if fila else None
     
     def nuevo_presupuesto(self):
         """Crear nuevo presupuesto"""
         dialog = NuevoPresupuestoDialog(self.db, self.user_data)
         if dialog.exec_() == QDialog.Accepted:
-            self.load_presupuestos()
             QMessageBox.information(self, "Éxito", "Presupuesto creado correctamente")
     
     def editar_presupuesto(self):
         """Editar presupuesto seleccionado"""
-        current_row = self.tabla_presupuestos.currentRow()
+        current_row = self.tabla_presupuestos.currentIndex().row()
         if current_row >= 0:
-            numero_presupuesto = self.tabla_presupuestos.item(current_row, 0).text()
+            numero_presupuesto = self.numero_en_fila(current_row)
             QMessageBox.information(self, "Editar Presupuesto", 
                                   f"Función de edición para presupuesto {numero_presupuesto} disponible")
         else:
             QMessageBox.warning(self, "Sin Selección", "Seleccione un presupuesto para editar")
     
     def eliminar_presupuesto(self):
-        """Eliminar presupuesto seleccionado"""
-        current_row = self.tabla_presupuestos.currentRow()
-        if current_row >= 0:
-            numero_presupuesto = self.tabla_presupuestos.item(current_row, 0).text()
-            
+        """Eliminar los presupuestos seleccionados"""
+        filas = sorted({i.row() for i in self.tabla_presupuestos.selectionModel().selectedRows()})
+        if not filas and self.tabla_presupuestos.currentIndex().row() >= 0:
+            filas = [self.tabla_presupuestos.currentIndex().row()]
+        numeros = [n for n in (self.numero_en_fila(f) for f in filas) if n]
+        if numeros:
+            descripcion = (f"el presupuesto {numeros[0]}" if len(numeros) == 1
+                           else f"{len(numeros)} presupuestos")
             reply = QMessageBox.question(self, "Confirmar Eliminación",
-                                       f"¿Está seguro de eliminar el presupuesto {numero_presupuesto}?",
+                                       f"¿Está seguro de eliminar {descripcion}?",
                                        QMessageBox.Yes | QMessageBox.No)
             
             if reply == QMessageBox.Yes:
-                conn = self.db.get_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute("DELETE FROM presupuestos WHERE numero_presupuesto = ?", (numero_presupuesto,))
-                conn.commit()
-                conn.close()
-                
-                self.load_presupuestos()
-                QMessageBox.information(self, "Eliminado", "Presupuesto eliminado correctamente")
+                # La tabla se actualiza sola con el cambio publicado por la capa de datos
+                eliminados = self.db.eliminar_presupuestos(numeros)
+                QMessageBox.information(self, "Eliminado",
+                                        "Presupuesto eliminado correctamente" if eliminados == 1
+                                        else f"{eliminados} presupuestos eliminados correctamente")
         else:
             QMessageBox.warning(self, "Sin Selección", "Seleccione un presupuesto para eliminar")
     
-    def exportar_presupuestos(self):
-        """Exportar presupuestos"""
-        QMessageBox.information(self, "Exportar", "Función de exportación a Excel disponible")
+    def filtrar_estado(self, estado):
+        """Mostrar solo los presupuestos del estado elegido"""
+        self.modelo.set_filtros({'estado': None if estado == "Todos" else estado})
     
-    def ver_detalle_presupuesto(self, row):
-        """Ver detalle de presupuesto"""
-        numero_presupuesto = self.tabla_presupuestos.item(row, 0).text()
+    def exportar_presupuestos(self):
+        """Exportar a Excel (o CSV) los presupuestos del filtro actual (en segundo plano)"""
+        if getattr(self, '_exportacion', None) is not None:
+            return
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+        # Sin xlsxwriter solo se ofrece CSV
+        extension = ".xlsx" if xlsxwriter is not None else ".csv"
+        tipos = "Excel (*.xlsx);;CSV (*.csv)" if xlsxwriter is not None else "CSV (*.csv)"
+        nombre = f"presupuestos_{datetime.now().strftime('%Y%m%d_%H%M')}{extension}"
+        ruta, _ = QFileDialog.getSaveFileName(self, "Exportar presupuestos", nombre, tipos)
+        if not ruta:
+            return
+        
+        columnas = EXPORTACIONES['presupuestos']
+        if ruta.lower().endswith(".csv"):
+            crear_escritor = lambda r: EscritorCsv(r, [titulo for _, titulo, _ in columnas])
+        else:
+            crear_escritor = lambda r: EscritorXlsx(r, columnas, "Presupuestos")
+        tarea = ExportTask(self.db, 'presupuestos', self.modelo.filtros, ruta, crear_escritor)
+        self._iniciar_exportacion(tarea)
+    
+    def _iniciar_exportacion(self, tarea):
+        """Correr una exportación mostrando su avance, con opción de cancelar"""
+        progreso = QProgressDialog("Exportando presupuestos...", "Cancelar", 0, 0, self)
+        progreso.setWindowTitle("Exportar")
+        progreso.setWindowModality(Qt.WindowModal)
+        progreso.setMinimumDuration(300)
+        progreso.setAutoClose(False)
+        progreso.setAutoReset(False)
+        progreso.canceled.connect(tarea.cancelar)
+        
+        def avanzar(escritas, total):
+            progreso.setMaximum(total)
+            progreso.setValue(escritas)
+            progreso.setLabelText(f"Exportando presupuestos... {escritas:,} de {total:,}")
+        
+        def finalizar():
+            self._exportacion = None
+            progreso.close()
+            progreso.deleteLater()
+        
+        def terminado(ruta, filas):
+            finalizar()
+            QMessageBox.information(self, "Exportar", f"✅ {filas:,} presupuestos exportados a:\n{ruta}")
+        
+        def fallo(mensaje):
+            finalizar()
+            QMessageBox.critical(self, "Exportar", f"❌ Error exportando: {mensaje}")
+        
+        tarea.senales.progreso.connect(avanzar)
+        tarea.senales.terminado.connect(terminado)
+        tarea.senales.fallo.connect(fallo)
+        tarea.senales.cancelado.connect(finalizar)
+        self._exportacion = tarea
+        self.db.ejecutor.hilos.start(tarea)
+    
+    def importar_presupuestos(self):
+        """Carga masiva desde CSV/Excel: actualiza los números ya existentes y crea el resto"""
+        if getattr(self, '_importacion', None) is not None:
+            return
         
-        cursor.execute("""
-            SELECT * FROM presupuestos WHERE numero_presupuesto = ?
-        """, (numero_presupuesto,))
+        tipos = "Archivos de datos (*.csv *.xlsx *.ndjson *.gz);;CSV (*.csv);;Excel (*.xlsx)"
+        ruta, _ = QFileDialog.getOpenFileName(self, "Importar presupuestos", "", tipos)
+        if not ruta:
+            return
         
-        presupuesto = cursor.fetchone()
-        conn.close()
+        ruta_rechazos = os.path.splitext(ruta)[0] + "_rechazos.csv"
+        tarea = ImportTask(self.db, 'presupuestos', ruta, ruta_rechazos)
+        progreso = QProgressDialog("Importando presupuestos...", None, 0, 0, self)
+        progreso.setWindowTitle("Importar")
+        progreso.setWindowModality(Qt.WindowModal)
+        progreso.setMinimumDuration(300)
+        
+        def finalizar():
+            self._importacion = None
+            progreso.close()
+            progreso.deleteLater()
+        
+        def terminado(r):
+            finalizar()
+            mensaje = (f"✅ {r.leidas:,} filas leídas: {r.insertadas:,} nuevas, "
+                       f"{r.actualizadas:,} actualizadas")
+            if r.rechazadas:
+                motivos = "\n".join(f"• línea {linea}: {motivo}" for linea, motivo in r.rechazos[:10])
+                mensaje += (f"\n\n⚠️ {r.rechazadas:,} filas rechazadas (detalle en {ruta_rechazos}):"
+                            f"\n{motivos}")
+                QMessageBox.warning(self, "Importar", mensaje)
+            else:
+                try:
+                    os.remove(ruta_rechazos)
+                except OSError:
+                    pass
+                QMessageBox.information(self, "Importar", mensaje)
+        
+        def fallo(mensaje):
+            finalizar()
+            QMessageBox.critical(self, "Importar", f"❌ Error importando: {mensaje}")
+        
+        tarea.senales.progreso.connect(
+            lambda filas: progreso.setLabelText(f"Importando presupuestos... {filas:,} filas"))
+        tarea.senales.terminado.connect(terminado)
+        tarea.senales.fallo.connect(fallo)
+        self._importacion = tarea
+        self.db.ejecutor.hilos.start(tarea)
+    
+    def ver_detalle_presupuesto(self, row):
+        """Ver detalle de presupuesto"""
+        self.mostrar_presupuesto(self.numero_en_fila(row))
+    
+    def mostrar_presupuesto(self, numero_presupuesto):
+        """Detalle de un presupuesto por su número (también desde la búsqueda global)"""
+        filas = self.db.consultar(CONSULTAS['presupuestos_detalle'], (numero_presupuesto,),
+                                  registro=Presupuesto)
+        presupuesto = filas[0] if filas else None
         
         if presupuesto:
             detalle = f"""
 DETALLE DEL PRESUPUESTO
 ========================
 
-📋 Número: {presupuesto[1]}
-👤 Cliente: {presupuesto[2]}
-🏗️ Proyecto: {presupuesto[3]}
-📝 Descripción: {presupuesto[4]}
-💰 Monto Total: ${presupuesto[5]:,.0f}
-📊 Estado: {presupuesto[6]}
-📅 Fecha Creación: {presupuesto[7]}
+📋 Número: {presupuesto.numero_presupuesto}
+👤 Cliente: {presupuesto.cliente}
+🏗️ Proyecto: {presupuesto.proyecto}
+📝 Descripción: {presupuesto.descripcion}
+💰 Monto Total: ${presupuesto.monto_total:,.0f}
+📊 Estado: {presupuesto.estado}
+📅 Fecha Creación: {presupuesto.fecha_creacion}
             """
             
             QMessageBox.information(self, f"Presupuesto {numero_presupuesto}", detalle)
@@ -636,31 +4874,20 @@ class NuevoPresupuestoDialog(QDialog):
             QMessageBox.warning(self, "Error", "Complete los campos obligatorios")
             return
             
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute("""
-                INSERT INTO presupuestos (numero_presupuesto, cliente, proyecto, descripcion, 
-                                        monto_total, estado, usuario_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                self.numero_input.text(),
-                self.cliente_input.text(),
-                self.proyecto_input.text(),
-                self.descripcion_input.toPlainText(),
-                self.monto_input.value(),
-                self.estado_combo.currentText(),
-                self.user_data['id']
-            ))
-            
-            conn.commit()
-            conn.close()
+            self.db.crear_presupuesto({
+                'numero_presupuesto': self.numero_input.text(),
+                'cliente': self.cliente_input.text(),
+                'proyecto': self.proyecto_input.text(),
+                'descripcion': self.descripcion_input.toPlainText(),
+                'monto_total': self.monto_input.value(),
+                'estado': self.estado_combo.currentText(),
+                'usuario_id': self.user_data['id'],
+            })
             self.accept()
             
         except sqlite3.IntegrityError:
             QMessageBox.warning(self, "Error", "El número de presupuesto ya existe")
-            conn.close()
 
 # [Continuaré con los demás módulos funcionales...]
 
@@ -707,57 +4934,96 @@ class OrdenesCompraModule(QWidget):
         header_layout.addWidget(nueva_btn)
         header.setLayout(header_layout)
         
-        # Tabla de órdenes
-        self.tabla_ordenes = QTableWidget()
-        self.tabla_ordenes.setColumnCount(7)
-        self.tabla_ordenes.setHorizontalHeaderLabels([
-            "N° OC", "Proveedor", "Descripción", "Monto", "Estado", "Fecha Entrega", "Acciones"
-        ])
-        
+        # Tabla de órdenes (modelo paginado desde la base de datos)
+        self.modelo = PagedTableModel(
+            self.db, 'ordenes_compra',
+            [
+                ("N° OC", 'numero_oc', None),
+                ("Proveedor", 'proveedor', None),
+                ("Descripción", 'descripcion', None),
+                ("Monto", 'monto_total', formato_monto),
+                ("Estado", 'estado', None),
+                ("Fecha Entrega", 'fecha_entrega', formato_fecha),
+                ("Acciones", None, None),
+            ],
+            propietario=self, parent=self)
+        self.modelo.al_cancelar = self._marcar_recarga
+        
+        self.tabla_ordenes = QTableView()
+        self.tabla_ordenes.setModel(self.modelo)
         self.tabla_ordenes.setAlternatingRowColors(True)
-        self.tabla_ordenes.setSelectionBehavior(QTableWidget.SelectRows)
+        self.tabla_ordenes.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabla_ordenes.verticalHeader().setDefaultSectionSize(28)
+        self.tabla_ordenes.setMouseTracking(True)
+        
+        self.acciones_delegate = ActionButtonDelegate(
+            [("ver", "👁️", "Ver detalles")], self.tabla_ordenes)
+        self.acciones_delegate.accion.connect(self._accion_tabla)
+        self.tabla_ordenes.setItemDelegateForColumn(6, self.acciones_delegate)
+        
+        self.conteo_label = QLabel("")
+        self.conteo_label.setStyleSheet("color: #6b7280;")
+        self.modelo.conteo_cambiado.connect(
+            lambda: self.conteo_label.setText(self.modelo.texto_conteo()))
+        conservar_scroll(self.tabla_ordenes)
         
         layout.addWidget(header)
         layout.addWidget(self.tabla_ordenes)
+        layout.addWidget(self.conteo_label)
         
         self.setLayout(layout)
         
     def load_ordenes(self):
-        """Cargar órdenes de compra"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT numero_oc, proveedor, descripcion, monto_total, estado, fecha_entrega
-            FROM ordenes_compra
-            ORDER BY fecha_creacion DESC
-        """)
-        
-        ordenes = cursor.fetchall()
-        conn.close()
-        
-        self.tabla_ordenes.setRowCount(len(ordenes))
-        
-        for row, orden in enumerate(ordenes):
-            for col, valor in enumerate(orden):
-                if col == 3:  # Monto
-                    item = QTableWidgetItem(f"${valor:,.0f}")
-                elif col == 5 and valor:  # Fecha entrega
-                    try:
-                        fecha = datetime.strptime(valor, "%Y-%m-%d").strftime("%d/%m/%Y")
-                        item = QTableWidgetItem(fecha)
-                    except:
-                        item = QTableWidgetItem(str(valor) if valor else "Sin fecha")
-                else:
-                    item = QTableWidgetItem(str(valor) if valor else "")
-                
-                item.setTextAlignment(Qt.AlignCenter)
-                self.tabla_ordenes.setItem(row, col, item)
+        """Cargar órdenes de compra (por páginas, en segundo plano)"""
+        self._recargar_al_mostrar = False
+        self.modelo.recargar()
+
+    def _marcar_recarga(self):
+        """La carga se canceló al cambiar de módulo: repetirla al volver"""
+        self._recargar_al_mostrar = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if getattr(self, '_recargar_al_mostrar', False):
+            self.load_ordenes()
                 
     def nueva_orden(self):
         """Crear nueva orden de compra"""
         QMessageBox.information(self, "Nueva Orden", "Función para crear nueva orden de compra disponible")
 
+    def _accion_tabla(self, accion, index):
+        """Botones pintados en la columna de acciones"""
+        if accion == "ver":
+            self.ver_detalle_orden(index.row())
+
+    def ver_detalle_orden(self, row):
+        """Ver detalle de orden de compra"""
+        fila = self.modelo.fila_sincrona(row)
+        if fila is None:
+            return
+        self.mostrar_orden(fila.numero_oc)
+    
+    def mostrar_orden(self, numero_oc):
+        """Detalle de una orden por su número (también desde la búsqueda global)"""
+        filas = self.db.consultar(CONSULTAS['ordenes_detalle'], (numero_oc,), registro=OrdenCompra)
+        orden = filas[0] if filas else None
+        
+        if orden:
+            detalle = f"""
+DETALLE DE LA ORDEN DE COMPRA
+==============================
+
+📋 Número: {orden.numero_oc}
+🏭 Proveedor: {orden.proveedor}
+📝 Descripción: {orden.descripcion}
+💰 Monto Total: ${orden.monto_total:,.0f}
+📊 Estado: {orden.estado}
+📅 Fecha Creación: {orden.fecha_creacion}
+🚚 Fecha Entrega: {orden.fecha_entrega or 'Sin fecha'}
+            """
+            
+            QMessageBox.information(self, f"Orden {numero_oc}", detalle)
+
 # Módulos adicionales (similares pero simplificados para el ejemplo)
 
 class DashboardModule(QWidget):
@@ -767,9 +5033,18 @@ class DashboardModule(QWidget):
         super().__init__()
         self.db = db_manager
         self.user_data = user_data
+        self._metricas = {}
+        self._generaciones = {}
+        self._revisando = False
         self.init_ui()
         self.update_metrics()
         
+        # Refresco automático: sondea las generaciones de las tablas y solo
+        # recalcula las métricas cuyas tablas cambiaron
+        self.timer_refresco = QTimer(self)
+        self.timer_refresco.timeout.connect(self.revisar_cambios)
+        self.timer_refresco.start(self._intervalo_refresco())
+        
     def init_ui(self):
         layout = QVBoxLayout()
         
@@ -817,6 +5092,14 @@ class DashboardModule(QWidget):
         self.vehiculos_widget = vehiculos_widget
         self.resumen_text = resumen
         
+        # Tarjeta de cada tabla de métricas
+        self.tarjetas = {
+            'presupuestos': presupuestos_widget.value_label,
+            'ordenes_compra': ordenes_widget.value_label,
+            'empleados': empleados_widget.value_label,
+            'vehiculos': vehiculos_widget.value_label,
+        }
+        
     def create_metric_widget(self, icon, title, value, color):
         """Crear widget de métrica"""
         widget = QFrame()
@@ -849,32 +5132,93 @@ class DashboardModule(QWidget):
         layout.addWidget(title_label)
         
         widget.setLayout(layout)
+        widget.value_label = value_label
         return widget
         
-    def update_metrics(self):
-        """Actualizar métricas desde la base de datos"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        # Contar presupuestos
-        cursor.execute("SELECT COUNT(*) FROM presupuestos")
-        presupuestos_count = cursor.fetchone()[0]
-        
-        # Contar órdenes de compra
-        cursor.execute("SELECT COUNT(*) FROM ordenes_compra")
-        ordenes_count = cursor.fetchone()[0]
-        
-        # Contar empleados
-        cursor.execute("SELECT COUNT(*) FROM empleados WHERE estado = 'Activo'")
-        empleados_count = cursor.fetchone()[0]
-        
-        # Contar vehículos
-        cursor.execute("SELECT COUNT(*) FROM vehiculos")
-        vehiculos_count = cursor.fetchone()[0]
-        
-        conn.close()
+    def update_metrics(self, tablas=None):
+        """Actualizar métricas desde la base de datos (en segundo plano).
+
+        'tablas' limita el recálculo a las métricas de esas tablas.
+        """
+        self._recargar_al_mostrar = False
+        tablas = tuple(sorted(tablas)) if tablas else None
+        self.db.ejecutor.consultar(('dashboard_metricas', tablas),
+                                   lambda conn: self.contar_metricas(conn, tablas),
+                                   self.mostrar_metricas,
+                                   al_cancelar=self._marcar_recarga,
+                                   propietario=self)
+
+    def _intervalo_refresco(self):
+        """Intervalo del sondeo en ms: más lento si el dashboard no está a la vista"""
+        config = self.db.config
+        visible = self.isVisible() and not self.window().isMinimized()
+        segundos = config.get('dashboard_refresco_seg', 5) if visible else \
+            config.get('dashboard_refresco_oculto_seg', 60)
+        return max(1, int(segundos * 1000))
+
+    def revisar_cambios(self):
+        """Comparar las generaciones de las tablas con las de la última lectura"""
+        intervalo = self._intervalo_refresco()
+        if self.timer_refresco.interval() != intervalo:
+            self.timer_refresco.setInterval(intervalo)
+        if self._revisando:
+            return
+        self._revisando = True
+        self.db.ejecutor.consultar('dashboard_generaciones',
+                                   lambda conn: self.db.generaciones(),
+                                   self._aplicar_generaciones,
+                                   al_fallar=self._fin_revision,
+                                   al_cancelar=self._fin_revision,
+                                   propietario=self)
+
+    def _fin_revision(self, *args):
+        self._revisando = False
+
+    def _aplicar_generaciones(self, generaciones):
+        self._revisando = False
+        cambiadas = [t for t in METRICAS if generaciones.get(t) != self._generaciones.get(t)]
+        if cambiadas:
+            self.update_metrics(cambiadas)
+
+    def _marcar_recarga(self):
+        """La carga se canceló al cambiar de módulo: repetirla al volver"""
+        self._recargar_al_mostrar = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if getattr(self, '_recargar_al_mostrar', False):
+            self.update_metrics()
+        elif hasattr(self, 'timer_refresco'):
+            self.revisar_cambios()
+
+    def contar_metricas(self, conn, tablas=None):
+        """Leer los contadores de 'metricas' (se ejecuta en un hilo del ejecutor).
+
+        Las generaciones se leen antes que los contadores: si hay una escritura
+        entre ambas lecturas, el siguiente sondeo la detecta.
+        """
+        generaciones = self.db.generaciones()
+        return generaciones, self.db.leer_metricas(conn, tablas)
+
+    @staticmethod
+    def valor_tarjeta(tabla, metrica):
+        """Número que muestra la tarjeta de una tabla"""
+        if tabla == 'empleados':
+            return metrica['por_estado'].get('Activo', (0, 0))[0]
+        return metrica['cantidad']
+
+    def mostrar_metricas(self, resultado):
+        """Mostrar las métricas calculadas; solo se tocan las tarjetas que cambiaron"""
+        generaciones, metricas = resultado
+        for tabla, metrica in metricas.items():
+            self._generaciones[tabla] = generaciones.get(tabla)
+            self._metricas[tabla] = metrica
+            self.tarjetas[tabla].setText(f"{self.valor_tarjeta(tabla, metrica):,}")
+        
+        presupuestos_count, ordenes_count, empleados_count, vehiculos_count = (
+            self.valor_tarjeta(t, self._metricas[t]) if t in self._metricas else 0
+            for t in ('presupuestos', 'ordenes_compra', 'empleados', 'vehiculos'))
         
-        # Actualizar widgets (necesitaríamos modificar los widgets para actualizar)
         resumen_text = f"""
 📊 RESUMEN DEL SISTEMA JURMAQ
 
@@ -896,13 +5240,206 @@ class DashboardModule(QWidget):
         
         self.resumen_text.setText(resumen_text)
 
+class DiagnosticoDialog(QDialog):
+    """Estadísticas de consultas SQL, del pool de conexiones y del caché"""
+
+    COLUMNAS = ["Consulta", "Llamadas", "p50 ms", "p95 ms", "p99 ms", "Máx ms",
+                "Total ms", "Filas prom.", "Origen"]
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db = db_manager
+        self.setWindowTitle("🩺 Diagnóstico de base de datos")
+        self.resize(1100, 600)
+        self.init_ui()
+        self.actualizar()
+        
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.actualizar)
+        self.timer.start(2000)
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        
+        self.resumen_label = QLabel("")
+        self.resumen_label.setStyleSheet("color: #374151; padding: 5px;")
+        
+        self.tabla = QTableWidget()
+        self.tabla.setColumnCount(len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabla.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabla.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        
+        botones = QHBoxLayout()
+        actualizar_btn = QPushButton("🔄 Actualizar")
+        actualizar_btn.clicked.connect(self.actualizar)
+        reiniciar_btn = QPushButton("🧹 Reiniciar contadores")
+        reiniciar_btn.clicked.connect(self.reiniciar)
+        cerrar_btn = QPushButton("Cerrar")
+        cerrar_btn.clicked.connect(self.accept)
+        botones.addWidget(actualizar_btn)
+        botones.addWidget(reiniciar_btn)
+        botones.addStretch()
+        botones.addWidget(cerrar_btn)
+        
+        layout.addWidget(self.resumen_label)
+        layout.addWidget(self.tabla)
+        layout.addLayout(botones)
+        self.setLayout(layout)
+
+    def actualizar(self):
+        pool = self.db.estadisticas_pool()
+        cache = self.db.cache.resumen()
+        umbral = self.db.config.get('sql_lenta_ms', 200)
+        self.resumen_label.setText(
+            f"Pool: {pool['abiertas']}/{pool['max_conexiones']} abiertas, {pool['libres']} libres, "
+            f"{pool['reutilizaciones']:,} reutilizaciones, {pool['esperas']} esperas   |   "
+            f"Caché: {cache['entradas']} entradas, {cache['bytes'] / 1024:,.0f} KB, "
+            f"aciertos {cache['tasa_aciertos'] * 100:.0f}%   |   "
+            f"Log de lentas: > {umbral} ms")
+        escritor = DatabaseManager._escritores.get(self.db.destino)
+        if escritor is not None:
+            datos = escritor.resumen()
+            self.resumen_label.setText(
+                self.resumen_label.text() +
+                f"   |   Escritor: {datos['comandos']:,} comandos, {datos['fallidos']} fallidos, "
+                f"{datos['pendientes']} en cola, {datos['reconexiones']} reconexiones")
+        
+        if self.db.estadisticas_sql is None:
+            self.tabla.setRowCount(0)
+            self.resumen_label.setText(self.resumen_label.text() + "   |   Instrumentación desactivada")
+            return
+        
+        filas = self.db.estadisticas_sql.resumen()
+        self.tabla.setRowCount(len(filas))
+        for row, fila in enumerate(filas):
+            valores = [fila['sql'], f"{fila['llamadas']:,}", f"{fila['p50_ms']:.2f}",
+                       f"{fila['p95_ms']:.2f}", f"{fila['p99_ms']:.2f}", f"{fila['max_ms']:.2f}",
+                       f"{fila['total_ms']:,.1f}", f"{fila['filas_promedio']:,.1f}",
+                       ", ".join(fila['origenes'])]
+            for col, valor in enumerate(valores):
+                item = QTableWidgetItem(valor)
+                if col == 0:
+                    item.setToolTip(fila['sql'])
+                elif col < 8:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                if col in (2, 3, 4) and float(valor.replace(",", "")) >= umbral:
+                    item.setForeground(QColor("#dc2626"))
+                self.tabla.setItem(row, col, item)
+
+    def reiniciar(self):
+        if self.db.estadisticas_sql is not None:
+            self.db.estadisticas_sql.reiniciar()
+        self.actualizar()
+
+class ModuleRegistry:
+    """Registro de módulos que se crean la primera vez que se navega a ellos.
+
+    Cada módulo se registra con una fábrica. Los módulos 'pesados' (los que
+    consultan la base de datos) pueden descargarse cuando llevan tiempo sin
+    usarse y hay presión de memoria; se vuelven a crear al navegar a ellos.
+    """
+
+    def __init__(self, contenedor, db_manager, config=None):
+        self.contenedor = contenedor     # QStackedWidget
+        self.db = db_manager
+        self.config = config or {}
+        self._modulos = OrderedDict()    # nombre -> dict(fabrica, pesado, widget, ultimo_uso)
+        self.estadisticas = {'creados': 0, 'precalentados': 0, 'descargados': 0}
+
+    def registrar(self, nombre, fabrica, pesado=False):
+        self._modulos[nombre] = {
+            'fabrica': fabrica,
+            'pesado': pesado,
+            'widget': None,
+            'ultimo_uso': 0.0,
+        }
+
+    def __contains__(self, nombre):
+        return nombre in self._modulos
+
+    def nombres(self):
+        return list(self._modulos)
+
+    def cargado(self, nombre):
+        return nombre in self._modulos and self._modulos[nombre]['widget'] is not None
+
+    def widget(self, nombre):
+        """Widget ya creado del módulo (o None)"""
+        entrada = self._modulos.get(nombre)
+        return entrada['widget'] if entrada else None
+
+    def obtener(self, nombre):
+        """Widget del módulo, creándolo si es la primera vez"""
+        entrada = self._modulos[nombre]
+        if entrada['widget'] is None:
+            entrada['widget'] = entrada['fabrica']()
+            self.contenedor.addWidget(entrada['widget'])
+            self.estadisticas['creados'] += 1
+        entrada['ultimo_uso'] = time.monotonic()
+        return entrada['widget']
+
+    def precalentar(self, nombre):
+        """Crear un módulo en segundo plano (sin mostrarlo); True si se creó"""
+        if nombre not in self._modulos or self.cargado(nombre):
+            return False
+        self.obtener(nombre)
+        self.estadisticas['precalentados'] += 1
+        return True
+
+    def descargar(self, nombre):
+        """Destruir el widget de un módulo (se recrea al volver a él)"""
+        entrada = self._modulos.get(nombre)
+        if not entrada or entrada['widget'] is None:
+            return False
+        widget = entrada['widget']
+        if widget is self.contenedor.currentWidget():
+            return False
+        self.db.ejecutor.cancelar(propietario=widget)
+        self.contenedor.removeWidget(widget)
+        widget.deleteLater()
+        entrada['widget'] = None
+        self.estadisticas['descargados'] += 1
+        return True
+
+    def presion_memoria(self):
+        """¿El proceso supera el límite de memoria configurado?"""
+        limite_mb = self.config.get('memoria_limite_mb', 0)
+        if not limite_mb or psutil is None:
+            return False
+        rss = psutil.Process().memory_info().rss
+        return rss > limite_mb * 1024 * 1024
+
+    def liberar_inactivos(self):
+        """Descargar módulos pesados inactivos, del menos al más reciente.
+
+        Se descarga si hay presión de memoria o si hay más módulos pesados
+        cargados que 'max_modulos_pesados'.
+        """
+        inactivo_seg = self.config.get('modulo_inactivo_seg', 600)
+        maximo = self.config.get('max_modulos_pesados', 3)
+        ahora = time.monotonic()
+
+        pesados = sorted((e['ultimo_uso'], nombre) for nombre, e in self._modulos.items()
+                         if e['pesado'] and e['widget'] is not None)
+        descargados = []
+        for ultimo_uso, nombre in pesados:
+            if ahora - ultimo_uso < inactivo_seg:
+                continue
+            if not self.presion_memoria() and len(pesados) - len(descargados) <= maximo:
+                break
+            if self.descargar(nombre):
+                descargados.append(nombre)
+        return descargados
+
 class JURMAQMainWindow(QMainWindow):
     """Ventana principal JURMAQ funcional"""
     
-    def __init__(self, user_data):
+    def __init__(self, user_data, db_manager=None):
         super().__init__()
         self.user_data = user_data
-        self.db = DatabaseManager()
+        self.db = db_manager or DatabaseManager()
         
         self.setWindowTitle(f"JURMAQ v1.0 - {user_data['nombre']} ({user_data['tipo_usuario']})")
         self.setGeometry(100, 100, 1400, 900)
@@ -910,6 +5447,13 @@ class JURMAQMainWindow(QMainWindow):
         self.init_ui()
         self.show_dashboard()
         
+        if self.es_administrador():
+            atajo_diagnostico = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+            atajo_diagnostico.activated.connect(self.abrir_diagnostico)
+        atajo_busqueda = QShortcut(QKeySequence("Ctrl+K"), self)
+        atajo_busqueda.activated.connect(lambda: (self.busqueda_edit.setFocus(),
+                                                  self.busqueda_edit.selectAll()))
+        
     def init_ui(self):
         """Inicializar interfaz"""
         central_widget = QWidget()
@@ -961,6 +5505,45 @@ class JURMAQMainWindow(QMainWindow):
         layout.addWidget(logo)
         layout.addWidget(user_info)
         
+        # Búsqueda global (Ctrl+K)
+        self.busqueda_edit = QLineEdit()
+        self.busqueda_edit.setPlaceholderText("🔍 Buscar presupuestos, órdenes, documentos...")
+        self.busqueda_edit.setClearButtonEnabled(True)
+        self.busqueda_edit.setStyleSheet("""
+            QLineEdit {
+                background-color: #334155;
+                color: white;
+                border: 1px solid #475569;
+                border-radius: 6px;
+                padding: 8px;
+            }
+        """)
+        self.resultados_busqueda = QListWidget()
+        self.resultados_busqueda.setWordWrap(True)
+        self.resultados_busqueda.setMaximumHeight(320)
+        self.resultados_busqueda.setStyleSheet("""
+            QListWidget {
+                background-color: #0f172a;
+                color: #e2e8f0;
+                border: 1px solid #334155;
+                border-radius: 6px;
+            }
+            QListWidget::item { padding: 6px; border-bottom: 1px solid #1e293b; }
+            QListWidget::item:selected { background-color: #3b82f6; }
+        """)
+        self.resultados_busqueda.hide()
+        self.timer_busqueda = QTimer(self)
+        self.timer_busqueda.setSingleShot(True)
+        self.timer_busqueda.setInterval(int(self.db.config.get('busqueda_espera_ms', 150)))
+        self.timer_busqueda.timeout.connect(self.ejecutar_busqueda)
+        self.busqueda_edit.textChanged.connect(lambda: self.timer_busqueda.start())
+        self.busqueda_edit.returnPressed.connect(self.abrir_primer_resultado)
+        self.resultados_busqueda.itemActivated.connect(self.abrir_resultado)
+        self.resultados_busqueda.itemClicked.connect(self.abrir_resultado)
+        
+        layout.addWidget(self.busqueda_edit)
+        layout.addWidget(self.resultados_busqueda)
+        
         # Separador
         separator = QFrame()
         separator.setFrameShape(QFrame.HLine)
@@ -1009,6 +5592,25 @@ class JURMAQMainWindow(QMainWindow):
         
         layout.addStretch()
         
+        # Diagnóstico de consultas (también con Ctrl+Shift+D)
+        if self.es_administrador():
+            diagnostico_btn = QPushButton("🩺 Diagnóstico")
+            diagnostico_btn.setFont(QFont("Arial", 10))
+            diagnostico_btn.setStyleSheet("""
+                QPushButton {
+                    background-color: transparent;
+                    color: #64748b;
+                    border: 1px solid #334155;
+                    padding: 8px;
+                    border-radius: 6px;
+                }
+                QPushButton:hover {
+                    color: white;
+                }
+            """)
+            diagnostico_btn.clicked.connect(self.abrir_diagnostico)
+            layout.addWidget(diagnostico_btn)
+        
         # Info del sistema
         system_info = QLabel(f"📅 {datetime.now().strftime('%d/%m/%Y')}\n⏰ {datetime.now().strftime('%H:%M')}")
         system_info.setFont(QFont("Arial", 10))
@@ -1039,35 +5641,130 @@ class JURMAQMainWindow(QMainWindow):
         return sidebar
         
     def create_modules(self):
-        """Crear módulos funcionales"""
-        
-        # Dashboard funcional
-        dashboard = DashboardModule(self.db, self.user_data)
-        self.content_area.addWidget(dashboard)
+        """Registrar módulos; cada uno se crea al navegar a él por primera vez"""
+        self.modulos = ModuleRegistry(self.content_area, self.db, self.db.config)
         
-        # Presupuestos funcional
-        presupuestos = PresupuestosModule(self.db, self.user_data)
-        self.content_area.addWidget(presupuestos)
-        
-        # Órdenes de compra funcional
-        ordenes_compra = OrdenesCompraModule(self.db, self.user_data)
-        self.content_area.addWidget(ordenes_compra)
+        # Módulos funcionales (consultan la base de datos)
+        self.modulos.registrar("Dashboard", lambda: DashboardModule(self.db, self.user_data), pesado=True)
+        self.modulos.registrar("Presupuestos", lambda: PresupuestosModule(self.db, self.user_data), pesado=True)
+        self.modulos.registrar("Órdenes de Compra", lambda: OrdenesCompraModule(self.db, self.user_data), pesado=True)
         
         # Otros módulos (simplificados por espacio)
         otros_modulos = [
-            ("💰 REMUNERACIONES", "Sistema de liquidación de sueldos y personal"),
-            ("🚜 RENTAL MAQUINARIA", "Gestión de arriendo de maquinaria pesada"),
-            ("🚛 VEHÍCULOS", "Control integral de flota vehicular"),
-            ("💳 CUENTAS POR PAGAR", "Sistema de control financiero"),
-            ("📦 STOCK/INVENTARIO", "Control de materiales y herramientas"),
-            ("📋 DOCUMENTOS", "Sistema de gestión documental"),
-            ("🔔 NOTIFICACIONES", "Sistema de alertas inteligente"),
-            ("⚙️ CONFIGURACIÓN", "Configuración avanzada del sistema")
+            ("Remuneraciones", "💰 REMUNERACIONES", "Sistema de liquidación de sueldos y personal"),
+            ("Rental Maquinaria", "🚜 RENTAL MAQUINARIA", "Gestión de arriendo de maquinaria pesada"),
+            ("Vehículos", "🚛 VEHÍCULOS", "Control integral de flota vehicular"),
+            ("Cuentas por Pagar", "💳 CUENTAS POR PAGAR", "Sistema de control financiero"),
+            ("Stock/Inventario", "📦 STOCK/INVENTARIO", "Control de materiales y herramientas"),
+            ("Documentos", "📋 DOCUMENTOS", "Sistema de gestión documental"),
+            ("Notificaciones", "🔔 NOTIFICACIONES", "Sistema de alertas inteligente"),
+            ("Configuración", "⚙️ CONFIGURACIÓN", "Configuración avanzada del sistema")
         ]
         
-        for titulo, descripcion in otros_modulos:
-            module = self.create_simple_module(titulo, descripcion)
-            self.content_area.addWidget(module)
+        for nombre, titulo, descripcion in otros_modulos:
+            self.modulos.registrar(nombre, lambda t=titulo, d=descripcion: self.create_simple_module(t, d))
+        
+        # Descarga periódica de módulos pesados inactivos
+        self.timer_modulos = QTimer(self)
+        self.timer_modulos.timeout.connect(self.modulos.liberar_inactivos)
+        self.timer_modulos.start(60 * 1000)
+        self._precalentado = False
+        
+        # Escrituras de otros puestos u otros procesos: llegan a los listados fila a fila
+        self.timer_cambios = QTimer(self)
+        self.timer_cambios.timeout.connect(self.revisar_cambios_externos)
+        self.timer_cambios.start(max(250, int(self.db.config.get('cambios_sondeo_ms', 2000))))
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._precalentado:
+            # Después del primer pintado, crear los módulos probables de a uno
+            self._precalentado = True
+            self._pendientes_precalentar = list(self.db.config.get('modulos_precalentar', []))
+            QTimer.singleShot(500, self._precalentar_siguiente)
+    
+    def revisar_cambios_externos(self):
+        """Leer en segundo plano el registro de cambios y publicar los ajenos"""
+        if self.db.ejecutor.en_curso(self.timer_cambios):
+            return      # La revisión anterior aún no termina
+        self.db.ejecutor.consultar('cambios_externos', self.db.cambios_externos,
+                                   self.db.notificador.publicar, propietario=self.timer_cambios)
+    
+    def es_administrador(self):
+        return self.user_data.get('tipo_usuario') == 'Administrador'
+
+    def abrir_diagnostico(self):
+        """Mostrar las estadísticas de consultas (ventana no modal, solo administradores)"""
+        if not self.es_administrador():
+            return
+        if getattr(self, 'diagnostico', None) is None:
+            self.diagnostico = DiagnosticoDialog(self.db, self)
+        self.diagnostico.show()
+        self.diagnostico.raise_()
+    
+    def ejecutar_busqueda(self):
+        """Buscar el texto actual en segundo plano; descarta la búsqueda anterior"""
+        texto = self.busqueda_edit.text().strip()
+        self.db.ejecutor.cancelar(propietario=self.resultados_busqueda)
+        if consulta_fts(texto) is None:
+            self.resultados_busqueda.clear()
+            self.resultados_busqueda.hide()
+            return
+        
+        def mostrar(resultados):
+            if self.busqueda_edit.text().strip() == texto:
+                self.mostrar_resultados(resultados)
+        
+        self.db.ejecutor.consultar(('buscar', texto), lambda conn: self.db.buscar(texto, conn=conn),
+                                   mostrar, propietario=self.resultados_busqueda)
+    
+    def mostrar_resultados(self, resultados):
+        iconos = {'presupuestos': "📊", 'ordenes_compra': "🛒", 'documentos': "📋"}
+        self.resultados_busqueda.clear()
+        if not resultados:
+            item = QListWidgetItem("Sin resultados")
+            item.setFlags(Qt.NoItemFlags)
+            self.resultados_busqueda.addItem(item)
+        for r in resultados:
+            item = QListWidgetItem(f"{iconos.get(r.tabla, '')} {r.titulo}\n{r.subtitulo}\n{r.fragmento}")
+            item.setData(Qt.UserRole, r)
+            item.setToolTip(r.fragmento)
+            self.resultados_busqueda.addItem(item)
+        self.resultados_busqueda.show()
+    
+    def abrir_primer_resultado(self):
+        item = self.resultados_busqueda.item(0)
+        if item is not None and item.data(Qt.UserRole) is not None:
+            self.abrir_resultado(item)
+    
+    def abrir_resultado(self, item):
+        """Ir al módulo del resultado y mostrar su detalle"""
+        r = item.data(Qt.UserRole)
+        if r is None:
+            return
+        if r.tabla == 'presupuestos':
+            self.switch_module("Presupuestos")
+            self.modulos.obtener("Presupuestos").mostrar_presupuesto(r.titulo)
+        elif r.tabla == 'ordenes_compra':
+            self.switch_module("Órdenes de Compra")
+            self.modulos.obtener("Órdenes de Compra").mostrar_orden(r.titulo)
+        else:
+            self.switch_module("Documentos")
+            filas = self.db.consultar(CONSULTAS['documentos_detalle'], (r.id,), registro=Documento)
+            if filas:
+                d = filas[0]
+                QMessageBox.information(self, "Documento", (
+                    f"📋 {d.nombre_documento}\n🏷️ Tipo: {d.tipo_documento or '-'}\n"
+                    f"📁 Categoría: {d.categoria or '-'}\n📂 Archivo: {d.ruta_archivo or '-'}\n"
+                    f"📅 Subido: {d.fecha_subida}\n⏳ Vence: {d.fecha_vencimiento or 'Sin fecha'}"))
+    
+    def _precalentar_siguiente(self):
+        """Crear el siguiente módulo sugerido, cediendo el control entre cada uno"""
+        while self._pendientes_precalentar:
+            nombre = self._pendientes_precalentar.pop(0)
+            if self.modulos.precalentar(nombre):
+                QTimer.singleShot(100, self._precalentar_siguiente)
+                return
     
     def create_simple_module(self, titulo, descripcion):
         """Crear módulo simple"""
@@ -1112,22 +5809,14 @@ class JURMAQMainWindow(QMainWindow):
     
     def switch_module(self, module_name):
         """Cambiar módulo"""
-        module_index = {
-            "Dashboard": 0,
-            "Presupuestos": 1,
-            "Órdenes de Compra": 2,
-            "Remuneraciones": 3,
-            "Rental Maquinaria": 4,
-            "Vehículos": 5,
-            "Cuentas por Pagar": 6,
-            "Stock/Inventario": 7,
-            "Documentos": 8,
-            "Notificaciones": 9,
-            "Configuración": 10
-        }
-        
-        if module_name in module_index:
-            self.content_area.setCurrentIndex(module_index[module_name])
+        if module_name in self.modulos:
+            # Cancelar cargas pendientes del módulo que se deja
+            anterior = self.content_area.currentWidget()
+            destino = self.modulos.obtener(module_name)
+            if anterior is not None and anterior is not destino:
+                self.db.ejecutor.cancelar(propietario=anterior)
+            
+            self.content_area.setCurrentWidget(destino)
             
             # Actualizar estilos
             for name, btn in self.nav_buttons.items():
@@ -1175,6 +5864,8 @@ class JURMAQMainWindow(QMainWindow):
             self.close()
             QApplication.quit()
 
+atexit.register(DatabaseManager.cerrar_pools)
+
 class JURMAQApp:
     """Aplicación JURMAQ funcional"""
     
@@ -1188,7 +5879,7 @@ class JURMAQApp:
         login = LoginDialog()
         
         if login.exec_() == QDialog.Accepted and login.user_data:
-            main_window = JURMAQMainWindow(login.user_data)
+            main_window = JURMAQMainWindow(login.user_data, login.db)
             main_window.show()
             return self.app.exec_()
         else:
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MANTENIMIENTO DE BASE DE DATOS JURMAQ
+Tareas de verificación y mantenimiento del archivo SQLite
+Uso: python mantenimiento_db.py verificar-planes [--umbral 1000]
+     python mantenimiento_db.py metricas [--reconstruir]
+     python mantenimiento_db.py volcar [--formato csv|ndjson] [--gzip] [--incremental] [--directorio volcados]
+     python mantenimiento_db.py importar presupuestos archivo.csv [--rechazos rechazos.csv]
+     python mantenimiento_db.py busqueda [--reconstruir] [--probar "texto"]
+     python mantenimiento_db.py cambios [--desde N] [--compactar [--retencion-dias 7]]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from main import DatabaseManager, TABLAS_GENERACION, ESCRITORES_VOLCADO, IMPORTACIONES, ErrorImportacion
+
+
+def comando_verificar_planes(db, args):
+    """Falla (código 1) si alguna consulta registrada recorre una tabla grande sin índice"""
+    problemas = db.verificar_planes(umbral_filas=args.umbral)
+    if not problemas:
+        print(f"✅ Todas las consultas registradas usan índices (umbral {args.umbral} filas)")
+        return 0
+
+    print(f"❌ {len(problemas)} planes con recorrido completo:")
+    for p in problemas:
+        print(f"   • {p['consulta']}: {p['detalle']} ({p['tabla']}, {p['filas']:,} filas)")
+    return 1
+
+
+def comando_metricas(db, args):
+    """Verifica los contadores de 'metricas'; con --reconstruir los recalcula"""
+    if args.reconstruir:
+        db.reconstruir_metricas()
+        print("🔄 Métricas recalculadas desde las tablas")
+
+    diferencias = db.verificar_metricas()
+    if not diferencias:
+        print("✅ La tabla metricas coincide con los datos")
+        return 0
+
+    print(f"❌ {len(diferencias)} contadores desalineados (use --reconstruir):")
+    for d in diferencias:
+        print(f"   • {d['tabla']} / {d['estado'] or '(sin estado)'}: "
+              f"guardado {d['guardado'][0]} ({d['guardado'][1]:,.0f}), "
+              f"real {d['real'][0]} ({d['real'][1]:,.0f})")
+    return 1
+
+
+def comando_volcar(db, args):
+    """Volcado nocturno: una foto consistente de las tablas en CSV o NDJSON"""
+    def progreso(tabla, filas):
+        print(f"   {tabla}: {filas:,} filas", end="\r", flush=True)
+
+    resultados = db.volcar_tablas(args.tablas, args.directorio, args.formato, args.gzip,
+                                  args.incremental, args.bloque, progreso)
+    print(" " * 60, end="\r")
+    total_filas = sum(r['filas'] for r in resultados)
+    total_segundos = sum(r['segundos'] for r in resultados)
+    for r in resultados:
+        rango = ""
+        if args.incremental:
+            rango = f" ({r['actualizadas']:,} modificadas, {r['eliminadas']:,} eliminadas)"
+        print(f"✅ {r['tabla']:<16}{r['filas']:>12,} filas {r['filas_por_segundo']:>12,} filas/s{rango}"
+              f"  → {r['ruta']}")
+        if args.incremental and not r['completo']:
+            print(f"   ⚠️  El registro de cambios se compactó antes de este volcado: "
+                  f"pueden faltar modificaciones de {r['tabla']} (haga un volcado completo)")
+    print(f"Total: {total_filas:,} filas en {total_segundos:.1f} s "
+          f"({total_filas / total_segundos if total_segundos else 0:,.0f} filas/s)")
+    return 0
+
+
+def comando_importar(db, args):
+    """Carga masiva con upsert sobre la clave de negocio; las filas malas se reportan"""
+    def progreso(filas):
+        print(f"   {filas:,} filas leídas", end="\r", flush=True)
+
+    try:
+        r = db.importar_archivo(args.tabla, args.archivo, args.lote, args.transaccion,
+                                args.rechazos, progreso)
+    except (ErrorImportacion, OSError) as e:
+        print(f"❌ {e}")
+        return 2
+    print(" " * 60, end="\r")
+    print(f"✅ {r.tabla}: {r.leidas:,} leídas, {r.insertadas:,} insertadas, "
+          f"{r.actualizadas:,} actualizadas, {r.rechazadas:,} rechazadas "
+          f"en {r.segundos:.1f} s ({r.filas_por_segundo:,} filas/s)")
+    for linea, motivo in r.rechazos[:args.mostrar]:
+        print(f"   • línea {linea}: {motivo}")
+    if r.rechazadas > args.mostrar:
+        destino = f" (detalle en {args.rechazos})" if args.rechazos else ""
+        print(f"   … y {r.rechazadas - args.mostrar:,} más{destino}")
+    return 1 if r.rechazadas else 0
+
+
+def comando_busqueda(db, args):
+    """Compacta y verifica los índices de texto completo; --probar mide una búsqueda"""
+    try:
+        db.mantener_busqueda(args.reconstruir)
+    except sqlite3.DatabaseError as e:
+        print(f"❌ Índice de búsqueda inconsistente ({e}); use --reconstruir")
+        return 1
+    print("✅ Índices de búsqueda " + ("reconstruidos" if args.reconstruir else "compactados y verificados"))
+
+    if args.probar:
+        inicio = time.perf_counter()
+        resultados = db.buscar(args.probar, args.limite)
+        ms = (time.perf_counter() - inicio) * 1000
+        print(f"🔍 '{args.probar}': {len(resultados)} resultados en {ms:.1f} ms")
+        for r in resultados:
+            print(f"   {r.puntaje:8.2f}  {r.tabla:<15} {r.titulo}  —  {r.fragmento}")
+    return 0
+
+
+def comando_cambios(db, args):
+    """Estado del registro de cambios; --desde lista cambios, --compactar borra los viejos"""
+    if args.compactar:
+        borrados, hasta = db.compactar_cambios(args.retencion_dias, args.maximo_dias)
+        print(f"🧹 {borrados:,} cambios borrados (registro compactado hasta la secuencia {hasta:,})")
+
+    if args.desde is not None:
+        lote = db.leer_cambios(args.desde, args.limite, args.tablas)
+        if not lote.completo:
+            print(f"⚠️  Faltan cambios posteriores a {args.desde}: el registro ya se compactó")
+        for c in lote.cambios:
+            print(f"   {c.seq:>10}  {c.momento}  {c.op:<6} {c.tabla:<15} id {c.id:<8} {c.clave or ''}"
+                  + (f"  (desde {c.origen})" if c.origen else ""))
+        if lote.hay_mas:
+            print(f"   … continúa con --desde {lote.hasta}")
+        return 0
+
+    with db.conexion() as conn:
+        ultimo = db.ultimo_cambio(conn)
+        filas, primero = conn.execute("SELECT COUNT(*), MIN(seq) FROM cambios").fetchone()
+    print(f"📒 Registro de cambios: {filas:,} filas (secuencias {primero or 0:,}..{ultimo:,})")
+    for consumidor, seq, actualizado in db.consumidores_cambios():
+        print(f"   • {consumidor:<30} en {seq:>10,} ({ultimo - seq:,} pendientes, {actualizado})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos JURMAQ")
+    parser.add_argument("--db", help="Ruta del archivo SQLite (por defecto el de la configuración)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("verificar-planes", help="EXPLAIN QUERY PLAN de todas las consultas registradas")
+    p.add_argument("--umbral", type=int, default=1000,
+                   help="Tamaño mínimo de tabla (filas) para reportar recorridos completos")
+    p.set_defaults(funcion=comando_verificar_planes)
+
+    p = sub.add_parser("metricas", help="Verificar (o reconstruir) los contadores del dashboard")
+    p.add_argument("--reconstruir", action="store_true",
+                   help="Recalcular la tabla metricas desde cero antes de verificar")
+    p.set_defaults(funcion=comando_metricas)
+
+    p = sub.add_parser("volcar", help="Exportar tablas a CSV/NDJSON por bloques")
+    p.add_argument("--tablas", nargs="+", choices=TABLAS_GENERACION,
+                   help="Tablas a volcar (por defecto todas)")
+    p.add_argument("--formato", choices=sorted(ESCRITORES_VOLCADO), default="csv")
+    p.add_argument("--gzip", action="store_true", help="Comprimir cada archivo con gzip")
+    p.add_argument("--incremental", action="store_true",
+                   help="Solo filas nuevas desde el volcado incremental anterior")
+    p.add_argument("--directorio", default="volcados")
+    p.add_argument("--bloque", type=int, default=5000, help="Filas por fetchmany")
+    p.set_defaults(funcion=comando_volcar)
+
+    p = sub.add_parser("importar", help="Importar CSV/NDJSON/XLSX con upsert por clave de negocio")
+    p.add_argument("tabla", choices=sorted(IMPORTACIONES))
+    p.add_argument("archivo", help="Archivo .csv, .ndjson o .xlsx (los .csv/.ndjson pueden venir en .gz)")
+    p.add_argument("--rechazos", help="Escribir las filas rechazadas y su motivo en este CSV")
+    p.add_argument("--lote", type=int, default=1000, help="Filas por executemany")
+    p.add_argument("--transaccion", type=int, default=20000, help="Filas por transacción")
+    p.add_argument("--mostrar", type=int, default=10, help="Rechazos a listar en pantalla")
+    p.set_defaults(funcion=comando_importar)
+
+    p = sub.add_parser("busqueda", help="Compactar/verificar los índices FTS5 de búsqueda")
+    p.add_argument("--reconstruir", action="store_true", help="Rehacer los índices desde las tablas")
+    p.add_argument("--probar", metavar="TEXTO", help="Ejecutar una búsqueda de prueba y medirla")
+    p.add_argument("--limite", type=int, default=10)
+    p.set_defaults(funcion=comando_busqueda)
+
+    p = sub.add_parser("cambios", help="Registro de cambios (CDC): estado, lectura y compactación")
+    p.add_argument("--desde", type=int, metavar="SEQ", help="Listar los cambios posteriores a SEQ")
+    p.add_argument("--limite", type=int, default=50)
+    p.add_argument("--tablas", nargs="+", choices=TABLAS_GENERACION)
+    p.add_argument("--compactar", action="store_true", help="Borrar los cambios que ya no se necesitan")
+    p.add_argument("--retencion-dias", type=float,
+                   help="Conservar al menos estos días (por defecto cambios_retencion_dias)")
+    p.add_argument("--maximo-dias", type=float,
+                   help="Borrar lo más viejo aunque un consumidor no lo haya leído "
+                        "(por defecto cambios_retencion_max_dias)")
+    p.set_defaults(funcion=comando_cambios)
+
+    args = parser.parse_args()
+    db = DatabaseManager(args.db)
+    return args.funcion(db, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
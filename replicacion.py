@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+REPLICACIÓN ENTRE SITIOS JURMAQ
+Sincroniza bases SQLite independientes (oficina Santiago y sitios remotos) con
+paquetes de cambios en archivo: cada paquete lleva solo lo cambiado desde el
+anterior y aplicarlo dos veces no tiene efecto
+Uso: python replicacion.py sitio [--nombre "Faena Norte"] [--nuevo]
+     python replicacion.py registrar SITIO [--nombre NOMBRE] [--desde-actual]
+     python replicacion.py exportar SITIO [-o paquete.jpaq] [--reenviar]
+     python replicacion.py aplicar paquete.jpaq [otro.jpaq ...] [--forzar]
+     python replicacion.py estado
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+import zlib
+import struct
+import sqlite3
+import argparse
+from datetime import datetime
+from collections import namedtuple
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from main import (DatabaseManager, Cambio, CLAVES_NEGOCIO, VERSION_ESQUEMA,
+                  codificar, decodificar, resumir_cambios)
+
+# Tablas con clave de negocio que se replican. usuarios (contraseñas) y
+# documentos (rutas de archivos locales, sin clave) quedan en cada sitio.
+TABLAS_REPLICADAS = ['presupuestos', 'ordenes_compra', 'empleados', 'vehiculos', 'inventario']
+
+# Columnas que solo tienen sentido en la base donde se escribieron
+COLUMNAS_LOCALES = {'id', 'usuario_id'}
+
+MAGIA_PAQUETE = b"JURMAQ-PAQUETE\x01"
+FORMATO_PAQUETE = 2
+FILAS_POR_BLOQUE = 5000
+
+# Momento de una fila cuyo último cambio ya no está en el registro (compactado):
+# pierde contra cualquier cambio fechado
+MOMENTO_INICIAL = "1970-01-01 00:00:00"
+
+ResultadoExportacion = namedtuple('ResultadoExportacion', 'destino ruta desde hasta cambios inicial bytes segundos')
+ResultadoAplicacion = namedtuple('ResultadoAplicacion',
+                                 'origen ruta estado desde hasta aplicados sin_cambios descartados segundos')
+
+
+class ErrorReplicacion(ValueError):
+    """Paquete inválido, fuera de orden o de otro destino"""
+
+
+# --- Formato del paquete ---
+#
+# MAGIA_PAQUETE y luego bloques: 4 bytes de largo (big endian) + zlib(valor
+# codificado como en el protocolo del servicio de datos). El primero es el
+# encabezado, después vienen {tabla, columnas, filas} y al final {fin, cambios}:
+# un archivo sin el bloque final está truncado y no se aplica. Cada fila es
+# [op ('U' alta o modificación, 'D' baja), clave, momento, sitio, valores,
+# clave_anterior]; clave_anterior es la que el destino conoce si la fila se
+# renombró desde el paquete anterior (si no, None).
+
+def escribir_bloque(archivo, valor):
+    datos = zlib.compress(codificar(valor), 6)
+    archivo.write(struct.pack(">I", len(datos)))
+    archivo.write(datos)
+
+
+def leer_bloques(archivo):
+    """Bloques decodificados de un paquete abierto en modo binario"""
+    if archivo.read(len(MAGIA_PAQUETE)) != MAGIA_PAQUETE:
+        raise ErrorReplicacion("El archivo no es un paquete de replicación JURMAQ")
+    while True:
+        largo = archivo.read(4)
+        if not largo:
+            return
+        if len(largo) < 4:
+            raise ErrorReplicacion("Paquete truncado")
+        datos = archivo.read(struct.unpack(">I", largo)[0])
+        try:
+            yield decodificar(zlib.decompress(datos))
+        except (zlib.error, sqlite3.InterfaceError) as e:
+            raise ErrorReplicacion(f"Paquete dañado: {e}") from e
+
+
+class ReplicationManager:
+    """Paquetes de cambios entre esta base y otros sitios.
+
+    Lo que se envía sale del registro de cambios: desde la última secuencia
+    enviada a ese sitio, resumido a un cambio por fila y sin lo que vino de él
+    mismo. Al aplicar, cada fila se busca por su clave de negocio (o por la
+    anterior, si otro sitio la renombró) y los conflictos se resuelven por la
+    última escritura (momento del cambio y, en empate, el id de sitio). Una
+    fila sin cambios registrados cuenta como la más vieja posible. Los
+    cambios aplicados quedan en el registro con su sitio y momento de origen,
+    así no rebotan y se pueden reenviar a un tercer sitio.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.sitio, self.nombre = self._identidad()
+
+    def _identidad(self):
+        with self.db.conexion() as conn:
+            conn.execute("INSERT OR IGNORE INTO meta (clave, valor) VALUES ('sitio_id', ?)",
+                         (uuid.uuid4().hex[:16],))
+            valores = dict(conn.execute(
+                "SELECT clave, valor FROM meta WHERE clave IN ('sitio_id', 'sitio_nombre')"))
+        return valores['sitio_id'], valores.get('sitio_nombre')
+
+    def configurar_sitio(self, nombre=None, nuevo=False):
+        """Cambiar el nombre de este sitio o darle un id nuevo (base copiada de otro sitio)"""
+        with self.db.conexion() as conn:
+            if nuevo:
+                conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('sitio_id', ?)",
+                             (uuid.uuid4().hex[:16],))
+                conn.execute("DELETE FROM replicacion_sitios")
+            if nombre is not None:
+                conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('sitio_nombre', ?)", (nombre,))
+        self.sitio, self.nombre = self._identidad()
+
+    @staticmethod
+    def _columnas(conn, tabla):
+        return [fila[1] for fila in conn.execute(f'PRAGMA table_info("{tabla}")')
+                if fila[1] not in COLUMNAS_LOCALES]
+
+    def _buscar_sitio(self, conn, texto):
+        """(sitio, nombre, enviado_hasta, recibido_hasta) por id o por nombre"""
+        fila = conn.execute("""
+            SELECT sitio, nombre, enviado_hasta, recibido_hasta FROM replicacion_sitios
+            WHERE sitio = ?1 OR nombre = ?1 ORDER BY sitio = ?1 DESC LIMIT 1
+        """, (texto,)).fetchone()
+        if fila is None:
+            raise ErrorReplicacion(f"Sitio desconocido: {texto} (use 'registrar' o aplique antes un paquete suyo)")
+        return fila
+
+    def registrar_sitio(self, sitio, nombre=None, desde_actual=False):
+        """Dar de alta un sitio al que se enviarán paquetes.
+
+        desde_actual: el otro sitio parte de una copia de esta base, así que
+        solo hay que enviarle lo que cambie de aquí en adelante.
+        """
+        if sitio == self.sitio:
+            raise ErrorReplicacion("Ese es el id de este mismo sitio")
+        with self.db.conexion() as conn:
+            desde = self.db.ultimo_cambio(conn) if desde_actual else 0
+            conn.execute("""
+                INSERT INTO replicacion_sitios (sitio, nombre, enviado_hasta) VALUES (?, ?, ?)
+                ON CONFLICT (sitio) DO UPDATE SET nombre = COALESCE(excluded.nombre, nombre),
+                    enviado_hasta = MAX(enviado_hasta, excluded.enviado_hasta)
+            """, (sitio, nombre, desde))
+            # Retener en el registro lo que este sitio aún no confirma
+            if self.db.posicion_consumidor(f"replica:{sitio}", conn) is None:
+                self.db.confirmar_cambios(f"replica:{sitio}", desde, conn)
+
+    def estado(self):
+        """[(sitio, nombre, enviado_hasta, recibido_hasta, confirmado, pendientes, ultimo_envio, ultima_recepcion)]"""
+        with self.db.conexion() as conn:
+            ultimo = self.db.ultimo_cambio(conn)
+            filas = conn.execute("""
+                SELECT s.sitio, s.nombre, s.enviado_hasta, s.recibido_hasta, c.seq,
+                       s.ultimo_envio, s.ultima_recepcion
+                FROM replicacion_sitios s
+                LEFT JOIN cambios_consumidores c ON c.consumidor = 'replica:' || s.sitio
+                ORDER BY s.nombre, s.sitio
+            """).fetchall()
+            resultado = []
+            for sitio, nombre, enviado, recibido, confirmado, envio, recepcion in filas:
+                pendientes = conn.execute(
+                    "SELECT COUNT(*) FROM cambios WHERE seq > ? AND seq <= ? AND tabla IN ("
+                    + ", ".join("?" * len(TABLAS_REPLICADAS)) + ") AND origen IS NOT ?",
+                    (enviado, ultimo, *TABLAS_REPLICADAS, sitio)).fetchone()[0]
+                resultado.append((sitio, nombre, enviado, recibido, confirmado, pendientes, envio, recepcion))
+            return resultado
+
+    # --- Exportar ---
+
+    def exportar_paquete(self, destino, ruta=None, reenviar=False):
+        """Escribir el paquete de cambios pendientes para 'destino' (id o nombre).
+
+        reenviar=True parte de lo que el destino confirmó haber aplicado (si
+        un paquete se perdió) en vez de lo último enviado. Si el registro ya
+        se compactó más allá de ese punto, el paquete es inicial: lleva todas
+        las filas, que el destino aplica solo donde no tenga algo más nuevo.
+        """
+        inicio = time.perf_counter()
+        conn = self.db.pool.acquire()
+        try:
+            conn.execute("BEGIN")       # Foto consistente del registro y las tablas
+            sitio, nombre, enviado, recibido = self._buscar_sitio(conn, destino)
+            desde = enviado
+            if reenviar:
+                desde = min(enviado, self.db.posicion_consumidor(f"replica:{sitio}", conn) or 0)
+            hasta = self.db.ultimo_cambio(conn)
+
+            cambios, posicion, inicial = [], desde, False
+            while True:
+                lote = self.db.leer_cambios(posicion, 20000, TABLAS_REPLICADAS, hasta=hasta, conn=conn)
+                if not lote.completo:
+                    inicial = True
+                    break
+                cambios.extend(lote.cambios)
+                posicion = lote.hasta
+                if not lote.hay_mas:
+                    break
+            # Clave que el destino conoce de cada fila: la de antes de su primer cambio
+            # (una fila dada de alta en el tramo no la tiene)
+            anteriores = {}
+            for c in cambios:
+                if (c.tabla, c.id) not in anteriores:
+                    anteriores[(c.tabla, c.id)] = (None if c.op == 'insert' else
+                                                   c.clave_anterior or c.clave)
+            # Lo último que pasó con cada fila, salvo lo que vino del propio destino
+            cambios = [c for c in resumir_cambios(cambios) if c.origen != sitio]
+
+            if ruta is None:
+                etiqueta = re.sub(r"\W+", "_", f"{self.nombre or self.sitio}_a_{nombre or sitio}")
+                ruta = f"{etiqueta}_{desde}-{hasta}.jpaq"
+            temporal = ruta + ".tmp"
+            total = 0
+            with open(temporal, "wb") as archivo:
+                archivo.write(MAGIA_PAQUETE)
+                escribir_bloque(archivo, {
+                    'formato': FORMATO_PAQUETE, 'esquema': VERSION_ESQUEMA,
+                    'origen': self.sitio, 'nombre': self.nombre, 'destino': sitio,
+                    'desde': desde, 'hasta': hasta, 'acuse': recibido, 'inicial': inicial,
+                    'creado': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                })
+                for tabla in TABLAS_REPLICADAS:
+                    columnas = self._columnas(conn, tabla)
+                    if inicial:
+                        filas = self._filas_completas(conn, tabla, columnas)
+                    else:
+                        filas = self._filas_cambiadas(conn, tabla, columnas,
+                                                      [c for c in cambios if c.tabla == tabla], anteriores)
+                    for bloque in filas:
+                        escribir_bloque(archivo, {'tabla': tabla, 'columnas': columnas, 'filas': bloque})
+                        total += len(bloque)
+                escribir_bloque(archivo, {'fin': True, 'cambios': total})
+            os.replace(temporal, ruta)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            if 'temporal' in locals() and os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        finally:
+            self.db.pool.release(conn)
+
+        with self.db.conexion() as escritura:
+            escritura.execute("""
+                UPDATE replicacion_sitios SET enviado_hasta = MAX(enviado_hasta, ?),
+                    ultimo_envio = CURRENT_TIMESTAMP WHERE sitio = ?
+            """, (hasta, sitio))
+        return ResultadoExportacion(sitio, ruta, desde, hasta, total, inicial, os.path.getsize(ruta),
+                                    round(time.perf_counter() - inicio, 3))
+
+    def _filas_cambiadas(self, conn, tabla, columnas, cambios, anteriores):
+        """Bloques de filas de paquete para los cambios resumidos de una tabla"""
+        posicion_clave = columnas.index(CLAVES_NEGOCIO[tabla])
+        sql = (f"SELECT id, {', '.join(columnas)} FROM {tabla} "
+               f"WHERE id IN (SELECT value FROM json_each(?))")
+        for i in range(0, len(cambios), FILAS_POR_BLOQUE):
+            tramo = cambios[i:i + FILAS_POR_BLOQUE]
+            actuales = {fila[0]: list(fila[1:]) for fila in conn.execute(
+                sql, (json_ids(c.id for c in tramo if c.op != 'delete'),))}
+            bloque = []
+            for c in tramo:
+                origen = c.origen or self.sitio
+                anterior = anteriores.get((tabla, c.id))
+                if c.op == 'delete':
+                    bloque.append(['D', c.clave, c.momento, origen, None,
+                                   anterior if anterior != c.clave else None])
+                elif c.id in actuales:
+                    valores = actuales[c.id]
+                    clave = valores[posicion_clave]
+                    bloque.append(['U', clave, c.momento, origen, valores,
+                                   anterior if anterior != clave else None])
+            if bloque:
+                yield bloque
+
+    def _filas_completas(self, conn, tabla, columnas):
+        """Todas las filas de una tabla, para un paquete inicial.
+
+        Cada fila va con el momento y sitio de su último cambio registrado; las
+        que ya no tienen cambios en el registro, con MOMENTO_INICIAL.
+        """
+        posicion_clave = columnas.index(CLAVES_NEGOCIO[tabla])
+        # Con MAX(seq), SQLite toma momento y origen de la fila del máximo
+        cursor = conn.execute(f"""
+            SELECT {', '.join(f't.{c}' for c in columnas)}, u.momento, u.origen
+            FROM {tabla} t
+            LEFT JOIN (SELECT fila_id, momento, origen, MAX(seq) FROM cambios
+                       WHERE tabla = ? GROUP BY fila_id) u ON u.fila_id = t.id
+            ORDER BY t.id
+        """, (tabla,))
+        while True:
+            filas = cursor.fetchmany(FILAS_POR_BLOQUE)
+            if not filas:
+                return
+            yield [['U', fila[posicion_clave], fila[-2] or MOMENTO_INICIAL, fila[-1] or self.sitio,
+                    list(fila[:-2]), None] for fila in filas]
+
+    # --- Aplicar ---
+
+    def aplicar_paquete(self, ruta, forzar=False):
+        """Aplicar un paquete en una sola transacción.
+
+        Un paquete ya aplicado se omite (estado 'repetido'); uno que deja un
+        hueco con el último aplicado de ese sitio se rechaza, salvo forzar.
+        """
+        inicio = time.perf_counter()
+        contadores = {'aplicados': 0, 'sin_cambios': 0, 'descartados': 0}
+        tablas = set()
+        with open(ruta, "rb") as archivo:
+            bloques = leer_bloques(archivo)
+            encabezado = next(bloques, None)
+            if not isinstance(encabezado, dict) or encabezado.get('formato') != FORMATO_PAQUETE:
+                raise ErrorReplicacion("Encabezado de paquete inválido o de otra versión")
+            origen, desde, hasta = encabezado['origen'], encabezado['desde'], encabezado['hasta']
+            if origen == self.sitio:
+                raise ErrorReplicacion("El paquete salió de este mismo sitio (si esta base es una copia "
+                                       "de otro sitio, use 'replicacion.py sitio --nuevo')")
+            if encabezado.get('destino') not in (None, self.sitio) and not forzar:
+                raise ErrorReplicacion(f"El paquete es para el sitio {encabezado['destino']}, no para este")
+
+            conn = self.db.pool.acquire()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                antes = self.db.ultimo_cambio(conn)
+                fila = conn.execute("SELECT recibido_hasta FROM replicacion_sitios WHERE sitio = ?",
+                                    (origen,)).fetchone()
+                recibido = fila[0] if fila else 0
+                if not (encabezado['inicial'] or forzar):
+                    if hasta <= recibido:
+                        conn.rollback()
+                        return ResultadoAplicacion(origen, ruta, 'repetido', desde, hasta, 0, 0, 0,
+                                                   round(time.perf_counter() - inicio, 3))
+                    # El primer paquete de un sitio puede partir de cualquier punto
+                    # (registrado con --desde-actual sobre una copia de esta base)
+                    if recibido and desde > recibido:
+                        raise ErrorReplicacion(
+                            f"Falta un paquete anterior de {encabezado.get('nombre') or origen}: este parte "
+                            f"en {desde} y lo aplicado llega a {recibido}")
+
+                # Los triggers del registro de cambios toman de aquí el sitio y momento de origen
+                conn.execute("INSERT INTO replicacion_contexto (id, origen, momento) VALUES (1, ?, NULL)",
+                             (origen,))
+                fin = False
+                for bloque in bloques:
+                    if bloque.get('fin'):
+                        fin = True
+                        break
+                    tablas.add(bloque['tabla'])
+                    self._aplicar_bloque(conn, bloque, contadores)
+                if not fin:
+                    raise ErrorReplicacion("Paquete truncado: falta el bloque final")
+                conn.execute("DELETE FROM replicacion_contexto")
+
+                conn.execute("""
+                    INSERT INTO replicacion_sitios (sitio, nombre, recibido_hasta, ultima_recepcion)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (sitio) DO UPDATE SET nombre = COALESCE(excluded.nombre, nombre),
+                        recibido_hasta = MAX(recibido_hasta, excluded.recibido_hasta),
+                        ultima_recepcion = excluded.ultima_recepcion
+                """, (origen, encabezado.get('nombre'), hasta))
+                # Acuse: hasta dónde el otro sitio aplicó lo nuestro; lo anterior ya se puede compactar
+                confirmado = self.db.posicion_consumidor(f"replica:{origen}", conn)
+                if confirmado is None or encabezado.get('acuse', 0) > confirmado:
+                    self.db.confirmar_cambios(f"replica:{origen}", encabezado.get('acuse', 0), conn)
+
+                despues = self.db.ultimo_cambio(conn)
+                self.db.seguimiento.registrar_propios(antes, despues)
+                try:
+                    conn.commit()
+                except sqlite3.Error:
+                    self.db.seguimiento.descartar_propios(antes, despues)
+                    raise
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self.db.pool.release(conn)
+
+        if contadores['aplicados']:
+            self.db.notificador.publicar([Cambio(tabla, 'reload', None, None) for tabla in sorted(tablas)])
+        return ResultadoAplicacion(origen, ruta, 'aplicado', desde, hasta, contadores['aplicados'],
+                                   contadores['sin_cambios'], contadores['descartados'],
+                                   round(time.perf_counter() - inicio, 3))
+
+    def _aplicar_bloque(self, conn, bloque, contadores):
+        tabla = bloque['tabla']
+        if tabla not in TABLAS_REPLICADAS:
+            raise ErrorReplicacion(f"Tabla no replicable en el paquete: {tabla}")
+        clave = CLAVES_NEGOCIO[tabla]
+        columnas = bloque['columnas']
+        # Solo las columnas que esta base conoce (los sitios pueden ir en versiones distintas)
+        locales = set(self._columnas(conn, tabla))
+        usar = [i for i, c in enumerate(columnas) if c in locales]
+        nombres = [columnas[i] for i in usar]
+        sql_fila = f"SELECT id, {', '.join(nombres)} FROM {tabla} WHERE {clave} = ?"
+        sql_insertar = f"INSERT INTO {tabla} ({', '.join(nombres)}) VALUES ({', '.join('?' * len(nombres))})"
+        sql_actualizar = {}     # columnas cambiadas -> UPDATE
+        # Versión local: último cambio de la fila existente o, si no existe, de
+        # sus claves (una baja local también compite)
+        sql_version_fila = ("SELECT momento, COALESCE(origen, ?) FROM cambios "
+                            "WHERE tabla = ? AND clave = ? AND fila_id = ? ORDER BY seq DESC LIMIT 1")
+        sql_version_clave = ("SELECT momento, COALESCE(origen, ?) FROM cambios "
+                             "WHERE tabla = ? AND clave IN (?, ?) ORDER BY seq DESC LIMIT 1")
+
+        for op, valor_clave, momento, origen, valores, anterior in bloque['filas']:
+            # La fila se busca por su clave actual y, si se renombró, por la anterior
+            existente, clave_local = conn.execute(sql_fila, (valor_clave,)).fetchone(), valor_clave
+            if existente is None and anterior is not None:
+                existente, clave_local = conn.execute(sql_fila, (anterior,)).fetchone(), anterior
+            if existente is not None:
+                local = conn.execute(sql_version_fila, (self.sitio, tabla, clave_local, existente[0])).fetchone()
+                # Sin cambios registrados (historia compactada): tan vieja como es posible
+                local = tuple(local) if local is not None else (MOMENTO_INICIAL, self.sitio)
+            else:
+                local = conn.execute(sql_version_clave, (self.sitio, tabla, valor_clave,
+                                                         anterior or valor_clave)).fetchone()
+            # Gana la última escritura; en empate de segundo decide el id de sitio
+            if local is not None and (momento, origen) <= tuple(local):
+                contadores['sin_cambios' if (momento, origen) == tuple(local) else 'descartados'] += 1
+                continue
+            try:
+                if op == 'D':
+                    if existente is None:
+                        contadores['sin_cambios'] += 1
+                        continue
+                    conn.execute("UPDATE replicacion_contexto SET origen = ?, momento = ?", (origen, momento))
+                    conn.execute(f"DELETE FROM {tabla} WHERE id = ?", (existente[0],))
+                else:
+                    nuevos = [valores[i] for i in usar]
+                    if existente is not None and list(existente[1:]) == nuevos:
+                        contadores['sin_cambios'] += 1
+                        continue
+                    conn.execute("UPDATE replicacion_contexto SET origen = ?, momento = ?", (origen, momento))
+                    if existente is None:
+                        conn.execute(sql_insertar, nuevos)
+                    else:
+                        # Solo las columnas distintas: los triggers UPDATE OF (FTS, métricas) no se disparan de más
+                        cambiadas = tuple(i for i, (antes, ahora) in enumerate(zip(existente[1:], nuevos))
+                                          if antes != ahora)
+                        sql = sql_actualizar.get(cambiadas)
+                        if sql is None:
+                            sql = sql_actualizar[cambiadas] = (
+                                f"UPDATE {tabla} SET {', '.join(f'{nombres[i]} = ?' for i in cambiadas)} WHERE id = ?")
+                        conn.execute(sql, [nuevos[i] for i in cambiadas] + [existente[0]])
+            except sqlite3.IntegrityError as e:
+                raise ErrorReplicacion(f"{tabla} {valor_clave}: {e}") from e
+            contadores['aplicados'] += 1
+
+
+def json_ids(ids):
+    return "[" + ",".join(str(int(i)) for i in ids) + "]"
+
+
+# --- Línea de comandos ---
+
+def comando_sitio(replicacion, args):
+    """Id y nombre de este sitio (los demás sitios lo usan para registrarlo)"""
+    if args.nombre is not None or args.nuevo:
+        replicacion.configurar_sitio(args.nombre, args.nuevo)
+    print(f"🏢 Sitio {replicacion.nombre or '(sin nombre)'}: {replicacion.sitio}")
+    return 0
+
+
+def comando_registrar(replicacion, args):
+    replicacion.registrar_sitio(args.sitio, args.nombre, args.desde_actual)
+    print(f"✅ Sitio {args.nombre or args.sitio} registrado"
+          + (" (solo cambios desde ahora)" if args.desde_actual else ""))
+    return 0
+
+
+def comando_exportar(replicacion, args):
+    r = replicacion.exportar_paquete(args.sitio, args.salida, args.reenviar)
+    if r.inicial:
+        tipo = "inicial (todas las filas)"
+    elif r.hasta > r.desde:
+        tipo = f"cambios {r.desde + 1}..{r.hasta}"
+    else:
+        tipo = "sin cambios nuevos (solo acuse)"
+    print(f"📦 {r.ruta}: {r.cambios:,} filas, {tipo}, {r.bytes / 1024:,.1f} KB en {r.segundos:.2f} s")
+    return 0
+
+
+def comando_aplicar(replicacion, args):
+    """Aplicar en orden; tras un paquete rechazado no se siguen aplicando los demás"""
+    for ruta in args.paquetes:
+        try:
+            r = replicacion.aplicar_paquete(ruta, args.forzar)
+        except (ErrorReplicacion, OSError) as e:
+            print(f"❌ {ruta}: {e}")
+            return 2
+        if r.estado == 'repetido':
+            print(f"⏭️  {ruta}: ya aplicado (cambios {r.desde + 1}..{r.hasta})")
+            continue
+        print(f"✅ {ruta}: {r.aplicados:,} aplicados, {r.sin_cambios:,} sin cambios, "
+              f"{r.descartados:,} descartados por un cambio local más nuevo ({r.segundos:.2f} s)")
+    return 0
+
+
+def comando_estado(replicacion, args):
+    print(f"🏢 Este sitio: {replicacion.nombre or '(sin nombre)'} ({replicacion.sitio})")
+    filas = replicacion.estado()
+    if not filas:
+        print("   Sin sitios registrados")
+    for sitio, nombre, enviado, recibido, confirmado, pendientes, envio, recepcion in filas:
+        print(f"   • {nombre or sitio} ({sitio}): {pendientes:,} cambios por enviar; "
+              f"enviado hasta {enviado:,} ({envio or 'nunca'}), confirmado hasta {confirmado or 0:,}; "
+              f"recibido hasta {recibido:,} ({recepcion or 'nunca'})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replicación de la base JURMAQ entre sitios")
+    parser.add_argument("--db", help="Ruta del archivo SQLite (por defecto el de la configuración)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("sitio", help="Mostrar (o cambiar) el id y nombre de este sitio")
+    p.add_argument("--nombre", help="Nombre legible de este sitio")
+    p.add_argument("--nuevo", action="store_true",
+                   help="Generar un id nuevo (esta base se copió de otro sitio)")
+    p.set_defaults(funcion=comando_sitio)
+
+    p = sub.add_parser("registrar", help="Dar de alta un sitio al que se enviarán paquetes")
+    p.add_argument("sitio", help="Id del otro sitio (lo muestra 'replicacion.py sitio' allá)")
+    p.add_argument("--nombre")
+    p.add_argument("--desde-actual", action="store_true",
+                   help="El otro sitio parte de una copia de esta base: enviar solo lo nuevo")
+    p.set_defaults(funcion=comando_registrar)
+
+    p = sub.add_parser("exportar", help="Escribir el paquete de cambios pendientes para un sitio")
+    p.add_argument("sitio", help="Id o nombre del sitio destino")
+    p.add_argument("-o", "--salida", help="Archivo del paquete (por defecto uno con origen, destino y rango)")
+    p.add_argument("--reenviar", action="store_true",
+                   help="Incluir todo lo que el destino aún no confirmó (si se perdió un paquete)")
+    p.set_defaults(funcion=comando_exportar)
+
+    p = sub.add_parser("aplicar", help="Aplicar paquetes recibidos (en orden)")
+    p.add_argument("paquetes", nargs="+")
+    p.add_argument("--forzar", action="store_true",
+                   help="Aplicar aunque sea de otro destino o deje un hueco en la secuencia")
+    p.set_defaults(funcion=comando_aplicar)
+
+    p = sub.add_parser("estado", help="Sitios registrados y cambios pendientes de envío")
+    p.set_defaults(funcion=comando_estado)
+
+    args = parser.parse_args()
+    db = DatabaseManager(args.db)
+    try:
+        return args.funcion(ReplicationManager(db), args)
+    except (ErrorReplicacion, OSError) as e:
+        print(f"❌ {e}")
+        return 2
+    finally:
+        DatabaseManager.cerrar_pools()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SERVICIO DE DATOS JURMAQ
+Proceso dueño del archivo SQLite: los escritorios se conectan por TCP o socket
+Unix en vez de abrir la base por una carpeta compartida (SMB)
+Uso: python servidor_datos.py --db jurmaq_funcional.db --escuchar 0.0.0.0:8765 --token secreto
+     python servidor_datos.py --escuchar unix:/tmp/jurmaq.sock
+En cada cliente: "modo_datos": "remoto", "servidor_direccion": "servidor:8765", "servidor_token": "secreto"
+"""
+
+import os
+import sys
+import hmac
+import time
+import signal
+import socket
+import sqlite3
+import secrets
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from main import (DatabaseManager, PROTOCOLO_VERSION, TRAMA_MAXIMA, TRAMA_MAXIMA_INICIAL,
+                  cargar_configuracion, enviar_trama, leer_trama)
+
+MAX_CURSORES_SESION = 32
+
+
+class Sesion:
+    """Conexión SQLite de un cliente y sus cursores abiertos"""
+
+    def __init__(self, servicio, conn):
+        self.id = servicio.siguiente_id()
+        self.clave = secrets.token_hex(16)
+        self.conn = conn
+        self.cursores = OrderedDict()   # id -> cursor con filas pendientes
+        self._siguiente_cursor = 0
+
+    def ejecutar(self, sql, parametros, prefetch):
+        cursor = self.conn.execute(sql, parametros)
+        nombres = [d[0] for d in cursor.description] if cursor.description else None
+        filas = cursor.fetchmany(prefetch) if nombres else []
+        id_cursor = 0
+        if nombres and len(filas) == prefetch:
+            # Quedan filas: el cliente las pide con 'traer'
+            self._siguiente_cursor += 1
+            id_cursor = self._siguiente_cursor
+            self.cursores[id_cursor] = cursor
+            while len(self.cursores) > MAX_CURSORES_SESION:
+                self.cursores.popitem(last=False)[1].close()
+        else:
+            cursor.close()
+        return [id_cursor, nombres, cursor.lastrowid, cursor.rowcount, filas]
+
+    def traer(self, id_cursor, cantidad):
+        cursor = self.cursores.get(id_cursor)
+        if cursor is None:
+            return [[], False]
+        filas = cursor.fetchmany(cantidad)
+        if len(filas) < cantidad:
+            self.cerrar_cursor(id_cursor)
+            return [filas, False]
+        return [filas, True]
+
+    def cerrar_cursor(self, id_cursor):
+        cursor = self.cursores.pop(id_cursor, None)
+        if cursor is not None:
+            cursor.close()
+
+    def cerrar(self):
+        for cursor in self.cursores.values():
+            cursor.close()
+        self.cursores.clear()
+        try:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+class ServicioDatos:
+    """Estado compartido del servidor: base, sesiones activas y contadores"""
+
+    def __init__(self, db, token="", max_sesiones=64, inactividad=600):
+        self.db = db
+        self.token = token
+        self.max_sesiones = max_sesiones
+        self.inactividad = inactividad or None
+        self.sesiones = {}
+        self._lock = threading.Lock()
+        self._ultimo_id = 0
+        self.estadisticas = {'sesiones': 0, 'tramas': 0, 'solicitudes': 0, 'errores': 0, 'interrupciones': 0,
+                             'inactivas': 0}
+
+    def contar(self, nombre):
+        """Sumar uno a un contador (lo actualizan todos los hilos de clientes)"""
+        with self._lock:
+            self.estadisticas[nombre] += 1
+
+    def siguiente_id(self):
+        with self._lock:
+            self._ultimo_id += 1
+            return self._ultimo_id
+
+    def abrir_sesion(self, version, token, opciones):
+        if version != PROTOCOLO_VERSION:
+            raise sqlite3.InterfaceError(
+                f"Versión de protocolo {version} no soportada (servidor: {PROTOCOLO_VERSION})")
+        if not hmac.compare_digest(str(token or ""), self.token):
+            raise sqlite3.OperationalError("Token del servidor de datos incorrecto")
+        with self._lock:
+            if len(self.sesiones) >= self.max_sesiones:
+                raise sqlite3.OperationalError(
+                    f"El servidor de datos alcanzó el máximo de {self.max_sesiones} sesiones")
+        # Misma configuración que las conexiones del pool local (pragmas, instrumentación)
+        conn = self.db.pool.conectar(isolation_level=(opciones or {}).get('isolation_level', ""))
+        self.db._preparar_conexion(conn)
+        sesion = Sesion(self, conn)
+        with self._lock:
+            self.sesiones[sesion.id] = sesion
+            self.estadisticas['sesiones'] += 1
+        return sesion
+
+    def cerrar_sesion(self, sesion):
+        with self._lock:
+            self.sesiones.pop(sesion.id, None)
+        try:
+            sesion.cerrar()
+        except sqlite3.Error:
+            pass
+
+    def interrumpir(self, id_sesion, clave):
+        with self._lock:
+            sesion = self.sesiones.get(id_sesion)
+        if sesion is None or not hmac.compare_digest(str(clave), sesion.clave):
+            return False
+        self.contar('interrupciones')
+        sesion.conn.interrupt()
+        return True
+
+
+def activar_keepalive(sock, inactivo=60, intervalo=10, intentos=5):
+    """Sondeos TCP para detectar clientes caídos sin esperar la inactividad"""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for opcion, valor in (('TCP_KEEPIDLE', inactivo), ('TCP_KEEPINTVL', intervalo), ('TCP_KEEPCNT', intentos)):
+        if hasattr(socket, opcion):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opcion), valor)
+            except OSError:
+                pass
+
+
+class ManejadorCliente(socketserver.BaseRequestHandler):
+    """Atiende un socket: primero 'hola' (o 'interrumpir'), luego lotes de solicitudes"""
+
+    def handle(self):
+        servicio = self.server.servicio
+        sock = self.request
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            activar_keepalive(sock)
+        # Un cliente que desaparece sin cerrar no retiene su sesión (ni su transacción)
+        sock.settimeout(servicio.inactividad)
+        sesion = None
+        try:
+            while True:
+                try:
+                    solicitudes = leer_trama(sock, TRAMA_MAXIMA if sesion else TRAMA_MAXIMA_INICIAL)
+                except socket.timeout:
+                    servicio.contar('inactivas')
+                    return
+                except sqlite3.Error as e:
+                    enviar_trama(sock, [False, [['error', type(e).__name__, str(e)]]])
+                    return
+                if solicitudes is None or not isinstance(solicitudes, list):
+                    return
+                servicio.contar('tramas')
+                resultados = []
+                for solicitud in solicitudes:
+                    try:
+                        if not (isinstance(solicitud, (list, tuple)) and solicitud
+                                and isinstance(solicitud[0], str)):
+                            raise sqlite3.ProgrammingError("Solicitud inválida: se esperaba [op, *args]")
+                        op, args = solicitud[0], solicitud[1:]
+                        if op == 'adios':
+                            return
+                        servicio.contar('solicitudes')
+                        if sesion is None:
+                            if op == 'hola':
+                                sesion = servicio.abrir_sesion(*args)
+                                valor = [sesion.id, sesion.clave]
+                            elif op == 'interrumpir':
+                                valor = servicio.interrumpir(*args)
+                            else:
+                                raise sqlite3.ProgrammingError("Sesión no iniciada: falta 'hola'")
+                        else:
+                            valor = self.atender(sesion, op, args)
+                    except Exception as e:
+                        servicio.contar('errores')
+                        clase = type(e).__name__ if isinstance(e, sqlite3.Error) else 'DatabaseError'
+                        resultados.append(['error', clase, str(e)])
+                        break
+                    resultados.append(['ok', valor])
+                en_transaccion = sesion.conn.in_transaction if sesion else False
+                enviar_trama(sock, [en_transaccion, resultados])
+                if sesion is None:
+                    return      # Handshake fallido o 'interrumpir': no hay más que hacer
+        except OSError:
+            pass
+        finally:
+            if sesion is not None:
+                servicio.cerrar_sesion(sesion)
+
+    def atender(self, sesion, op, args):
+        if op == 'ejecutar':
+            return sesion.ejecutar(*args)
+        if op == 'traer':
+            return sesion.traer(*args)
+        if op == 'cerrar':
+            sesion.cerrar_cursor(*args)
+            return None
+        if op == 'muchos':
+            sql, filas = args
+            cursor = sesion.conn.executemany(sql, filas)
+            return [cursor.lastrowid, cursor.rowcount]
+        if op == 'commit':
+            sesion.conn.commit()
+            return None
+        if op == 'rollback':
+            sesion.conn.rollback()
+            return None
+        raise sqlite3.ProgrammingError(f"Operación desconocida: {op}")
+
+
+class ServidorTCP(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def crear_servidor(direccion, servicio):
+    """Servidor escuchando en 'host:puerto' o 'unix:/ruta'"""
+    if direccion.startswith("unix:"):
+        ruta = direccion[5:]
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        servidor = ServidorUnix(ruta, ManejadorCliente)
+    else:
+        host, _, puerto = direccion.rpartition(":")
+        servidor = ServidorTCP((host or "127.0.0.1", int(puerto)), ManejadorCliente)
+    servidor.servicio = servicio
+    return servidor
+
+
+def main():
+    config = cargar_configuracion()
+    parser = argparse.ArgumentParser(description="Servicio de datos JURMAQ (dueño del archivo SQLite)")
+    parser.add_argument("--db", help="Ruta del archivo SQLite (por defecto el de la configuración)")
+    parser.add_argument("--escuchar", default=config.get('servidor_direccion', "127.0.0.1:8765"),
+                        help="'host:puerto' o 'unix:/ruta/al.sock' (por defecto %(default)s)")
+    parser.add_argument("--token", default=os.environ.get("JURMAQ_TOKEN", config.get('servidor_token', "")),
+                        help="Clave que deben presentar los clientes (o variable JURMAQ_TOKEN)")
+    parser.add_argument("--max-sesiones", type=int, default=64)
+    parser.add_argument("--inactividad", type=float, default=config.get('servidor_inactividad', 600),
+                        help="Segundos sin tramas antes de cerrar y revertir una sesión (0: nunca)")
+    args = parser.parse_args()
+
+    # El servidor siempre abre el archivo localmente
+    config['modo_datos'] = 'local'
+    db = DatabaseManager(args.db, config)
+    servicio = ServicioDatos(db, args.token, args.max_sesiones, args.inactividad)
+    servidor = crear_servidor(args.escuchar, servicio)
+
+    if not args.token and not args.escuchar.startswith(("unix:", "127.0.0.1:", "localhost:")):
+        print("⚠️  Escuchando en la red sin --token: cualquiera que llegue al puerto puede leer y escribir")
+    print(f"🗄️  Servicio de datos JURMAQ: {os.path.abspath(db.db_path)} en {args.escuchar}")
+    inicio = time.monotonic()
+    # Detener igual con Ctrl+C que con SIGTERM (servicio del sistema)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        for sesion in list(servicio.sesiones.values()):
+            servicio.cerrar_sesion(sesion)
+        DatabaseManager.cerrar_pools()
+        e = servicio.estadisticas
+        print(f"\n⏹️  {e['sesiones']} sesiones, {e['solicitudes']:,} solicitudes en "
+              f"{e['tramas']:,} tramas, {e['errores']} errores, {e['inactivas']} cerradas por inactividad ({time.monotonic() - inicio:.0f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures comunes de las pruebas JURMAQ: cada prueba trabaja sobre bases
+SQLite nuevas en un directorio temporal y al terminar se cierran los pools
+compartidos por DatabaseManager.
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def configuracion(tmp_path):
+    """Configuración por defecto con los archivos auxiliares dentro de tmp_path"""
+    return dict(main.CONFIG_POR_DEFECTO,
+                sql_log_lentas=str(tmp_path / "consultas_lentas.log"),
+                perfil_pragma='rendimiento')
+
+
+@pytest.fixture
+def crear_db(tmp_path, configuracion):
+    """Fábrica de DatabaseManager sobre archivos de tmp_path ('jurmaq.db' por defecto)"""
+    def crear(nombre="jurmaq.db", **ajustes):
+        return main.DatabaseManager(str(tmp_path / nombre), dict(configuracion, **ajustes))
+    yield crear
+    main.DatabaseManager.cerrar_pools()
+
+
+@pytest.fixture
+def db(crear_db):
+    return crear_db()
+
+
+def insertar_presupuesto(conn, numero, cliente="Cliente", monto=1000, estado="Borrador"):
+    """Alta mínima de un presupuesto; devuelve su id"""
+    return conn.execute(
+        "INSERT INTO presupuestos (numero_presupuesto, cliente, proyecto, monto_total, estado) "
+        "VALUES (?, ?, 'Proyecto', ?, ?)", (numero, cliente, monto, estado)).lastrowid
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Caché de consultas por generación de tabla (QueryCache y DatabaseManager.consultar)"""
+
+import sqlite3
+
+import main
+from conftest import insertar_presupuesto
+
+CONTAR_PRESUPUESTOS = "SELECT COUNT(*) FROM presupuestos"
+CONTAR_VEHICULOS = "SELECT COUNT(*) FROM vehiculos"
+
+
+def contadores(db):
+    datos = db.cache.resumen()
+    return datos['aciertos'], datos['fallos'], datos['invalidadas']
+
+
+def test_la_segunda_lectura_sale_del_cache(db):
+    assert db.consultar(CONTAR_PRESUPUESTOS) == [(0,)]
+    assert db.consultar(CONTAR_PRESUPUESTOS) == [(0,)]
+    assert contadores(db) == (1, 1, 0)
+    # Los parámetros son parte de la clave
+    db.consultar("SELECT id FROM presupuestos WHERE estado = ?", ("Borrador",))
+    db.consultar("SELECT id FROM presupuestos WHERE estado = ?", ("Aprobado",))
+    assert contadores(db) == (1, 3, 0)
+
+
+def test_escribir_en_la_tabla_invalida_solo_sus_consultas(db):
+    db.consultar(CONTAR_PRESUPUESTOS)
+    db.consultar(CONTAR_VEHICULOS)
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1")
+
+    assert db.consultar(CONTAR_PRESUPUESTOS) == [(1,)]
+    assert db.consultar(CONTAR_VEHICULOS) == [(0,)]
+    assert contadores(db) == (1, 3, 1)
+
+
+def test_escritura_de_otro_proceso(db):
+    db.consultar(CONTAR_PRESUPUESTOS)
+    # Una conexión que no pasa por el gestor (otro proceso, sqlite3 de consola...)
+    ajena = sqlite3.connect(db.db_path, isolation_level=None)
+    try:
+        insertar_presupuesto(ajena, "PRES-AJENO")
+    finally:
+        ajena.close()
+    assert db.consultar(CONTAR_PRESUPUESTOS) == [(1,)]
+
+
+def test_fresco_no_usa_el_cache(db):
+    db.consultar(CONTAR_PRESUPUESTOS)
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1")
+        # Dentro de la transacción sin confirmar el caché no ve la escritura
+        assert db.consultar(CONTAR_PRESUPUESTOS, conn=conn, fresco=True) == [(1,)]
+    assert contadores(db) == (0, 1, 0)
+
+
+def test_consultas_sin_tablas_con_generacion_no_se_guardan(db):
+    db.consultar("SELECT valor FROM meta")
+    db.consultar("SELECT 1")
+    assert db.cache.resumen()['entradas'] == 0
+
+
+def test_registros_desde_el_cache(db):
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1", cliente="Constructora")
+
+    class Fila(main.Registro):
+        __slots__ = ('numero_presupuesto', 'cliente')
+
+    sql = "SELECT numero_presupuesto, cliente FROM presupuestos"
+    primera = db.consultar(sql, registro=Fila)
+    segunda = db.consultar(sql, registro=Fila)
+    assert [f.cliente for f in primera] == [f.cliente for f in segunda] == ["Constructora"]
+    assert contadores(db) == (1, 1, 0)
+
+
+def test_presupuesto_en_bytes_descarta_lo_menos_usado(db):
+    with db.conexion() as conn:
+        for i in range(20):
+            insertar_presupuesto(conn, f"PRES-{i}")
+    # Resultados del mismo tamaño: caben cuatro
+    sql = "SELECT numero_presupuesto FROM presupuestos WHERE numero_presupuesto = ?"
+    tamaño = main.tamaño_filas(db.consultar(sql, ("PRES-10",), fresco=True))
+    cache = main.QueryCache(db.db_path, tamaño * 4, db.pool.conectar)
+    try:
+        def leer(numero):
+            return cache.obtener(sql, (numero,), lambda: db.consultar(sql, (numero,), fresco=True))
+
+        for i in range(10, 15):
+            leer(f"PRES-{i}")
+        assert cache.resumen()['entradas'] == 4
+        assert cache.resumen()['bytes'] <= tamaño * 4
+        leer("PRES-14")                         # El más reciente sigue
+        assert cache.resumen()['aciertos'] == 1
+        leer("PRES-10")                         # El más antiguo salió
+        assert cache.resumen()['aciertos'] == 1
+
+        # Un resultado mayor que la cuarta parte del presupuesto no se guarda
+        antes = cache.resumen()['entradas']
+        cache.obtener("SELECT * FROM presupuestos", (),
+                      lambda: db.consultar("SELECT * FROM presupuestos", fresco=True))
+        assert cache.resumen()['entradas'] == antes
+    finally:
+        cache.close()
+
+
+def test_cache_desactivado(crear_db):
+    db = crear_db(cache_consultas_mb=0)
+    db.consultar(CONTAR_PRESUPUESTOS)
+    db.consultar(CONTAR_PRESUPUESTOS)
+    assert db.cache.resumen()['entradas'] == 0
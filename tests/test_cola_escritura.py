@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Cola de escritura con un único hilo escritor (WriteQueue)"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import insertar_presupuesto
+
+
+@pytest.fixture
+def escritor(crear_db):
+    # Transacciones largas: los comandos encolados mientras una está abierta entran en ella
+    db = crear_db(escritura_lote_ms=5000, escritura_lote_max=50)
+    return db.escritor
+
+
+def numeros(escritor):
+    with escritor.db.conexion() as conn:
+        return {n for (n,) in conn.execute("SELECT numero_presupuesto FROM presupuestos")}
+
+
+def encolar_tras_bloqueo(escritor, comandos):
+    """Encolar 'comandos' mientras el primero del lote espera: todos van en la misma transacción"""
+    abierta, seguir = threading.Event(), threading.Event()
+
+    def primero(conn, cambios):
+        abierta.set()
+        seguir.wait(5)
+        return insertar_presupuesto(conn, "PRES-PRIMERO")
+
+    futuros = [escritor.enviar(primero)]
+    assert abierta.wait(5)
+    futuros.extend(escritor.enviar(funcion, *args) for funcion, args in comandos)
+    seguir.set()
+    return futuros
+
+
+def test_agrupa_los_comandos_encolados_en_una_transaccion(escritor):
+    def alta(conn, cambios, numero):
+        return insertar_presupuesto(conn, numero)
+
+    futuros = encolar_tras_bloqueo(escritor, [(alta, (f"PRES-{i}",)) for i in range(10)])
+    ids = [futuro.result(5) for futuro in futuros]
+    assert len(set(ids)) == 11
+    datos = escritor.resumen()
+    assert (datos['transacciones'], datos['lote_maximo'], datos['comandos']) == (1, 11, 11)
+
+
+def test_el_lote_no_supera_el_maximo(escritor):
+    escritor.max_lote = 4
+
+    def alta(conn, cambios, numero):
+        return insertar_presupuesto(conn, numero)
+
+    futuros = encolar_tras_bloqueo(escritor, [(alta, (f"PRES-{i}",)) for i in range(9)])
+    for futuro in futuros:
+        futuro.result(5)
+    assert escritor.resumen()['lote_maximo'] == 4
+    assert escritor.resumen()['transacciones'] == 3
+
+
+def test_un_comando_fallido_solo_deshace_lo_suyo(escritor):
+    def alta(conn, cambios, numero):
+        return insertar_presupuesto(conn, numero)
+
+    def alta_y_falla(conn, cambios):
+        insertar_presupuesto(conn, "PRES-DESHECHO")
+        raise ValueError("regla de negocio")
+
+    futuros = encolar_tras_bloqueo(escritor, [(alta, ("PRES-A",)), (alta_y_falla, ()), (alta, ("PRES-B",))])
+    assert futuros[1].result(5) and futuros[3].result(5)
+    with pytest.raises(ValueError, match="regla de negocio"):
+        futuros[2].result(5)
+    assert numeros(escritor) == {"PRES-PRIMERO", "PRES-A", "PRES-B"}
+    assert escritor.resumen()['transacciones'] == 1
+    assert escritor.resumen()['fallidos'] == 1
+
+
+def test_error_de_restriccion_en_el_lote(escritor):
+    def alta(conn, cambios, numero):
+        return insertar_presupuesto(conn, numero)
+
+    futuros = encolar_tras_bloqueo(escritor, [(alta, ("PRES-X",)), (alta, ("PRES-X",))])
+    futuros[1].result(5)
+    with pytest.raises(sqlite3.IntegrityError):
+        futuros[2].result(5)
+    assert numeros(escritor) == {"PRES-PRIMERO", "PRES-X"}
+
+
+def test_un_error_inesperado_falla_el_lote_y_el_escritor_sigue(escritor, monkeypatch):
+    def alta(conn, cambios, numero):
+        return insertar_presupuesto(conn, numero)
+
+    def falla(*args):
+        raise RuntimeError("conexión perdida")
+
+    monkeypatch.setattr(escritor.db.seguimiento, 'registrar_propios', falla)
+    futuros = encolar_tras_bloqueo(escritor, [(alta, (f"PRES-{i}",)) for i in range(3)])
+    for futuro in futuros:
+        with pytest.raises(RuntimeError, match="conexión perdida"):
+            futuro.result(5)
+    monkeypatch.undo()
+
+    assert escritor.ejecutar(alta, "PRES-DESPUES", timeout=5)
+    assert numeros(escritor) == {"PRES-DESPUES"}
+    assert escritor.resumen()['reconexiones'] == 1
+    assert escritor.hilo.is_alive()
+
+
+def test_falla_al_conectar_no_detiene_el_escritor(escritor, monkeypatch):
+    def falla(**opciones):
+        raise sqlite3.OperationalError("sin acceso al archivo")
+
+    # Forzar una conexión nueva para el siguiente comando
+    escritor.ejecutar(lambda conn, cambios: None, timeout=5)
+    escritor._reabrir = True
+    escritor.ejecutar(lambda conn, cambios: None, timeout=5)
+    monkeypatch.setattr(escritor.db.pool, 'conectar', falla)
+    with pytest.raises(sqlite3.OperationalError, match="sin acceso"):
+        escritor.ejecutar(lambda conn, cambios: None, timeout=5)
+    monkeypatch.undo()
+    assert escritor.ejecutar(lambda conn, cambios: 42, timeout=5) == 42
+
+
+def test_cerrada_rechaza_comandos(escritor):
+    escritor.cerrar()
+    assert not escritor.hilo.is_alive()
+    with pytest.raises(sqlite3.ProgrammingError, match="cerrada"):
+        escritor.enviar(lambda conn, cambios: None)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Importación con upsert sobre la clave de negocio (DatabaseManager.importar_archivo)"""
+
+import csv
+import json
+
+import pytest
+
+import main
+from conftest import insertar_presupuesto
+
+
+def escribir_csv(ruta, filas, separador=","):
+    with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+        csv.writer(archivo, delimiter=separador).writerows(filas)
+    return str(ruta)
+
+
+def leer(db, sql):
+    with db.conexion() as conn:
+        return [tuple(fila) for fila in conn.execute(sql)]
+
+
+def test_inserta_lo_nuevo_y_actualiza_lo_existente(db, tmp_path):
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1", cliente="Antiguo", monto=500)
+    ruta = escribir_csv(tmp_path / "presupuestos.csv", [
+        ["N° Presupuesto", "Cliente", "Proyecto", "Monto"],
+        ["PRES-1", "Renovado", "Obra", ""],          # Celda vacía: conserva el monto
+        ["PRES-2", "Nuevo", "Obra", "$1.234.567"],
+    ])
+
+    resultado = db.importar_archivo('presupuestos', ruta)
+    assert (resultado.leidas, resultado.insertadas, resultado.actualizadas, resultado.rechazadas) == (2, 1, 1, 0)
+    assert leer(db, "SELECT numero_presupuesto, cliente, monto_total, estado FROM presupuestos "
+                    "ORDER BY numero_presupuesto") == [
+        ("PRES-1", "Renovado", 500, "Borrador"),
+        ("PRES-2", "Nuevo", 1234567, "Borrador"),
+    ]
+
+
+def test_reimportar_el_mismo_archivo_no_duplica(db, tmp_path):
+    ruta = escribir_csv(tmp_path / "presupuestos.csv", [
+        ["numero_presupuesto", "cliente", "proyecto"],
+        *([f"PRES-{i}", "Cliente", "Obra"] for i in range(5)),
+    ])
+    assert db.importar_archivo('presupuestos', ruta).insertadas == 5
+    segunda = db.importar_archivo('presupuestos', ruta)
+    assert (segunda.insertadas, segunda.actualizadas) == (0, 5)
+    assert leer(db, "SELECT COUNT(*) FROM presupuestos") == [(5,)]
+
+
+def test_rechazos_con_numero_de_linea_y_archivo(db, tmp_path):
+    ruta = escribir_csv(tmp_path / "vehiculos.csv", [
+        ["Patente", "Marca", "Modelo", "Año"],
+        ["bcdf12", "Toyota", "Hilux", "2020"],
+        ["no-es-patente", "Ford", "Ranger", "2019"],
+        ["AB 1234", "Nissan", "NP300", "dos mil"],
+        ["", "Sin", "Patente", "2018"],
+    ], separador=";")
+    rechazos = tmp_path / "rechazos.csv"
+
+    resultado = db.importar_archivo('vehiculos', ruta, ruta_rechazos=str(rechazos))
+    assert (resultado.insertadas, resultado.rechazadas) == (1, 3)
+    assert [linea for linea, _ in resultado.rechazos] == [3, 4, 5]
+    assert "patente inválida" in resultado.rechazos[0][1]
+    assert "monto inválido" in resultado.rechazos[1][1]
+    assert leer(db, "SELECT patente, estado, kilometraje FROM vehiculos") == [("BC-DF-12", "Disponible", 0)]
+
+    with open(rechazos, encoding="utf-8-sig", newline="") as archivo:
+        filas = list(csv.reader(archivo))
+    assert filas[0] == ["linea", "motivo", "datos"]
+    assert [fila[0] for fila in filas[1:]] == ["3", "4", "5"]
+    assert json.loads(filas[1][2])[0] == "no-es-patente"
+
+
+def test_obligatorias_vacias_solo_se_rechazan_al_insertar(db, tmp_path):
+    with db.conexion() as conn:
+        conn.execute("INSERT INTO empleados (rut, nombre, apellido, cargo) "
+                     "VALUES ('12.345.678-5', 'Ana', 'Pérez', 'Operaria')")
+    ruta = escribir_csv(tmp_path / "empleados.csv", [
+        ["RUT", "Nombre", "Apellido", "Cargo"],
+        ["12345678-5", "", "", "Supervisora"],      # Existe: las celdas vacías no borran
+        ["11.111.111-1", "", "Soto", "Chofer"],     # Nueva sin nombre
+        ["11.111.111-2", "Luis", "Soto", "Chofer"], # Dígito verificador incorrecto
+    ])
+    resultado = db.importar_archivo('empleados', ruta)
+    assert (resultado.insertadas, resultado.actualizadas) == (0, 1)
+    assert resultado.rechazos == [(3, "nombre vacío"),
+                                  (4, "RUT con dígito verificador incorrecto: '11.111.111-2'")]
+    assert leer(db, "SELECT rut, nombre, cargo FROM empleados") == [("12.345.678-5", "Ana", "Supervisora")]
+
+
+def test_clave_repetida_dentro_del_archivo(db, tmp_path):
+    ruta = escribir_csv(tmp_path / "inventario.csv", [
+        ["Código", "Producto", "Stock"],
+        ["P-1", "Perno", "10"],
+        ["P-1", "Perno M8", "12"],
+    ])
+    resultado = db.importar_archivo('inventario', ruta)
+    assert (resultado.insertadas, resultado.actualizadas) == (1, 1)
+    assert leer(db, "SELECT nombre_producto, stock_actual FROM inventario") == [("Perno M8", 12)]
+
+
+def test_transacciones_por_tramos_y_progreso(db, tmp_path):
+    ruta = escribir_csv(tmp_path / "ordenes.csv", [
+        ["numero_oc", "proveedor", "monto_total"],
+        *([f"OC-{i}", "Proveedor", str(i)] for i in range(25)),
+    ])
+    with db.conexion() as conn:
+        inicio = db.ultimo_cambio(conn)
+    avance = []
+    resultado = db.importar_archivo('ordenes_compra', ruta, lote=4, transaccion=8, al_progreso=avance.append)
+    assert resultado.insertadas == 25
+    assert avance == [4, 8, 12, 16, 20, 24]
+    assert leer(db, "SELECT COUNT(*), SUM(monto_total) FROM ordenes_compra") == [(25, sum(range(25)))]
+    assert len(db.leer_cambios(inicio).cambios) == 25
+
+
+def test_faltan_columnas_obligatorias(db, tmp_path):
+    ruta = escribir_csv(tmp_path / "presupuestos.csv", [["numero_presupuesto", "cliente"], ["PRES-1", "X"]])
+    with pytest.raises(main.ErrorImportacion, match="proyecto"):
+        db.importar_archivo('presupuestos', ruta)
+    assert leer(db, "SELECT COUNT(*) FROM presupuestos") == [(0,)]
+
+
+def test_tabla_no_importable(db, tmp_path):
+    with pytest.raises(ValueError, match="no admite"):
+        db.importar_archivo('usuarios', str(tmp_path / "x.csv"))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Migraciones del esquema con PRAGMA user_version"""
+
+import sqlite3
+
+import pytest
+
+import main
+from conftest import insertar_presupuesto
+
+
+def version(db):
+    with db.conexion() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def tablas(db):
+    with db.conexion() as conn:
+        return {n for (n,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def base_en_version(ruta, hasta):
+    """Archivo con solo las migraciones 1..hasta aplicadas, como lo dejó una versión anterior"""
+    conn = sqlite3.connect(str(ruta), isolation_level=None)
+    for numero, _, sentencias in main.MIGRACIONES[:hasta]:
+        for sql in (sentencias(conn) if callable(sentencias) else sentencias):
+            conn.execute(sql)
+    conn.execute(f"PRAGMA user_version = {hasta}")
+    return conn
+
+
+def test_base_nueva_llega_a_la_ultima_version(db):
+    assert version(db) == main.VERSION_ESQUEMA
+    assert {'presupuestos', 'meta', 'metricas', 'generaciones', 'cambios'} <= tablas(db)
+
+
+def test_reabrir_no_repite_migraciones(crear_db, monkeypatch):
+    crear_db()
+    main.DatabaseManager.cerrar_pools()
+    # Como en un proceso nuevo: el esquema se vuelve a verificar
+    monkeypatch.setattr(main.DatabaseManager, '_esquemas_listos', set())
+
+    def no_llamar(self, conn, version_actual):
+        raise AssertionError(f"migró de nuevo desde la versión {version_actual}")
+
+    monkeypatch.setattr(main.DatabaseManager, 'aplicar_migraciones', no_llamar)
+    assert version(crear_db()) == main.VERSION_ESQUEMA
+
+
+def test_las_ya_aplicadas_por_otro_proceso_se_saltan(db):
+    # Versión leída antes de que otro proceso migrara: cada paso revisa user_version
+    with db.conexion() as conn:
+        db.aplicar_migraciones(conn, 0)
+    assert version(db) == main.VERSION_ESQUEMA
+
+
+def test_base_antigua_migra_conservando_los_datos(tmp_path, crear_db):
+    conn = base_en_version(tmp_path / "antigua.db", 3)
+    for i in range(3):
+        insertar_presupuesto(conn, f"PRES-{i}", monto=100 * (i + 1), estado="Aprobado")
+    conn.close()
+
+    db = crear_db("antigua.db")
+    assert version(db) == main.VERSION_ESQUEMA
+    with db.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM presupuestos").fetchone()[0] == 3
+        # Las migraciones 4 y 9 parten de lo que ya había
+        assert tuple(conn.execute("SELECT cantidad, suma FROM metricas "
+                                  "WHERE tabla = 'presupuestos' AND estado = 'Aprobado'").fetchone()) == (3, 600)
+        assert conn.execute("SELECT COUNT(*) FROM cambios WHERE tabla = 'presupuestos'").fetchone()[0] == 3
+
+
+def test_migracion_fallida_se_deshace(db, monkeypatch):
+    siguiente = main.VERSION_ESQUEMA + 1
+    monkeypatch.setattr(main, 'MIGRACIONES', main.MIGRACIONES + [
+        (siguiente, "Migración defectuosa", [
+            "CREATE TABLE a_medias (id INTEGER PRIMARY KEY)",
+            "ALTER TABLE tabla_que_no_existe ADD COLUMN x TEXT",
+        ]),
+    ])
+    with db.conexion() as conn:
+        with pytest.raises(sqlite3.DatabaseError, match=f"migración {siguiente} \\(Migración defectuosa\\)"):
+            db.aplicar_migraciones(conn, main.VERSION_ESQUEMA)
+        assert not conn.in_transaction
+    assert version(db) == main.VERSION_ESQUEMA
+    assert 'a_medias' not in tablas(db)
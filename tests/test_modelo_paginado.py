@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Aplicación de cambios de fila en PagedTableModel sin recargar el listado"""
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+
+@pytest.fixture(scope="module")
+def aplicacion():
+    return QApplication.instance() or QApplication([])
+
+
+def presupuesto(id_, fecha, estado="Borrador", numero=None):
+    return main.PresupuestoListado(id_, numero or f"PRES-{id_}", "Cliente", "Proyecto", 1000, estado, fecha)
+
+
+def fecha(dia):
+    return f"2025-01-{dia:02d} 10:00:00"
+
+
+@pytest.fixture
+def crear_modelo(aplicacion, db):
+    """Modelo de presupuestos con 'filas' días cargados (el más nuevo arriba)"""
+    db._ejecutor = main.QueryExecutor(db, sincrono=True)
+
+    def crear(filas=10, tamaño_pagina=20, filtros=None):
+        with db.conexion() as conn:
+            for dia in range(1, filas + 1):
+                conn.execute("INSERT INTO presupuestos (id, numero_presupuesto, cliente, proyecto, monto_total, "
+                             "estado, fecha_creacion) VALUES (?, ?, 'Cliente', 'Proyecto', 1000, 'Borrador', ?)",
+                             (dia, f"PRES-{dia}", fecha(dia * 2)))
+        modelo = main.PagedTableModel(db, 'presupuestos', [("N°", 'numero_presupuesto', None)],
+                                      filtros=filtros, tamaño_pagina=tamaño_pagina)
+        modelo.fetchMore()
+        return modelo
+    return crear
+
+
+def aplicar(modelo, op, id_, fila=None):
+    modelo.aplicar_cambios([main.Cambio('presupuestos', op, id_, fila)])
+
+
+def test_alta_en_su_lugar_del_orden(crear_modelo):
+    modelo = crear_modelo()
+    assert modelo._ids == list(range(10, 0, -1))
+    aplicar(modelo, 'insert', 50, presupuesto(50, fecha(7)))     # Entre el día 8 (id 4) y el 6 (id 3)
+    assert modelo._ids[:9] == [10, 9, 8, 7, 6, 5, 4, 50, 3]
+    aplicar(modelo, 'insert', 51, presupuesto(51, fecha(30)))    # La más nueva: arriba
+    assert modelo.id_en_fila(0) == 51
+    assert modelo.rowCount() == 12
+    assert modelo._claves == sorted(modelo._claves, reverse=True)
+
+
+def test_alta_repetida_se_ignora(crear_modelo):
+    modelo = crear_modelo()
+    aplicar(modelo, 'insert', 3, presupuesto(3, fecha(6)))
+    assert modelo.rowCount() == 10
+
+
+def test_alta_fuera_de_lo_cargado_espera_su_pagina(crear_modelo):
+    modelo = crear_modelo(filas=10, tamaño_pagina=5)
+    assert (modelo.rowCount(), modelo._fin) == (5, False)
+    aplicar(modelo, 'insert', 50, presupuesto(50, fecha(1)))     # Más vieja que todo lo cargado
+    assert modelo.rowCount() == 5
+
+
+def test_alta_que_no_cumple_el_filtro(crear_modelo):
+    modelo = crear_modelo(filtros={'estado': 'Borrador'})
+    aplicar(modelo, 'insert', 50, presupuesto(50, fecha(30), estado="Aprobado"))
+    assert 50 not in modelo._ids
+
+
+def test_baja_de_una_fila_no_cargada_no_cambia_el_conteo(crear_modelo):
+    modelo = crear_modelo()
+    modelo.total_estimado = 10
+    aplicar(modelo, 'delete', 999)
+    assert (modelo.rowCount(), modelo.total_estimado) == (10, 10)
+    aplicar(modelo, 'delete', 4)
+    assert (modelo.rowCount(), modelo.total_estimado) == (9, 9)
+    assert 4 not in modelo._ids and len(modelo._claves) == 9
+
+
+def test_modificacion_que_cambia_la_clave_de_orden_mueve_la_fila(crear_modelo):
+    modelo = crear_modelo()
+    aplicar(modelo, 'update', 2, presupuesto(2, fecha(25), numero="PRES-2B"))
+    assert modelo._ids[:2] == [2, 10]
+    assert modelo.fila(0).numero_presupuesto == "PRES-2B"
+    assert modelo.rowCount() == 10
+    assert modelo._claves == sorted(modelo._claves, reverse=True)
+
+
+def test_modificacion_en_el_lugar(crear_modelo):
+    modelo = crear_modelo()
+    cambiadas = []
+    modelo.dataChanged.connect(lambda desde, hasta: cambiadas.append((desde.row(), hasta.row())))
+    aplicar(modelo, 'update', 7, presupuesto(7, fecha(14), numero="PRES-7B"))
+    assert modelo._ids == list(range(10, 0, -1))
+    assert cambiadas == [(3, 3)]
+    assert modelo.fila(3).numero_presupuesto == "PRES-7B"
+
+
+def test_modificacion_que_sale_del_filtro(crear_modelo):
+    modelo = crear_modelo(filtros={'estado': 'Borrador'})
+    aplicar(modelo, 'update', 5, presupuesto(5, fecha(10), estado="Aprobado"))
+    assert 5 not in modelo._ids and modelo.rowCount() == 9
+
+
+def test_cambios_de_otra_tabla_o_recarga(crear_modelo):
+    modelo = crear_modelo()
+    modelo.aplicar_cambios([main.Cambio('ordenes_compra', 'delete', 3, None)])
+    assert modelo.rowCount() == 10
+    aplicar(modelo, 'delete', 3)
+    aplicar(modelo, 'reload', None)
+    assert modelo._ids == list(range(10, 0, -1))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Planes de consulta con volumen: ninguna consulta registrada recorre tablas grandes"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import generar_datos
+
+UMBRAL = 200
+
+
+@pytest.fixture
+def db_con_volumen(db):
+    """Tablas por sobre el umbral, llenadas y analizadas como lo hace generar_datos.py"""
+    fechas = generar_datos.Fechas(datetime(2020, 1, 1), datetime(2025, 12, 31))
+    conn = sqlite3.connect(db.db_path, isolation_level=None)
+    try:
+        for tabla in generar_datos.TABLAS:
+            generar_datos.generar_tabla(conn, tabla, UMBRAL * 3, 2025, fechas, lote=100, por_transaccion=300)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return db
+
+
+def test_todas_las_consultas_usan_indices(db_con_volumen):
+    with db_con_volumen.conexion() as conn:
+        for tabla in generar_datos.TABLAS:
+            assert conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0] > UMBRAL
+    assert db_con_volumen.verificar_planes(umbral_filas=UMBRAL) == []
+
+
+def test_detecta_recorridos_y_ordenes_sin_indice(db_con_volumen):
+    consultas = {
+        'por_descripcion': "SELECT id FROM presupuestos WHERE descripcion = 'x'",
+        'ordenar_por_monto': "SELECT id FROM ordenes_compra ORDER BY monto_total LIMIT 10",
+    }
+    problemas = db_con_volumen.verificar_planes(umbral_filas=UMBRAL, consultas=consultas)
+    assert {(p['consulta'], p['tabla'], p['filas']) for p in problemas} == {
+        ('por_descripcion', 'presupuestos', UMBRAL * 3),
+        ('ordenar_por_monto', 'ordenes_compra', UMBRAL * 3),
+    }
+
+
+def test_bajo_el_umbral_no_se_informa(db):
+    assert db.verificar_planes(umbral_filas=UMBRAL) == []
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Pool de conexiones con afinidad por hilo (ConnectionPool)"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def crear_pool(tmp_path):
+    """Pools sobre un archivo de tmp_path; se cierran al terminar la prueba"""
+    ruta = str(tmp_path / "pool.db")
+    with sqlite3.connect(ruta) as conn:
+        conn.execute("CREATE TABLE numeros (n INTEGER)")
+    conn.close()
+    pools = []
+
+    def crear(**opciones):
+        pools.append(main.ConnectionPool(ruta, **opciones))
+        return pools[-1]
+    yield crear
+    for pool in pools:
+        pool.close()
+
+
+def en_hilo(funcion):
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(funcion()))
+    hilo.start()
+    hilo.join(5)
+    return resultado[0]
+
+
+def test_cada_hilo_recupera_su_conexion(crear_pool):
+    pool = crear_pool(max_conexiones=4)
+    propia = pool.acquire()
+    ajena = en_hilo(pool.acquire)
+    pool.release(ajena)
+    pool.release(propia)
+
+    # La de este hilo quedó debajo en la lista de libres y aun así es la que vuelve
+    assert pool.acquire() is propia
+    assert en_hilo(pool.acquire) is ajena
+    datos = pool.resumen()
+    assert (datos['aperturas'], datos['reutilizaciones'], datos['abiertas']) == (2, 2, 2)
+
+
+def test_sin_cupo_espera_hasta_el_limite(crear_pool):
+    pool = crear_pool(max_conexiones=1, timeout_espera=0.2)
+    conn = pool.acquire()
+    inicio = time.monotonic()
+    with pytest.raises(sqlite3.OperationalError, match="máximo 1"):
+        pool.acquire()
+    assert time.monotonic() - inicio >= 0.2
+    assert pool.resumen()['esperas'] >= 1
+    pool.release(conn)
+
+
+def test_la_espera_termina_al_devolver(crear_pool):
+    pool = crear_pool(max_conexiones=1, timeout_espera=5)
+    conn = pool.acquire()
+    threading.Timer(0.1, pool.release, (conn,)).start()
+    assert pool.acquire() is conn
+    assert pool.resumen()['abiertas'] == 1
+
+
+def test_conexion_inactiva_defectuosa_se_descarta(crear_pool):
+    pool = crear_pool(verificacion_salud=0)
+    vieja = pool.acquire()
+    pool.release(vieja)
+    vieja.close()           # Se cerró por debajo mientras estaba libre
+
+    nueva = pool.acquire()
+    assert nueva is not vieja
+    assert nueva.execute("SELECT 1").fetchone() == (1,)
+    datos = pool.resumen()
+    assert (datos['descartadas'], datos['aperturas'], datos['abiertas']) == (1, 2, 1)
+
+
+def test_devolver_revierte_la_transaccion_abierta(crear_pool):
+    pool = crear_pool()
+    conn = pool.acquire()
+    conn.execute("BEGIN")
+    conn.execute("INSERT INTO numeros VALUES (1)")
+    pool.release(conn)
+    with pool.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM numeros").fetchone() == (0,)
+
+
+def test_fallo_al_abrir_libera_el_cupo(crear_pool):
+    def falla(conn):
+        raise sqlite3.OperationalError("pragma rechazado")
+
+    pool = crear_pool(max_conexiones=1, al_abrir=falla)
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError, match="pragma rechazado"):
+            pool.acquire()
+    assert pool.resumen()['abiertas'] == 0
+
+
+def test_checkout_devuelve_con_close(crear_pool):
+    pool = crear_pool()
+    prestada = pool.checkout()
+    prestada.execute("SELECT 1")
+    prestada.close()
+    assert pool.resumen()['libres'] == 1
+    with pytest.raises(sqlite3.ProgrammingError, match="devuelta"):
+        prestada.execute("SELECT 1")
+
+
+def test_cerrado_rechaza_prestamos(crear_pool):
+    pool = crear_pool()
+    en_uso = pool.acquire()
+    pool.release(en_hilo(pool.acquire))
+    pool.close()
+    assert pool.resumen()['abiertas'] == 1          # Solo la prestada sigue abierta
+    with pytest.raises(sqlite3.ProgrammingError, match="cerrado"):
+        pool.acquire()
+    pool.release(en_uso)                            # Al devolverla se cierra
+    assert pool.resumen()['abiertas'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        en_uso.execute("SELECT 1")
+
+
+def test_hilos_concurrentes_respetan_el_maximo(crear_pool):
+    pool = crear_pool(max_conexiones=3, timeout_espera=10)
+    maximo = []
+
+    def trabajar(base):
+        for i in range(20):
+            with pool.conexion() as conn:
+                maximo.append(pool.resumen()['abiertas'])
+                conn.execute("INSERT INTO numeros VALUES (?)", (base + i,))
+
+    hilos = [threading.Thread(target=trabajar, args=(100 * h,)) for h in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(30)
+    with pool.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT n) FROM numeros").fetchone() == (160, 160)
+    assert max(maximo) <= 3
+    assert pool.resumen()['abiertas'] <= 3
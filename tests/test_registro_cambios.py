@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Registro de cambios (CDC): lectura, consumidores, compactación y sondeo de cambios externos"""
+
+from conftest import insertar_presupuesto
+
+
+def posicion(db):
+    with db.conexion() as conn:
+        return db.ultimo_cambio(conn)
+
+
+def escribir(db, *sentencias):
+    with db.conexion() as conn:
+        for sql, params in sentencias:
+            conn.execute(sql, params)
+
+
+def test_anota_altas_modificaciones_y_bajas(db):
+    inicio = posicion(db)
+    with db.conexion() as conn:
+        id_ = insertar_presupuesto(conn, "PRES-1")
+        conn.execute("UPDATE presupuestos SET cliente = 'Otro' WHERE id = ?", (id_,))
+        conn.execute("UPDATE presupuestos SET numero_presupuesto = 'PRES-1B' WHERE id = ?", (id_,))
+        conn.execute("DELETE FROM presupuestos WHERE id = ?", (id_,))
+
+    lote = db.leer_cambios(inicio)
+    assert [(c.op, c.clave, c.clave_anterior) for c in lote.cambios] == [
+        ('insert', 'PRES-1', None),
+        ('update', 'PRES-1', None),
+        ('update', 'PRES-1B', 'PRES-1'),
+        ('delete', 'PRES-1B', None),
+    ]
+    assert {c.id for c in lote.cambios} == {id_}
+    assert (lote.hasta, lote.hay_mas, lote.completo) == (posicion(db), False, True)
+
+
+def test_un_update_que_no_cambia_nada_no_se_anota(db):
+    with db.conexion() as conn:
+        id_ = insertar_presupuesto(conn, "PRES-1")
+    inicio = posicion(db)
+    escribir(db, ("UPDATE presupuestos SET cliente = cliente WHERE id = ?", (id_,)))
+    assert db.leer_cambios(inicio).cambios == []
+
+
+def test_lectura_por_tramos(db):
+    inicio = posicion(db)
+    with db.conexion() as conn:
+        for i in range(5):
+            insertar_presupuesto(conn, f"PRES-{i}")
+
+    leidos, desde = [], inicio
+    while True:
+        lote = db.leer_cambios(desde, limite=2)
+        assert len(lote.cambios) <= 2
+        leidos.extend(lote.cambios)
+        desde = lote.hasta
+        if not lote.hay_mas:
+            break
+    assert [c.clave for c in leidos] == [f"PRES-{i}" for i in range(5)]
+    assert desde == posicion(db)
+
+
+def test_limite_cero_solo_informa_si_hay_pendientes(db):
+    inicio = posicion(db)
+    assert db.leer_cambios(inicio, limite=0).hay_mas is False
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1")
+    for limite in (0, -3):
+        lote = db.leer_cambios(inicio, limite=limite)
+        assert (lote.cambios, lote.hasta, lote.hay_mas) == ([], inicio, True)
+
+
+def test_filtro_de_tablas_avanza_igual(db):
+    inicio = posicion(db)
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1")
+        conn.execute("INSERT INTO meta (clave, valor) VALUES ('x', 'y')")       # meta no se anota
+        conn.execute("INSERT INTO vehiculos (patente, marca, modelo) VALUES ('AB-12', 'M', 'X')")
+    lote = db.leer_cambios(inicio, tablas=['vehiculos'])
+    assert [c.tabla for c in lote.cambios] == ['vehiculos']
+    assert lote.hasta == posicion(db)
+
+
+def test_compactar_respeta_a_los_consumidores(db):
+    inicio = posicion(db)
+    with db.conexion() as conn:
+        for i in range(6):
+            insertar_presupuesto(conn, f"PRES-{i}")
+        conn.execute("UPDATE cambios SET momento = datetime('now', '-2 days')")
+    leido = inicio + 3
+    db.confirmar_cambios("volcado", leido)
+
+    borrados, hasta = db.compactar_cambios(retencion_dias=1, maximo_dias=0)
+    assert hasta == leido
+    assert borrados > 0
+    # El consumidor sigue desde su posición sin perder nada
+    lote = db.leer_cambios(leido)
+    assert lote.completo and [c.clave for c in lote.cambios] == ["PRES-3", "PRES-4", "PRES-5"]
+    # Quien lea desde antes del corte debe releer las tablas
+    assert db.leer_cambios(inicio).completo is False
+
+
+def test_compactar_lo_muy_viejo_aunque_no_se_haya_leido(db):
+    db.confirmar_cambios("olvidado", 0)
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-1")
+        conn.execute("UPDATE cambios SET momento = datetime('now', '-100 days')")
+    ultimo = posicion(db)
+    assert db.compactar_cambios(retencion_dias=7, maximo_dias=90)[1] == ultimo
+    assert db.leer_cambios(0).completo is False
+    with db.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cambios").fetchone()[0] == 0
+    # La secuencia no se reutiliza después de compactar
+    with db.conexion() as conn:
+        insertar_presupuesto(conn, "PRES-2")
+    assert db.leer_cambios(ultimo).cambios[0].seq == ultimo + 1
+
+
+def test_cambios_externos_fila_por_fila(db):
+    assert db.cambios_externos() == []          # La primera llamada toma la posición
+    with db.conexion() as conn:
+        id_ = insertar_presupuesto(conn, "PRES-1")
+    cambios = db.cambios_externos()
+    assert [(c.tabla, c.op, c.id) for c in cambios] == [('presupuestos', 'insert', id_)]
+    assert cambios[0].fila.numero_presupuesto == "PRES-1"
+    assert db.cambios_externos() == []
+
+
+def test_cambios_externos_omite_los_propios(db):
+    db.cambios_externos()
+    db.escritor.ejecutar(lambda conn, cambios: insertar_presupuesto(conn, "PRES-PROPIO"), timeout=5)
+    assert db.cambios_externos() == []
+
+
+def test_cambios_externos_sobre_el_maximo_recarga_la_tabla(crear_db):
+    db = crear_db(cambios_sondeo_max=3)
+    db.cambios_externos()
+    with db.conexion() as conn:
+        for i in range(3):
+            insertar_presupuesto(conn, f"PRES-{i}")
+    # Un tramo propio en medio: el primer tramo ajeno agota justo el máximo
+    db.escritor.ejecutar(lambda conn, cambios: insertar_presupuesto(conn, "PRES-PROPIO"), timeout=5)
+    with db.conexion() as conn:
+        conn.execute("INSERT INTO vehiculos (patente, marca, modelo) VALUES ('AB-12', 'M', 'X')")
+
+    cambios = db.cambios_externos()
+    assert [(c.tabla, c.op) for c in cambios] == [('presupuestos', 'reload'), ('vehiculos', 'reload')]
+    assert db.cambios_externos() == []
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Registros con __slots__ construidos desde las tuplas de las consultas"""
+
+import pytest
+
+import main
+
+
+def test_campos_en_el_orden_de_slots():
+    fila = (7, "PRES-7", "Cliente", "Proyecto", 1000.0, "Borrador", "2025-01-01 00:00:00")
+    registro = main.PresupuestoListado(*fila)
+    assert (registro.id, registro.numero_presupuesto, registro.fecha_creacion) == (7, "PRES-7", fila[-1])
+    assert tuple(registro) == fila
+    assert registro == main.PresupuestoListado.desde_filas([fila])[0]
+    assert not hasattr(registro, '__dict__')
+
+
+@pytest.mark.parametrize("valores", [(1, "PRES-1"), tuple(range(8))])
+def test_cantidad_de_valores_distinta_a_las_columnas(valores):
+    with pytest.raises(TypeError, match="PresupuestoListado espera 7 valores"):
+        main.PresupuestoListado(*valores)
+
+
+def test_columnas_sql():
+    assert main.Vehiculo.columnas_sql.startswith("id, patente")
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Paquetes de replicación entre sitios (replicacion.py)"""
+
+import itertools
+import shutil
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import main
+import replicacion
+from conftest import insertar_presupuesto
+
+
+@pytest.fixture
+def sitios(tmp_path, crear_db):
+    """Dos sitios: 'b' parte de una copia de 'a' y cada uno registró al otro"""
+    a = crear_db("a.db")
+    with a.conexion() as conn:
+        for i in range(3):
+            insertar_presupuesto(conn, f"PRES-{i}", cliente=f"Cliente {i}")
+    main.DatabaseManager.cerrar_pools()
+    shutil.copy(tmp_path / "a.db", tmp_path / "b.db")
+
+    a, b = crear_db("a.db"), crear_db("b.db")
+    ra, rb = replicacion.ReplicationManager(a), replicacion.ReplicationManager(b)
+    ra.configurar_sitio("A")
+    rb.configurar_sitio("B", nuevo=True)
+    ra.registrar_sitio(rb.sitio, "B", desde_actual=True)
+    rb.registrar_sitio(ra.sitio, "A", desde_actual=True)
+    return SimpleNamespace(a=a, b=b, ra=ra, rb=rb, directorio=tmp_path)
+
+
+def enviar(sitios, origen, destino, nombre):
+    """Exportar de origen a destino ('a'/'b') y aplicar el paquete allá"""
+    emisor, receptor = getattr(sitios, "r" + origen), getattr(sitios, "r" + destino)
+    paquete = emisor.exportar_paquete(destino.upper(), str(sitios.directorio / nombre))
+    return paquete, receptor.aplicar_paquete(paquete.ruta)
+
+
+def presupuestos(db):
+    with db.conexion() as conn:
+        return dict(conn.execute("SELECT numero_presupuesto, cliente FROM presupuestos"))
+
+
+_reloj = itertools.count(1)
+
+
+def ejecutar(db, sql, params=(), momento=None):
+    """Escribir en un sitio fechando el cambio anotado con 'momento'.
+
+    Los momentos tienen resolución de un segundo: sin fijarlos, lo escrito
+    aquí empataría con lo que la copia ya tenía y decidiría el id de sitio.
+    Por omisión cada escritura es un segundo más nueva que la anterior.
+    """
+    if momento is None:
+        n = next(_reloj)
+        momento = f"2030-01-01 00:{n // 60 % 60:02d}:{n % 60:02d}"
+    with db.conexion() as conn:
+        antes = db.ultimo_cambio(conn)
+        conn.execute(sql, params)
+        conn.execute("UPDATE cambios SET momento = ? WHERE seq > ?", (momento, antes))
+
+
+def test_exportar_aplicar_y_reaplicar(sitios):
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'Nuevo' WHERE numero_presupuesto = 'PRES-1'")
+    insertar = "INSERT INTO presupuestos (numero_presupuesto, cliente, proyecto, monto_total, estado) " \
+               "VALUES ('PRES-9', 'Otro', 'P', 5, 'Borrador')"
+    ejecutar(sitios.a, insertar)
+
+    paquete, resultado = enviar(sitios, "a", "b", "1.jpaq")
+    assert (paquete.cambios, resultado.estado, resultado.aplicados) == (2, 'aplicado', 2)
+    assert presupuestos(sitios.b) == presupuestos(sitios.a)
+
+    # El mismo paquete otra vez no tiene efecto
+    assert sitios.rb.aplicar_paquete(paquete.ruta).estado == 'repetido'
+    assert presupuestos(sitios.b) == presupuestos(sitios.a)
+
+    # Lo aplicado no vuelve al sitio de origen
+    de_vuelta, resultado = enviar(sitios, "b", "a", "2.jpaq")
+    assert de_vuelta.cambios == 0
+
+
+def test_conflicto_gana_la_escritura_mas_nueva(sitios):
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'Desde A' WHERE numero_presupuesto = 'PRES-0'",
+             momento="2030-01-01 10:00:00")
+    ejecutar(sitios.b, "UPDATE presupuestos SET cliente = 'Desde B' WHERE numero_presupuesto = 'PRES-0'",
+             momento="2030-01-01 10:00:05")
+
+    _, en_b = enviar(sitios, "a", "b", "a-b.jpaq")
+    _, en_a = enviar(sitios, "b", "a", "b-a.jpaq")
+    assert (en_b.aplicados, en_b.descartados) == (0, 1)
+    assert (en_a.aplicados, en_a.descartados) == (1, 0)
+    assert presupuestos(sitios.a)['PRES-0'] == presupuestos(sitios.b)['PRES-0'] == 'Desde B'
+
+
+def test_renombrar_la_clave(sitios):
+    ejecutar(sitios.a, "UPDATE presupuestos SET numero_presupuesto = 'PRES-0-R', cliente = 'Renombrado' "
+                       "WHERE numero_presupuesto = 'PRES-0'")
+    # Un cambio posterior en el mismo tramo: el destino igual debe conocer la clave original
+    ejecutar(sitios.a, "UPDATE presupuestos SET monto_total = 99 WHERE numero_presupuesto = 'PRES-0-R'")
+
+    _, resultado = enviar(sitios, "a", "b", "1.jpaq")
+    assert resultado.aplicados == 1
+    filas = presupuestos(sitios.b)
+    assert 'PRES-0' not in filas
+    assert filas['PRES-0-R'] == 'Renombrado'
+    assert len(filas) == 3
+
+
+def test_renombrar_y_reenviar_a_un_tercer_sitio(sitios, crear_db):
+    main.DatabaseManager.cerrar_pools()
+    shutil.copy(sitios.directorio / "b.db", sitios.directorio / "c.db")
+    sitios.a, sitios.b, c = crear_db("a.db"), crear_db("b.db"), crear_db("c.db")
+    sitios.ra, sitios.rb = replicacion.ReplicationManager(sitios.a), replicacion.ReplicationManager(sitios.b)
+    rb, rc = sitios.rb, replicacion.ReplicationManager(c)
+    rc.configurar_sitio("C", nuevo=True)
+    rb.registrar_sitio(rc.sitio, "C", desde_actual=True)
+
+    ejecutar(sitios.a, "UPDATE presupuestos SET numero_presupuesto = 'PRES-1-R' "
+                       "WHERE numero_presupuesto = 'PRES-1'")
+    enviar(sitios, "a", "b", "a-b.jpaq")
+    paquete = rb.exportar_paquete("C", str(sitios.directorio / "b-c.jpaq"))
+    assert rc.aplicar_paquete(paquete.ruta).aplicados == 1
+    assert set(presupuestos(c)) == {'PRES-0', 'PRES-1-R', 'PRES-2'}
+
+
+def test_baja_se_propaga(sitios):
+    ejecutar(sitios.a, "DELETE FROM presupuestos WHERE numero_presupuesto = 'PRES-2'")
+    _, resultado = enviar(sitios, "a", "b", "1.jpaq")
+    assert resultado.aplicados == 1
+    assert 'PRES-2' not in presupuestos(sitios.b)
+
+
+def test_baja_local_mas_nueva_gana_a_una_modificacion(sitios):
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'Tarde' WHERE numero_presupuesto = 'PRES-2'",
+             momento="2030-01-01 10:00:00")
+    ejecutar(sitios.b, "DELETE FROM presupuestos WHERE numero_presupuesto = 'PRES-2'",
+             momento="2030-01-01 11:00:00")
+    _, resultado = enviar(sitios, "a", "b", "1.jpaq")
+    assert resultado.descartados == 1
+    assert 'PRES-2' not in presupuestos(sitios.b)
+
+
+def test_paquete_inicial_lleva_momentos_reales(sitios):
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'X' WHERE numero_presupuesto = 'PRES-1'",
+             momento="2031-05-05 05:05:05")
+    with sitios.a.conexion() as conn:
+        columnas = sitios.ra._columnas(conn, 'presupuestos')
+        filas = [f for bloque in sitios.ra._filas_completas(conn, 'presupuestos', columnas) for f in bloque]
+    momentos = {fila[1]: (fila[2], fila[3]) for fila in filas}
+    assert momentos['PRES-1'] == ("2031-05-05 05:05:05", sitios.ra.sitio)
+    assert all(momento for momento, _ in momentos.values())
+
+    # Con el registro compactado las filas van con MOMENTO_INICIAL: una copia
+    # masiva no pasa por encima de lo que el destino ya conoce
+    with sitios.a.conexion() as conn:
+        conn.execute("DELETE FROM cambios")
+        conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('cambios_compactado', ?)",
+                     (str(sitios.a.ultimo_cambio(conn)),))
+    paquete, resultado = enviar(sitios, "a", "b", "inicial.jpaq")
+    assert paquete.inicial
+    assert (resultado.aplicados, resultado.descartados) == (0, 3)
+    assert presupuestos(sitios.b)['PRES-1'] == 'Cliente 1'
+
+
+def test_filas_anteriores_al_registro_tienen_linea_base(tmp_path, crear_db):
+    ruta = tmp_path / "vieja.db"
+    conn = sqlite3.connect(str(ruta), isolation_level=None)
+    for version, _, sentencias in main.MIGRACIONES[:6]:
+        for sql in (sentencias(conn) if callable(sentencias) else sentencias):
+            conn.execute(sql)
+    conn.execute("PRAGMA user_version = 6")
+    insertar_presupuesto(conn, "PRES-VIEJO")
+    conn.close()
+
+    db = crear_db("vieja.db")
+    with db.conexion() as conn:
+        fila = conn.execute("SELECT clave, op FROM cambios WHERE tabla = 'presupuestos'").fetchone()
+    assert tuple(fila) == ('PRES-VIEJO', 'I')
+
+
+def test_comando_aplicar_informa_el_rechazo(sitios, capsys):
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'Y' WHERE numero_presupuesto = 'PRES-0'")
+    primero = sitios.ra.exportar_paquete("B", str(sitios.directorio / "1.jpaq"))
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'Z' WHERE numero_presupuesto = 'PRES-0'")
+    segundo = sitios.ra.exportar_paquete("B", str(sitios.directorio / "2.jpaq"))
+    assert sitios.rb.aplicar_paquete(primero.ruta).estado == 'aplicado'
+
+    ejecutar(sitios.a, "UPDATE presupuestos SET cliente = 'W' WHERE numero_presupuesto = 'PRES-0'")
+    tercero = sitios.ra.exportar_paquete("B", str(sitios.directorio / "3.jpaq"))
+    # Falta el segundo: hueco
+    args = SimpleNamespace(paquetes=[tercero.ruta], forzar=False)
+    assert replicacion.comando_aplicar(sitios.rb, args) == 2
+    assert "Falta un paquete anterior" in capsys.readouterr().out
+
+    args = SimpleNamespace(paquetes=[segundo.ruta, tercero.ruta], forzar=False)
+    assert replicacion.comando_aplicar(sitios.rb, args) == 0
+    assert presupuestos(sitios.b)['PRES-0'] == 'W'
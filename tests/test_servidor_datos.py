@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Servicio de datos (servidor_datos.py) y su protocolo de tramas"""
+
+import socket
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+import pytest
+
+import main
+import servidor_datos
+
+TOKEN = "secreto"
+
+
+@pytest.fixture
+def servidor(db):
+    """Servicio escuchando en un puerto libre de 127.0.0.1"""
+    servicio = servidor_datos.ServicioDatos(db, TOKEN, max_sesiones=4, inactividad=1)
+    tcp = servidor_datos.crear_servidor("127.0.0.1:0", servicio)
+    hilo = threading.Thread(target=tcp.serve_forever, daemon=True)
+    hilo.start()
+    tcp.direccion = "127.0.0.1:%d" % tcp.server_address[1]
+    yield tcp
+    tcp.shutdown()
+    tcp.server_close()
+    for sesion in list(servicio.sesiones.values()):
+        servicio.cerrar_sesion(sesion)
+
+
+def intercambiar(servidor, trama, crudo=None):
+    """Enviar una trama (o bytes crudos) por un socket nuevo y leer la respuesta"""
+    with main.abrir_socket(servidor.direccion, 5) as sock:
+        if crudo is not None:
+            sock.sendall(crudo)
+        else:
+            main.enviar_trama(sock, trama)
+        return main.leer_trama(sock)
+
+
+def test_handshake_y_consulta(servidor):
+    conn = main.RemoteConnection(servidor.direccion, TOKEN)
+    try:
+        assert conn.execute("SELECT 1 + 1").fetchone() == (2,)
+        assert len(servidor.servicio.sesiones) == 1
+    finally:
+        conn.close()
+
+
+def test_token_incorrecto(servidor):
+    with pytest.raises(sqlite3.OperationalError, match="Token"):
+        main.RemoteConnection(servidor.direccion, "otro")
+    assert servidor.servicio.sesiones == {}
+
+
+@pytest.mark.parametrize("trama", [[5], [[]], [[1, 2]], [None], [["ejecutar", "SELECT 1"]]])
+def test_solicitud_invalida_antes_del_hola(servidor, trama):
+    en_transaccion, resultados = intercambiar(servidor, trama)
+    assert en_transaccion is False
+    assert resultados[0][:2] == ['error', 'ProgrammingError']
+
+
+def test_el_servidor_sigue_atendiendo_tras_tramas_invalidas(servidor):
+    for trama in ([5], [[]]):
+        intercambiar(servidor, trama)
+    conn = main.RemoteConnection(servidor.direccion, TOKEN)
+    try:
+        assert conn.execute("SELECT 7").fetchone() == (7,)
+    finally:
+        conn.close()
+    assert servidor.servicio.estadisticas['errores'] == 2
+
+
+def test_trama_grande_antes_del_hola(servidor):
+    largo = main.TRAMA_MAXIMA_INICIAL + 1
+    _, resultados = intercambiar(servidor, None, struct.pack(">IB", largo, 0) + b"N" * largo)
+    assert resultados[0][:2] == ['error', 'InterfaceError']
+
+
+def test_bomba_zlib(servidor):
+    bomba = zlib.compress(b"l" + b"\0" * (main.TRAMA_MAXIMA_INICIAL * 50), 9)
+    assert len(bomba) < main.TRAMA_MAXIMA_INICIAL
+    _, resultados = intercambiar(servidor, None, struct.pack(">IB", len(bomba), 1) + bomba)
+    assert resultados[0][:2] == ['error', 'InterfaceError']
+    assert "descomprimida" in resultados[0][2]
+
+
+def test_anidamiento_excesivo():
+    with pytest.raises(sqlite3.InterfaceError):
+        main.decodificar(b"l\x01\x00\x00\x00" * 100000 + b"N")
+
+
+def test_inactividad_revierte_la_transaccion(servidor, db):
+    conn = main.RemoteConnection(servidor.direccion, TOKEN)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT INTO meta (clave, valor) VALUES ('prueba', 'sin confirmar')")
+    limite = time.monotonic() + 5
+    while servidor.servicio.sesiones and time.monotonic() < limite:
+        time.sleep(0.1)
+    assert servidor.servicio.sesiones == {}
+    assert servidor.servicio.estadisticas['inactivas'] == 1
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("SELECT 1")
+    with db.conexion() as local:
+        assert local.execute("SELECT valor FROM meta WHERE clave = 'prueba'").fetchone() is None
+        # El bloqueo de escritura quedó libre
+        local.execute("INSERT INTO meta (clave, valor) VALUES ('prueba', 'local')")
+
+
+def test_keepalive():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        servidor_datos.activar_keepalive(sock)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)